@@ -3,54 +3,9 @@
 import os
 import re
 import cv2
-import pytesseract
-
-
-def crop_screenshot(screenshot, bottom_left_template, top_right_template):
-    """Crop Spiroware screenshot
-
-    Parameters
-    ----------
-    screenshot : numpy.ndarray
-        Screenshot to be cropped
-    bottom_left_template : numpy.ndarray
-        Templated used to find the location of the bottom left corner
-    top_right_template : numpy.ndarray
-        Templated used to find the location of the top right corner
-
-    Returns
-    -------
-    numpy.ndarray
-        Screenshot that is cropped based on templates
-
-    Reference
-    ---------
-    https://pyimagesearch.com/2021/03/22/opencv-template-matching-cv2-matchtemplate/
-    """
-
-    # convert images to grayscale to speed up processing
-    screenshot_gray = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
-    bottom_left_template_gray = cv2.cvtColor(bottom_left_template, cv2.COLOR_BGR2GRAY)
-    top_right_template_gray = cv2.cvtColor(top_right_template, cv2.COLOR_BGR2GRAY)
-
-    # get location info from screenshots
-    bottom_left_result = cv2.matchTemplate(
-        screenshot_gray, bottom_left_template_gray, cv2.TM_CCOEFF_NORMED
-    )
-    top_right_result = cv2.matchTemplate(
-        screenshot_gray, top_right_template_gray, cv2.TM_CCOEFF_NORMED
-    )
-    (_, _, _, bottom_left_coor) = cv2.minMaxLoc(bottom_left_result)
-    (_, _, _, top_right_coor) = cv2.minMaxLoc(top_right_result)
-
-    # crop using the top left corner of bottom_left_coordinates and
-    # bottom right corner of top_right_template
-    crop_img = screenshot[
-        (top_right_coor[1] + top_right_template.shape[0]):bottom_left_coor[1],
-        bottom_left_coor[0]:(top_right_coor[0] + top_right_template.shape[1]),
-    ]
-
-    return crop_img
+import numpy as np
+import corner_match
+import ocr_service
 
 
 def convert_bw(figure, threshold=180):
@@ -77,6 +32,42 @@ def convert_bw(figure, threshold=180):
     return figure_bw
 
 
+def ver_gap_ind(white_cols):
+    """Get index of the white gap from a mask of all white columns
+
+    Parameters
+    ----------
+    white_cols : numpy.ndarray
+        Boolean array indicating if a column is all white
+
+    Returns
+    -------
+    int
+        Index of white gap
+
+    Raises
+    ------
+    ValueError
+        If there are no columns to the right of the first non-white column
+    """
+    # starting from the left of the image, find the first column which
+    # contains a non-white pixel
+    non_white_inds = np.flatnonzero(~white_cols)
+    y_coor = non_white_inds[0] if non_white_inds.size else (
+        white_cols.shape[0] - 1
+    )
+    if y_coor >= (white_cols.shape[0] - 1):
+        raise ValueError('Figure does not contain a vertical white gap')
+    # starting from the previous step, find the first column which contains
+    # only white pixels; the last column is never checked
+    white_inds = np.flatnonzero(white_cols[y_coor:-1]) + y_coor
+    y_coor_2 = white_inds[0] if white_inds.size else (
+        white_cols.shape[0] - 2
+    )
+
+    return int(y_coor_2) + 1
+
+
 def ver_char_row_ind(figure):
     """Get index associated with the vertical (y) axis
 
@@ -99,29 +90,11 @@ def ver_char_row_ind(figure):
         Index of white gap
     """
     figure = convert_bw(figure, 150)
-    is_white_line = True
-    # starting from the bottom of the image, horizontally interate over pixels
-    # stop when the horizontal line contains a non-white pixel
-    # will use the x_coor (horizontal line) in next step
-    for y_coor in range(figure.shape[1]):
-        for x_coor in range(figure.shape[0] - 1):
-            if figure[x_coor, y_coor] != 255:
-                is_white_line = False
-                break
-        if not is_white_line:
-            break
-    # starting from the previous step, horizontally interate over pixels
-    # stop when the horizontal line contains only white pixels
-    for y_coor_2 in range(y_coor, figure.shape[1] - 1):
-        for x_coor_2 in range(figure.shape[0] - 1):
-            is_white_line = True
-            if figure[x_coor_2, y_coor_2] != 255:
-                is_white_line = False
-                break
-        if is_white_line:
-            break
-
-    return y_coor_2 + 1
+    # min of a column is only 255 if every pixel is white; the last row is not
+    # considered to remain consistent with the original pixel by pixel scan
+    white_cols = figure[:-1, :].min(axis=0, initial=255) == 255
+
+    return ver_gap_ind(white_cols)
 
 
 def main():
@@ -134,60 +107,6 @@ def main():
         spiroware_screenshots.extend(filenames)
         break
 
-    # corner images are used as landmarks for cropping purposes
-    corner_imgs = {
-        'co2': {
-            'bottom_left': cv2.imread(os.path.abspath(os.path.join(
-                os.path.dirname(__file__),
-                '../features/assets/co2_bottom_left.png'
-            ))),
-            'top_right': cv2.imread(os.path.abspath(os.path.join(
-                os.path.dirname(__file__),
-                '../features/assets/co2_top_right.png'
-            ))),
-        },
-        'flow': {
-            'bottom_left': cv2.imread(os.path.abspath(os.path.join(
-                os.path.dirname(__file__),
-                '../features/assets/flow_bottom_left.png'
-            ))),
-            'top_right': cv2.imread(os.path.abspath(os.path.join(
-                os.path.dirname(__file__),
-                '../features/assets/flow_top_right.png'
-            ))),
-        },
-        'n2': {
-            'bottom_left': cv2.imread(os.path.abspath(os.path.join(
-                os.path.dirname(__file__),
-                '../features/assets/n2_bottom_left.png'
-            ))),
-            'top_right': cv2.imread(os.path.abspath(os.path.join(
-                os.path.dirname(__file__),
-                '../features/assets/n2_top_right.png'
-            ))),
-        },
-        'o2': {
-            'bottom_left': cv2.imread(os.path.abspath(os.path.join(
-                os.path.dirname(__file__),
-                '../features/assets/o2_bottom_left.png'
-            ))),
-            'top_right': cv2.imread(os.path.abspath(os.path.join(
-                os.path.dirname(__file__),
-                '../features/assets/o2_top_right.png'
-            ))),
-        },
-        'volume': {
-            'bottom_left': cv2.imread(os.path.abspath(os.path.join(
-                os.path.dirname(__file__),
-                '../features/assets/volume_bottom_left.png'
-            ))),
-            'top_right': cv2.imread(os.path.abspath(os.path.join(
-                os.path.dirname(__file__),
-                '../features/assets/volume_top_right.png'
-            ))),
-        }
-    }
-
     expected_text = {
         'co2': 'CO2[%]',
         'flow': 'Flow[ml/s]',
@@ -196,7 +115,19 @@ def main():
         'volume': 'Vol.[ml]'
     }
 
-    for spiroware_screenshot in spiroware_screenshots:
+    # corners are searched for near their last location before the whole
+    # screenshot is searched
+    corner_matcher = corner_match.CornerMatcher(
+        corner_match.load_corner_imgs()
+    )
+
+    # axis titles are read in batches by a single tesseract engine
+    axis_text_whitelist = 'Flow[ml/s]N2[%]CO2[%]Vol.[ml]O2[%]'
+    ocr = ocr_service.get_service()
+    batch_size = 64
+    batch = []
+
+    for i, spiroware_screenshot in enumerate(spiroware_screenshots):
         spiroware_screenshot_fname = spiroware_screenshot
 
         screenshot_type = re.sub('.*_', '', spiroware_screenshot)
@@ -206,35 +137,56 @@ def main():
                 spiroware_screenshots_path, spiroware_screenshot
             )))
 
-            spiro_fig = crop_screenshot(
-                spiroware_screenshot,
-                corner_imgs[screenshot_type]['bottom_left'],
-                corner_imgs[screenshot_type]['top_right']
+            spiro_fig, crop_confidence = corner_matcher.crop(
+                spiroware_screenshot, screenshot_type
             )
+            if crop_confidence < corner_match.min_confidence:
+                print('Low crop confidence: {} ({:.3f})'.format(
+                    spiroware_screenshot_fname, crop_confidence
+                ))
 
             # preprocess vertical axis before digitizing by rotating 90
             num_axis = cv2.rotate(
                 spiro_fig[:, :ver_char_row_ind(spiro_fig)],
-                cv2.cv2.ROTATE_90_CLOCKWISE
+                cv2.ROTATE_90_CLOCKWISE
             )
-
-            # convert the axis text image into a string
-            custom_config = (
-                r'-l eng --oem 3 --psm 6 -c '
-                + r'tessedit_char_whitelist=Flow[ml/s]N2[%]CO2[%]Vol.[ml]O2[%]'
+            batch.append(
+                (spiroware_screenshot_fname, screenshot_type, num_axis)
             )
-            axis_text = pytesseract.image_to_string(
-                num_axis, config=custom_config
+        except Exception as e:
+            print('Image issue: {} ({})'.format(spiroware_screenshot_fname, e))
+
+        if len(batch) < batch_size and i < (len(spiroware_screenshots) - 1):
+            continue
+
+        # convert the axis text images into strings
+        try:
+            axis_texts = ocr.image_to_strings(
+                [num_axis for (_, _, num_axis) in batch], axis_text_whitelist
             )
+        except Exception:
+            # read individually so one bad image does not fail the batch
+            axis_texts = []
+            for (fname, _, num_axis) in batch:
+                try:
+                    axis_texts.append(
+                        ocr.image_to_string(num_axis, axis_text_whitelist)
+                    )
+                except Exception as e:
+                    print('Image issue: {} ({})'.format(fname, e))
+                    axis_texts.append(None)
+
+        for (fname, screenshot_type, _), axis_text in zip(batch, axis_texts):
+            if axis_text is None:
+                continue
             axis_text = re.sub('\n', '', axis_text)
 
             # compare the axis text string to the expected text
-            # (based on screenshot type); print if string is not as expected so
-            # image can be followed up
+            # (based on screenshot type); print if string is not as expected
+            # so image can be followed up
             if axis_text != expected_text[screenshot_type]:
-                print(spiroware_screenshot_fname)
-        except Exception as e:
-            print('Image issue: ' + spiroware_screenshot_fname)
+                print(fname)
+        batch = []
 
 
 if __name__ == "__main__":
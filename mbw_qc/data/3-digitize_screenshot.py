@@ -1,14 +1,18 @@
 """Digitize Spiroware screenshot"""
 
 import argparse
-import pathlib
+import concurrent.futures
+import csv
 import re
 import os
 import cv2
-import pytesseract
 import numpy as np
 # plotdigitizer is slightly modified from source; no longer checks for gridlines
 import plotdigitizer.plotdigitizer
+import axis_ocr
+import corner_match
+import digitize_cache
+import ocr_service
 
 # contains all 'grey' gridlines derived from 202.2_trial_3_co2.png;
 # used to determine if an element is a gridline
@@ -23,75 +27,162 @@ gray_list = [
     [218, 218, 218], [200, 200, 200], [249, 249, 249], [228, 228, 228],
     [248, 248, 248], [207, 207, 207], [199, 199, 199]
 ]
+# templates of the axis number characters; created with
+# helper_build_glyph_bank.py, Tesseract is used if the file does not exist
+glyph_bank_path = os.path.join(
+    os.path.dirname(__file__), 'assets/axis_glyph_bank.npz'
+)
+
+# lookup table of gray_list; gray_lut[value] is True if [value]*3 is a gridline
+gray_lut = np.zeros(256, dtype=bool)
+gray_lut[[gray[0] for gray in gray_list]] = True
+
+# version of the digitization pipeline and the parameters which affect the
+# result; both are part of the cache key so increment the version whenever
+# the digitization logic changes
+pipeline_version = '1'
+# figures are upsampled by (resize_fx, resize_fy) before digitizing since
+# plotdigitizer originally did not pick up points; (1, 1) digitizes the
+# figure at its native resolution (see plotdigitizer_params)
+digitize_params = {
+    'resize_fx': 7,
+    'resize_fy': 2,
+    'num_points': 75,
+    'bw_threshold': 180,
+    'glyph_min_confidence': 0.9,
+}
+
+# expected vertical axis title of each screenshot type; used to confirm the
+# screenshot type while digitizing (see 2-confirm_screenshot.py)
+expected_text = {
+    'co2': 'CO2[%]',
+    'flow': 'Flow[ml/s]',
+    'n2': 'N2[%]',
+    'o2': 'O2[%]',
+    'volume': 'Vol.[ml]'
+}
+axis_title_whitelist = 'Flow[ml/s]N2[%]CO2[%]Vol.[ml]O2[%]'
 
 
-def crop_screenshot(screenshot, bottom_left_template, top_right_template):
-    """Crop Spiroware screenshot
+def convert_bw(figure, threshold=180):
+    """Convert a colour image to black and white
 
     Parameters
     ----------
-    screenshot : numpy.ndarray
-        Screenshot to be cropped
-    bottom_left_template : numpy.ndarray
-        Templated used to find the location of the bottom left corner
-    top_right_template : numpy.ndarray
-        Templated used to find the location of the top right corner
+    figure : numpy.ndarray
+        Image to be converted
+    threshold : int, optional
+        Threshold used to determine which elements are black and white,
+        by default 180
 
     Returns
     -------
     numpy.ndarray
-        Screenshot that is cropped based on templates
+        Image converted to black and white
+    """
+    figure_gray = cv2.cvtColor(figure, cv2.COLOR_BGR2GRAY)
+    figure_bw = cv2.threshold(figure_gray, threshold, 255, cv2.THRESH_BINARY)[1]
+
+    return figure_bw
 
-    Reference
-    ---------
-    https://pyimagesearch.com/2021/03/22/opencv-template-matching-cv2-matchtemplate/
+
+def white_line_masks(figure):
+    """Get masks of the all white rows and columns of a figure
+
+    The figure is converted to black and white once and each row and column is
+    reduced to a single boolean indicating if it only contains white pixels.
+    The last column is not considered for the rows (and the last row is not
+    considered for the columns) to remain consistent with the original pixel
+    by pixel scan.
+
+    Parameters
+    ----------
+    figure : numpy.ndarray
+        Image of interest
+
+    Returns
+    -------
+    white_rows : numpy.ndarray
+        Boolean array of length figure.shape[0]; True if the row is all white
+    white_cols : numpy.ndarray
+        Boolean array of length figure.shape[1]; True if the column is all
+        white
     """
+    figure = convert_bw(figure, 150)
+    # min of a row/column is only 255 if every pixel is white
+    white_rows = figure[:, :-1].min(axis=1, initial=255) == 255
+    white_cols = figure[:-1, :].min(axis=0, initial=255) == 255
 
-    # convert images to grayscale to speed up processing
-    screenshot_gray = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
-    bottom_left_template_gray = cv2.cvtColor(bottom_left_template, cv2.COLOR_BGR2GRAY)
-    top_right_template_gray = cv2.cvtColor(top_right_template, cv2.COLOR_BGR2GRAY)
+    return white_rows, white_cols
 
-    # get location info from screenshots
-    bottom_left_result = cv2.matchTemplate(
-        screenshot_gray, bottom_left_template_gray, cv2.TM_CCOEFF_NORMED
-    )
-    top_right_result = cv2.matchTemplate(
-        screenshot_gray, top_right_template_gray, cv2.TM_CCOEFF_NORMED
-    )
-    (_, _, _, bottom_left_coor) = cv2.minMaxLoc(bottom_left_result)
-    (_, _, _, top_right_coor) = cv2.minMaxLoc(top_right_result)
-
-    # crop using the top left corner of bottom_left_coordinates and
-    # bottom right corner of top_right_template
-    crop_img = screenshot[
-        (top_right_coor[1] + top_right_template.shape[0]):bottom_left_coor[1],
-        bottom_left_coor[0]:(top_right_coor[0] + top_right_template.shape[1]),
-    ]
 
-    return crop_img
+def hor_gap_ind(white_rows):
+    """Get index of the white gap from a mask of all white rows
 
+    Parameters
+    ----------
+    white_rows : numpy.ndarray
+        Boolean array indicating if a row is all white; see white_line_masks
 
-def convert_bw(figure, threshold=180):
-    """Convert a colour image to black and white
+    Returns
+    -------
+    int
+        Index of white gap
+
+    Raises
+    ------
+    ValueError
+        If the figure does not have enough rows to contain a gap
+    """
+    if white_rows.shape[0] < 2:
+        raise ValueError('Figure does not contain a horizontal white gap')
+    # starting from the bottom of the image, find the first row which
+    # contains a non-white pixel; row 0 is never checked
+    non_white_inds = np.flatnonzero(~white_rows[1:]) + 1
+    x_coor = non_white_inds[-1] if non_white_inds.size else 1
+    # starting from the previous step, find the first row which contains
+    # only white pixels
+    white_inds = np.flatnonzero(white_rows[1:(x_coor + 1)]) + 1
+    x_coor_2 = white_inds[-1] if white_inds.size else 1
+
+    return int(x_coor_2) - 1
+
+
+def ver_gap_ind(white_cols):
+    """Get index of the white gap from a mask of all white columns
 
     Parameters
     ----------
-    figure : numpy.ndarray
-        Image to be converted
-    threshold : int, optional
-        Threshold used to determine which elements are black and white,
-        by default 180
+    white_cols : numpy.ndarray
+        Boolean array indicating if a column is all white; see
+        white_line_masks
 
     Returns
     -------
-    numpy.ndarray
-        Image converted to black and white
+    int
+        Index of white gap
+
+    Raises
+    ------
+    ValueError
+        If there are no columns to the right of the first non-white column
     """
-    figure_gray = cv2.cvtColor(figure, cv2.COLOR_BGR2GRAY)
-    figure_bw = cv2.threshold(figure_gray, threshold, 255, cv2.THRESH_BINARY)[1]
+    # starting from the left of the image, find the first column which
+    # contains a non-white pixel
+    non_white_inds = np.flatnonzero(~white_cols)
+    y_coor = non_white_inds[0] if non_white_inds.size else (
+        white_cols.shape[0] - 1
+    )
+    if y_coor >= (white_cols.shape[0] - 1):
+        raise ValueError('Figure does not contain a vertical white gap')
+    # starting from the previous step, find the first column which contains
+    # only white pixels; the last column is never checked
+    white_inds = np.flatnonzero(white_cols[y_coor:-1]) + y_coor
+    y_coor_2 = white_inds[0] if white_inds.size else (
+        white_cols.shape[0] - 2
+    )
 
-    return figure_bw
+    return int(y_coor_2) + 1
 
 
 def hor_char_row_ind(figure):
@@ -115,30 +206,9 @@ def hor_char_row_ind(figure):
     int
         Index of white gap
     """
-    figure = convert_bw(figure, 150)
-    is_white_line = True
-    # starting from the bottom of the image, horizontally interate over pixels
-    # stop when the horizontal line contains a non-white pixel
-    # will use the x_coor (horizontal line) in next step
-    for x_coor in range(figure.shape[0] - 1, 0, -1):
-        for y_coor in range(figure.shape[1] - 1):
-            if figure[x_coor, y_coor] != 255:
-                is_white_line = False
-                break
-        if not is_white_line:
-            break
-    # starting from the previous step, horizontally interate over pixels
-    # stop when the horizontal line contains only white pixels
-    for x_coor_2 in range(x_coor, 0, -1):
-        for y_coor_2 in range(figure.shape[1] - 1):
-            is_white_line = True
-            if figure[x_coor_2, y_coor_2] != 255:
-                is_white_line = False
-                break
-        if is_white_line:
-            break
+    white_rows, _ = white_line_masks(figure)
 
-    return x_coor_2 - 1
+    return hor_gap_ind(white_rows)
 
 
 def ver_char_row_ind(figure):
@@ -162,30 +232,32 @@ def ver_char_row_ind(figure):
     int
         Index of white gap
     """
-    figure = convert_bw(figure, 150)
-    is_white_line = True
-    # starting from the left of the image, vertically interate over pixels
-    # stop when the vertical line contains a non-white pixel
-    # will use the y_coor (vertical line) in next step
-    for y_coor in range(figure.shape[1]):
-        for x_coor in range(figure.shape[0] - 1):
-            if figure[x_coor, y_coor] != 255:
-                is_white_line = False
-                break
-        if not is_white_line:
-            break
-    # starting from the previous step, vertically interate over pixels
-    # stop when the vertical line contains only white pixels
-    for y_coor_2 in range(y_coor, figure.shape[1] - 1):
-        for x_coor_2 in range(figure.shape[0] - 1):
-            is_white_line = True
-            if figure[x_coor_2, y_coor_2] != 255:
-                is_white_line = False
-                break
-        if is_white_line:
-            break
+    _, white_cols = white_line_masks(figure)
+
+    return ver_gap_ind(white_cols)
+
+
+def char_row_inds(figure):
+    """Get indices associated with the horizontal and vertical axes
+
+    Equivalent to calling hor_char_row_ind and ver_char_row_ind but the
+    figure is only converted and reduced once.
+
+    Parameters
+    ----------
+    figure : numpy.ndarray
+        Image of interest
+
+    Returns
+    -------
+    hor_ind : int
+        Index of white gap associated with the horizontal axis
+    ver_ind : int
+        Index of white gap associated with the vertical axis
+    """
+    white_rows, white_cols = white_line_masks(figure)
 
-    return y_coor_2 + 1
+    return hor_gap_ind(white_rows), ver_gap_ind(white_cols)
 
 
 def get_dim_inds(perp_dim, num_points):
@@ -214,11 +286,8 @@ def get_dim_inds(perp_dim, num_points):
     return dim_inds
 
 
-def get_axis_val(spiro_fig_wo_text, num_axis_ind, horizontal=True):
-    """Get first and last numbers of figure axis
-
-    Function takes extracts the axis numbers image from the figure, converts
-    the image to a string, and returns the first and last numbers of the string
+def get_axis_img(spiro_fig_wo_text, num_axis_ind, horizontal=True):
+    """Get the image of the axis numbers
 
     Parameters
     ----------
@@ -233,27 +302,72 @@ def get_axis_val(spiro_fig_wo_text, num_axis_ind, horizontal=True):
 
     Returns
     -------
-    axis_num_first : int
-        First number extracted from the axis image
-    axis_num_last : int
-        Last number extracted from the axis image
+    numpy.ndarray
+        Image of the axis numbers, read from left to right
     """
+    if horizontal:
+        return spiro_fig_wo_text[num_axis_ind:, :]
+
+    return cv2.rotate(
+        spiro_fig_wo_text[:, :num_axis_ind], cv2.ROTATE_90_CLOCKWISE
+    )
 
+
+def read_axis_text(num_axis, horizontal=True, glyph_bank=None):
+    """Convert the image of the axis numbers into a string
+
+    The glyph bank is used if available; Tesseract is used if there is no
+    glyph bank or if any glyph is matched with low confidence.
+
+    Parameters
+    ----------
+    num_axis : numpy.ndarray
+        Image of the axis numbers; see get_axis_img
+    horizontal : bool, optional
+        Indicates of the axis is horizontal or vertical; only the vertical
+        axis can contain negative numbers, by default True
+    glyph_bank : axis_ocr.GlyphBank, optional
+        Templates of the axis characters, by default None
+
+    Returns
+    -------
+    str
+        Text of the axis numbers
+    """
     if horizontal:
-        num_axis = spiro_fig_wo_text[num_axis_ind:, :]
-        custom_config = (
-            r'-l eng --oem 3 --psm 6 -c tessedit_char_whitelist=0123456789 '
-        )
+        allowed_chars = '0123456789'
     else:
-        num_axis = cv2.rotate(
-            spiro_fig_wo_text[:, :num_axis_ind], cv2.cv2.ROTATE_90_CLOCKWISE
-        )
-        custom_config = (
-            r'-l eng --oem 3 --psm 6 -c tessedit_char_whitelist=0123456789- '
+        allowed_chars = '0123456789-'
+
+    if glyph_bank is not None:
+        axis_text = glyph_bank.read(
+            num_axis, allowed_chars, digitize_params['glyph_min_confidence']
         )
+        if axis_text is not None:
+            return axis_text
+
+    # tesseract engine is loaded once per process
+    return ocr_service.get_service().image_to_string(num_axis, allowed_chars)
+
+
+def parse_axis_text(axis_text, horizontal=True):
+    """Get first and last numbers of the axis text
 
-    axis_text = pytesseract.image_to_string(num_axis, config=custom_config)
+    Parameters
+    ----------
+    axis_text : str
+        Text of the axis numbers; see read_axis_text
+    horizontal : bool, optional
+        Indicates of the axis is horizontal or vertical; the first number of
+        the horizontal axis is assumed to be 0, by default True
 
+    Returns
+    -------
+    axis_num_first : int
+        First number extracted from the axis text
+    axis_num_last : int
+        Last number extracted from the axis text
+    """
     if not horizontal:
         # find first number in string if concatenated; assumes numbers end in 0
         # remove all digits after 0 in case numbers are a single string
@@ -279,19 +393,183 @@ def get_axis_val(spiro_fig_wo_text, num_axis_ind, horizontal=True):
     return axis_num_first, axis_num_last
 
 
+def check_axis_title(spiro_fig, screenshot_type):
+    """Check the vertical axis title of a figure against the expected text
+
+    Parameters
+    ----------
+    spiro_fig : numpy.ndarray
+        Cropped Spiroware figure which contains the axis text; see
+        crop_figure
+    screenshot_type : str
+        Type of screenshot (i.e. 'co2', 'flow')
+
+    Returns
+    -------
+    bool
+        True if the axis title is the expected text of the screenshot type
+    """
+    # axis title is rotated 90 so it is read from left to right
+    axis_title = cv2.rotate(
+        spiro_fig[:, :ver_char_row_ind(spiro_fig)], cv2.ROTATE_90_CLOCKWISE
+    )
+    axis_text = ocr_service.get_service().image_to_string(
+        axis_title, axis_title_whitelist
+    )
+    axis_text = re.sub('\n', '', axis_text)
+
+    return axis_text == expected_text[screenshot_type]
+
+
+def get_axis_val(
+    spiro_fig_wo_text, num_axis_ind, horizontal=True, glyph_bank=None
+):
+    """Get first and last numbers of figure axis
+
+    Function takes extracts the axis numbers image from the figure, converts
+    the image to a string, and returns the first and last numbers of the string
+
+    Parameters
+    ----------
+    spiro_fig_wo_text : numpy.ndarray
+        Spiroware figure which does not contain axis text
+    num_axis_ind : int
+        Index indicating where the white gap is between the numbers of the axis
+        and the ticks of the axis
+    horizontal : bool, optional
+        Indicates of the axis is horizontal or vertical; vertical axis will
+        need to be rotated, by default True
+    glyph_bank : axis_ocr.GlyphBank, optional
+        Templates of the axis characters; Tesseract is used if None, by
+        default None
+
+    Returns
+    -------
+    axis_num_first : int
+        First number extracted from the axis image
+    axis_num_last : int
+        Last number extracted from the axis image
+    """
+    num_axis = get_axis_img(spiro_fig_wo_text, num_axis_ind, horizontal)
+    axis_text = read_axis_text(num_axis, horizontal, glyph_bank)
+
+    return parse_axis_text(axis_text, horizontal)
+
+
+def gridline_mask(figure):
+    """Get mask of the pixels which are the gray of a gridline
+
+    A pixel is a gridline if all three channels are equal and the value is
+    one of the grays in gray_list; the lookup is done with gray_lut.
+
+    Parameters
+    ----------
+    figure : numpy.ndarray
+        Colour image of interest
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean array with the same height and width as figure
+    """
+    blue, green, red = figure[..., 0], figure[..., 1], figure[..., 2]
+
+    return (blue == green) & (green == red) & gray_lut[blue]
+
+
+def first_grid_inds(probe_mask, reverse=False):
+    """Get index of the first gridline pixel along each probe line
+
+    Parameters
+    ----------
+    probe_mask : numpy.ndarray
+        Boolean array of shape (number of probe lines, length of probe line);
+        see gridline_mask
+    reverse : bool, optional
+        Search from the end of the probe line; as with the original pixel
+        scan the first element is then never checked, by default False
+
+    Returns
+    -------
+    numpy.ndarray
+        Index of the first gridline pixel for each probe line containing a
+        gridline pixel
+    """
+    probe_len = probe_mask.shape[1]
+    if reverse:
+        probe_mask = probe_mask[:, :0:-1]
+
+    has_grid = probe_mask.any(axis=1)
+    grid_inds = probe_mask.argmax(axis=1)[has_grid]
+
+    if reverse:
+        grid_inds = (probe_len - 1) - grid_inds
+
+    return grid_inds
+
+
+def get_grid_inds(fig_wo_axis, num_points):
+    """Determines the indices of the outer most grid lines
+
+    Equivalent to calling get_left_grid_ind, get_right_grid_ind,
+    get_top_grid_ind and get_bottom_grid_ind but the probe lines are only
+    extracted and converted to a gridline mask once.
+
+    Parameters
+    ----------
+    fig_wo_axis : numpy.ndarray
+        Spiroware figure which does not contain axis text
+    num_points : int
+        The number of points used to try and detect the indices
+
+    Returns
+    -------
+    left_grid_ind : float
+        Index of the left most grid line
+    right_grid_ind : float
+        Index of the right most grid line
+    top_grid_ind : float
+        Index of the top most grid line
+    bottom_grid_ind : float
+        Index of the bottom most grid line
+    """
+    (ver_dim, hor_dim, _) = fig_wo_axis.shape
+    # only the probe lines are converted to a mask
+    row_mask = gridline_mask(fig_wo_axis[get_dim_inds(ver_dim, num_points)])
+    col_mask = gridline_mask(
+        fig_wo_axis[:, get_dim_inds(hor_dim, num_points)]
+    ).T
+
+    left_inds = first_grid_inds(row_mask)
+    right_inds = first_grid_inds(row_mask, reverse=True)
+    top_inds = first_grid_inds(col_mask)
+    bottom_inds = first_grid_inds(col_mask, reverse=True)
+
+    # gridlines found on the edge of the figure are ignored
+    left_grid_ind = np.median(left_inds[left_inds != (hor_dim-1)])
+    right_grid_ind = np.median(right_inds)
+    # axis is inverted when entering into plotdigitizer
+    top_grid_ind = ver_dim - np.median(top_inds[top_inds != 0])
+    bottom_grid_ind = ver_dim - np.median(
+        bottom_inds[bottom_inds != (ver_dim-1)]
+    )
+
+    return left_grid_ind, right_grid_ind, top_grid_ind, bottom_grid_ind
+
+
 def get_left_grid_ind(fig_wo_axis, num_points):
     """Determines the index of the left most grid line
 
-    Function will horizontally iterate over the figure image at n num_points
-    and stops once the left most grid line is found. The left most index will
-    be associated with a numerical value (i.e. first number in the horizontal
-    axis) and processed using plotdigitizer.
+    Function will horizontally search the figure image at n num_points
+    for the left most grid line. The left most index will be associated with a
+    numerical value (i.e. first number in the horizontal axis) and processed
+    using plotdigitizer.
 
     Parameters
     ----------
     fig_wo_axis : numpy.ndarray
         Spiroware figure which does not contain axis text
-    num_points : _type_
+    num_points : int
         The number of points used to try and detect the index, increasing the
         number of points will increase the confidence in the result but will
         increase computation time
@@ -304,33 +582,25 @@ def get_left_grid_ind(fig_wo_axis, num_points):
     (ver_dim, hor_dim, _) = fig_wo_axis.shape
     dim_inds = get_dim_inds(ver_dim, num_points)
 
-    grid_value_ind = []
-    for dim_ind in dim_inds:
-        # horizontally iterate over figure, starting from the left
-        for opp_ind in range(hor_dim):
-            # compare value to gray rgb associated with gridlines;
-            # stop if gridline found
-            if fig_wo_axis[dim_ind, opp_ind, :].tolist() in gray_list:
-                if opp_ind != (hor_dim-1):
-                    grid_value_ind.append(opp_ind)
-                break
+    # horizontally search figure, starting from the left
+    grid_value_ind = first_grid_inds(gridline_mask(fig_wo_axis[dim_inds]))
 
-    return np.median(grid_value_ind)
+    return np.median(grid_value_ind[grid_value_ind != (hor_dim-1)])
 
 
 def get_right_grid_ind(fig_wo_axis, num_points):
     """Determines the index of the right most grid line
 
-    Function will horizontally iterate over the figure image at n num_points
-    and stops once the right most grid line is found. The right most index will
-    be associated with a numerical value (i.e. last number in the horizontal
-    axis) and processed using plotdigitizer.
+    Function will horizontally search the figure image at n num_points
+    for the right most grid line. The right most index will be associated with
+    a numerical value (i.e. last number in the horizontal axis) and processed
+    using plotdigitizer.
 
     Parameters
     ----------
     fig_wo_axis : numpy.ndarray
         Spiroware figure which does not contain axis text
-    num_points : _type_
+    num_points : int
         The number of points used to try and detect the index, increasing the
         number of points will increase the confidence in the result but will
         increase computation time
@@ -340,19 +610,13 @@ def get_right_grid_ind(fig_wo_axis, num_points):
     int
         Index of the right most grid line
     """
-    (ver_dim, hor_dim, _) = fig_wo_axis.shape
+    (ver_dim, _, _) = fig_wo_axis.shape
     dim_inds = get_dim_inds(ver_dim, num_points)
 
-    grid_value_ind = []
-    for dim_ind in dim_inds:
-        # horizontally iterate over figure, starting from the right
-        for opp_ind in range(hor_dim-1, 0, -1):
-            # compare value to gray rgb associated with gridlines;
-            # stop if gridline found
-            if fig_wo_axis[dim_ind, opp_ind, :].tolist() in gray_list:
-                if opp_ind != 0:
-                    grid_value_ind.append(opp_ind)
-                break
+    # horizontally search figure, starting from the right
+    grid_value_ind = first_grid_inds(
+        gridline_mask(fig_wo_axis[dim_inds]), reverse=True
+    )
 
     return np.median(grid_value_ind)
 
@@ -360,16 +624,16 @@ def get_right_grid_ind(fig_wo_axis, num_points):
 def get_top_grid_ind(fig_wo_axis, num_points):
     """Determines the index of the top most grid line
 
-    Function will vertically iterate over the figure image at n num_points
-    and stops once the top most grid line is found. The top most index will
-    be associated with a numerical value (i.e. last number in the vertical
-    axis) and processed using plotdigitizer.
+    Function will vertically search the figure image at n num_points
+    for the top most grid line. The top most index will be associated with a
+    numerical value (i.e. last number in the vertical axis) and processed
+    using plotdigitizer.
 
     Parameters
     ----------
     fig_wo_axis : numpy.ndarray
         Spiroware figure which does not contain axis text
-    num_points : _type_
+    num_points : int
         The number of points used to try and detect the index, increasing the
         number of points will increase the confidence in the result but will
         increase computation time
@@ -382,33 +646,28 @@ def get_top_grid_ind(fig_wo_axis, num_points):
     (ver_dim, hor_dim, _) = fig_wo_axis.shape
     dim_inds = get_dim_inds(hor_dim, num_points)
 
-    grid_value_ind = []
-    for dim_ind in dim_inds:
-        # compare value to gray rgb associated with gridlines;
-        # stop if gridline found
-        for opp_ind in range(ver_dim):
-            if fig_wo_axis[opp_ind, dim_ind, :].tolist() in gray_list:
-                if opp_ind != 0:
-                    grid_value_ind.append(opp_ind)
-                break
+    # vertically search figure, starting from the top
+    grid_value_ind = first_grid_inds(
+        gridline_mask(fig_wo_axis[:, dim_inds]).T
+    )
 
     # axis is inverted when entering into plotdigitizer
-    return ver_dim - np.median(grid_value_ind)
+    return ver_dim - np.median(grid_value_ind[grid_value_ind != 0])
 
 
 def get_bottom_grid_ind(fig_wo_axis, num_points):
     """Determines the index of the bottom most grid line
 
-    Function will vertically iterate over the figure image at n num_points
-    and stops once the bottom most grid line is found. The bottom most index will
-    be associated with a numerical value (i.e. first number in the vertical
-    axis) and processed using plotdigitizer.
+    Function will vertically search the figure image at n num_points
+    for the bottom most grid line. The bottom most index will be associated
+    with a numerical value (i.e. first number in the vertical axis) and
+    processed using plotdigitizer.
 
     Parameters
     ----------
     fig_wo_axis : numpy.ndarray
         Spiroware figure which does not contain axis text
-    num_points : _type_
+    num_points : int
         The number of points used to try and detect the index, increasing the
         number of points will increase the confidence in the result but will
         increase computation time
@@ -421,40 +680,63 @@ def get_bottom_grid_ind(fig_wo_axis, num_points):
     (ver_dim, hor_dim, _) = fig_wo_axis.shape
     dim_inds = get_dim_inds(hor_dim, num_points)
 
-    grid_value_ind = []
-    for dim_ind in dim_inds:
-        for opp_ind in range(ver_dim-1, 0, -1):
-            # compare value to gray rgb associated with gridlines;
-            # stop if gridline found
-            if fig_wo_axis[opp_ind, dim_ind, :].tolist() in gray_list:
-                if opp_ind != (ver_dim-1):
-                    grid_value_ind.append(opp_ind)
-                break
+    # vertically search figure, starting from the bottom
+    grid_value_ind = first_grid_inds(
+        gridline_mask(fig_wo_axis[:, dim_inds]).T, reverse=True
+    )
 
     # axis is inverted when entering into plotdigitizer
-    return ver_dim - np.median(grid_value_ind)
+    return ver_dim - np.median(grid_value_ind[grid_value_ind != (ver_dim-1)])
+
+
+def plotdigitizer_params(resize_fx, resize_fy):
+    """Get the plotdigitizer parameters of an upsampled figure
+
+    The plotdigitizer parameters were chosen for figures upsampled 7x2; they
+    are scaled so figures upsampled by other factors (including the native
+    resolution) detect the trajectory and erase the axes the same way.
+
+    Parameters
+    ----------
+    resize_fx : int
+        Horizontal upsampling factor
+    resize_fy : int
+        Vertical upsampling factor
+
+    Returns
+    -------
+    dict
+        Keyword arguments of plotdigitizer.digitize_image
+    """
+    return {
+        # pixels of the trajectory relative to the figure width scale with
+        # the vertical factor; 1/8 at 7x2
+        'min_traj_fraction': resize_fy / 16,
+        # roughly 1.5 rows of the original figure; 3 at 7x2
+        'erase_near_axis': max(1, int(1.5 * resize_fy)),
+        # calibration is only truncated to whole pixels at 7x2 so existing
+        # results are unchanged
+        'subpixel': (resize_fx, resize_fy) != (7, 2),
+    }
 
 
 def plotdigitizer_digitize(
-    img_path, output_path,
+    figure_bw, output_path,
     hor_num_first, hor_num_last, ver_num_last, ver_num_first,
-    left_grid_ind, right_grid_ind, top_grid_ind, bottom_grid_ind
+    left_grid_ind, right_grid_ind, top_grid_ind, bottom_grid_ind,
+    resize_fx=7, resize_fy=2
 ):
-    """Python process plotdigitizer
-
-    This function allows for processing in Python as plotdigitizer was
-    originally meant for the command line.
+    """Process figure with plotdigitizer
 
-    Notes
-    -----
-    Based on https://opensource.com/article/21/8/python-argparse
+    The figure is digitized in memory with plotdigitizer.digitize_image; only
+    the resulting trajectory is saved.
 
     Parameters
     ----------
-    img_path : str
-        Path to image
+    figure_bw : numpy.ndarray
+        Black and white figure to be digitized
     output_path : str
-        Path to save results of plotdigitizer
+        Path to save results of plotdigitizer; not saved if None
     hor_num_first : int
         First number extracted from the horiztonal axis image
     hor_num_last : int
@@ -471,37 +753,59 @@ def plotdigitizer_digitize(
         Index of the top most grid line
     bottom_grid_ind : int
         Index of the bottom most grid line
+    resize_fx : int, optional
+        Horizontal factor the figure was upsampled by, by default 7
+    resize_fy : int, optional
+        Vertical factor the figure was upsampled by, by default 2
+
+    Returns
+    -------
+    numpy.ndarray
+        Trajectory of shape (n, 2); n is 0 if the figure is all white
     """
-    # parser arguments are modified from plotdigitizer.plotdigitizer.main
-    parser = argparse.ArgumentParser()
-    parser.add_argument("INPUT", type=pathlib.Path)
-    parser.add_argument("--data-point", "-p", required=True, action="append")
-    parser.add_argument("--location", "-l", required=False, action="append")
-    parser.add_argument("--plot", required=False)
-    parser.add_argument("--output", "-o", required=False, type=str)
-    parser.add_argument("--preprocess", required=False, action="store_true")
-    parser.add_argument("--debug", required=False, action="store_true")
-
-    value = parser.parse_args([
-        img_path,
-        '-p', '{},{}'.format(str(hor_num_first), str(ver_num_last)),
-        '-p', '{},{}'.format(str(hor_num_first), str(ver_num_first)),
-        '-p', '{},{}'.format(str(hor_num_last), str(ver_num_first)),
-        '-l', '{},{}'.format(str(left_grid_ind), str(top_grid_ind)),
-        '-l', '{},{}'.format(str(left_grid_ind), str(bottom_grid_ind)),
-        '-l', '{},{}'.format(str(right_grid_ind), str(bottom_grid_ind)),
-        '--output',
-        output_path,
-        '--preprocess'
-    ])
+    data_points = [
+        (hor_num_first, ver_num_last),
+        (hor_num_first, ver_num_first),
+        (hor_num_last, ver_num_first),
+    ]
+    locations = [
+        (left_grid_ind, top_grid_ind),
+        (left_grid_ind, bottom_grid_ind),
+        (right_grid_ind, bottom_grid_ind),
+    ]
 
     try:
-        plotdigitizer.plotdigitizer.run(value)
+        traj_x, traj_y = plotdigitizer.plotdigitizer.digitize_image(
+            figure_bw, data_points, locations, preprocess=True,
+            **plotdigitizer_params(resize_fx, resize_fy)
+        )
+        traj = np.column_stack([traj_x, traj_y])
     except AssertionError:
         # plotdigitizer will raise AssertionError: Could not read meaningful data
         # if figure is all white; write an empty csv file as a result
+        traj = np.empty((0, 2))
+
+    if output_path is not None:
+        write_traj(output_path, traj)
+
+    return traj
+
+
+def write_traj(output_path, traj):
+    """Save trajectory in the plotdigitizer csv format
+
+    Parameters
+    ----------
+    output_path : str
+        Path to save the trajectory
+    traj : numpy.ndarray
+        Trajectory of shape (n, 2); an empty file is written if n is 0
+    """
+    if traj.shape[0] == 0:
         with open(output_path, "w") as my_empty_csv:
             pass
+    else:
+        np.savetxt(output_path, traj, fmt='%g', delimiter=' ')
 
 
 def ver_abs_num_checks(ver_num_first, ver_num_last):
@@ -664,164 +968,496 @@ def mod_axis_num(stat_ind, stat_num, mod_ind, mod_num, new_ind):
     return str(new_num)
 
 
-def main():
-    digitize_path = os.path.abspath(os.path.join(
-        os.path.dirname(__file__), '../../data/raw/digitize_screenshots'
-    ))
-    spiroware_screenshots_path = os.path.abspath(os.path.join(
-        os.path.dirname(__file__), '../../data/raw/spiroware_screenshots'
-    ))
+def crop_figure(screenshot_path, corner_matcher):
+    """Read a Spiroware screenshot and crop it to the figure
 
-    # get list of all screenshots
-    spiroware_screenshots = []
-    for (_, _, filenames) in os.walk(spiroware_screenshots_path):
-        spiroware_screenshots.extend(filenames)
-        break
+    Parameters
+    ----------
+    screenshot_path : str
+        Path to the Spiroware screenshot
+    corner_matcher : corner_match.CornerMatcher
+        Matcher of the corner images used to crop the screenshot
 
-    # get list of all screenshots digitized
-    completed_digits = []
-    for (_, _, filenames) in os.walk(digitize_path):
-        completed_digits.extend(filenames)
-        break
-    completed_digits = [
-        re.sub('.csv', '', fname) for fname in completed_digits
-    ]
+    Returns
+    -------
+    screenshot_type : str
+        Type of screenshot (i.e. 'co2', 'flow')
+    spiro_fig : numpy.ndarray
+        Cropped figure including the axis text
+    crop_confidence : float
+        Lowest match confidence of the two corners; see
+        corner_match.CornerMatcher.crop
+    """
+    file_no_path = re.sub(r'\.png', '', os.path.basename(screenshot_path))
 
-    # spiroware_screenshots contains all screenshots not digitized
-    spiroware_screenshots = [
-        fname
-        for fname in spiroware_screenshots
-        if re.sub('.png', '', fname) not in completed_digits
-    ]
+    screenshot_type = re.sub('.*_', '', file_no_path)
 
-    # corner images are used as landmarks for cropping purposes
-    corner_imgs = {
-        'co2': {
-            'bottom_left': cv2.imread(os.path.join(
-                os.path.dirname(__file__), 'assets/co2_bottom_left.png'
-            )),
-            'top_right': cv2.imread(os.path.join(
-                os.path.dirname(__file__), 'assets/co2_top_right.png'
-            )),
-        },
-        'flow': {
-            'bottom_left': cv2.imread(os.path.join(
-                os.path.dirname(__file__), 'assets/flow_bottom_left.png')
-            ),
-            'top_right': cv2.imread(os.path.join(
-                os.path.dirname(__file__), 'assets/flow_top_right.png')
-            ),
-        },
-        'n2': {
-            'bottom_left': cv2.imread(os.path.join(
-                os.path.dirname(__file__), 'assets/n2_bottom_left.png')
-            ),
-            'top_right': cv2.imread(os.path.join(
-                os.path.dirname(__file__), 'assets/n2_top_right.png')
-            ),
-        },
-        'o2': {
-            'bottom_left': cv2.imread(os.path.join(
-                os.path.dirname(__file__), 'assets/o2_bottom_left.png')
-            ),
-            'top_right': cv2.imread(os.path.join(
-                os.path.dirname(__file__), 'assets/o2_top_right.png')
-            ),
-        },
-        'volume': {
-            'bottom_left': cv2.imread(os.path.join(
-                os.path.dirname(__file__), 'assets/volume_bottom_left.png')
-            ),
-            'top_right': cv2.imread(os.path.join(
-                os.path.dirname(__file__), 'assets/volume_top_right.png')
-            ),
-        }
-    }
+    spiroware_screenshot = cv2.imread(screenshot_path)
 
-    for spiroware_screenshot in spiroware_screenshots:
-        print(spiroware_screenshot)
-        file_no_path = re.sub(r'\.png', '', spiroware_screenshot)
+    spiro_fig, crop_confidence = corner_matcher.crop(
+        spiroware_screenshot, screenshot_type
+    )
 
-        screenshot_type = re.sub('.*_', '', spiroware_screenshot)
-        screenshot_type = re.sub(r'\.png', '', screenshot_type)
+    return screenshot_type, spiro_fig, crop_confidence
 
-        spiroware_screenshot = cv2.imread(os.path.join(
-            spiroware_screenshots_path, spiroware_screenshot
-        ))
 
-        spiro_fig = crop_screenshot(
-            spiroware_screenshot,
-            corner_imgs[screenshot_type]['bottom_left'],
-            corner_imgs[screenshot_type]['top_right']
-        )
+def digitize_screenshot(
+    screenshot_path, output_path, corner_matcher, glyph_bank=None
+):
+    """Digitize a single Spiroware screenshot
 
-        # remove horizontal and vertical text
-        spiro_fig_wo_text = spiro_fig[
-            :hor_char_row_ind(spiro_fig), ver_char_row_ind(spiro_fig):
-        ]
-        # remove horizontal and vertical numerical values
-        # save for OCR
-        ver_num_axis_ind = ver_char_row_ind(spiro_fig_wo_text)
-        hor_num_axis_ind = hor_char_row_ind(spiro_fig_wo_text)
+    Parameters
+    ----------
+    screenshot_path : str
+        Path to the Spiroware screenshot
+    output_path : str
+        Path to save results of plotdigitizer
+    corner_matcher : corner_match.CornerMatcher
+        Matcher of the corner images used to crop the screenshot
+    glyph_bank : axis_ocr.GlyphBank, optional
+        Templates used to read the axis numbers; Tesseract is used if None,
+        by default None
 
-        ver_num_first, ver_num_last = get_axis_val(
-            spiro_fig_wo_text, ver_num_axis_ind, False
-        )
+    Returns
+    -------
+    numpy.ndarray
+        Trajectory of shape (n, 2)
+    """
+    screenshot_type, spiro_fig, _ = crop_figure(
+        screenshot_path, corner_matcher
+    )
 
-        if (screenshot_type in ['flow', 'volume']):
-            ver_num_first, ver_num_last = ver_abs_num_checks(
-                ver_num_first, ver_num_last
-            )
-        else:
-            ver_num_first, ver_num_last = ver_rel_num_checks(
-                ver_num_first, ver_num_last
-            )
+    return digitize_figure(spiro_fig, screenshot_type, output_path, glyph_bank)
+
+
+def digitize_figure(spiro_fig, screenshot_type, output_path, glyph_bank=None):
+    """Digitize a cropped Spiroware figure
+
+    Parameters
+    ----------
+    spiro_fig : numpy.ndarray
+        Cropped figure including the axis text; see crop_figure
+    screenshot_type : str
+        Type of screenshot (i.e. 'co2', 'flow')
+    output_path : str
+        Path to save results of plotdigitizer; not saved if None
+    glyph_bank : axis_ocr.GlyphBank, optional
+        Templates used to read the axis numbers; Tesseract is used if None,
+        by default None
+
+    Returns
+    -------
+    numpy.ndarray
+        Trajectory of shape (n, 2)
+    """
+    # remove horizontal and vertical text
+    hor_text_ind, ver_text_ind = char_row_inds(spiro_fig)
+    spiro_fig_wo_text = spiro_fig[:hor_text_ind, ver_text_ind:]
+    # remove horizontal and vertical numerical values
+    # save for OCR
+    hor_num_axis_ind, ver_num_axis_ind = char_row_inds(spiro_fig_wo_text)
+
+    ver_num_first, ver_num_last = get_axis_val(
+        spiro_fig_wo_text, ver_num_axis_ind, False, glyph_bank
+    )
 
-        # horizontal number first is assumed to be 0
-        _, hor_num_last = get_axis_val(
-            spiro_fig_wo_text, hor_num_axis_ind, True
+    if (screenshot_type in ['flow', 'volume']):
+        ver_num_first, ver_num_last = ver_abs_num_checks(
+            ver_num_first, ver_num_last
+        )
+    else:
+        ver_num_first, ver_num_last = ver_rel_num_checks(
+            ver_num_first, ver_num_last
         )
-        hor_num_last = hor_num_checks(hor_num_last)
 
-        # remove axes
-        spiro_fig_wo_axes = spiro_fig_wo_text[
-            :hor_num_axis_ind, ver_num_axis_ind:
-        ]
-        # temporary resize due to plotdigitize not picking up points
+    # horizontal number first is assumed to be 0
+    _, hor_num_last = get_axis_val(
+        spiro_fig_wo_text, hor_num_axis_ind, True, glyph_bank
+    )
+    hor_num_last = hor_num_checks(hor_num_last)
+
+    # remove axes
+    spiro_fig_wo_axes = spiro_fig_wo_text[
+        :hor_num_axis_ind, ver_num_axis_ind:
+    ]
+    # temporary resize due to plotdigitize not picking up points; skipped
+    # when digitizing at the native resolution
+    resize_fx = digitize_params['resize_fx']
+    resize_fy = digitize_params['resize_fy']
+    if (resize_fx, resize_fy) == (1, 1):
+        spiro_fig_wo_axes_rz = spiro_fig_wo_axes
+    else:
         spiro_fig_wo_axes_rz = cv2.resize(
-            spiro_fig_wo_axes, (0, 0), fx=7, fy=2,
+            spiro_fig_wo_axes, (0, 0), fx=resize_fx, fy=resize_fy,
             interpolation=cv2.INTER_NEAREST
         )
 
-        # use figure in colour to distinguish between data points and grid lines
-        top_grid_ind = get_top_grid_ind(spiro_fig_wo_axes_rz, 75)
-        bottom_grid_ind = get_bottom_grid_ind(spiro_fig_wo_axes_rz, 75)
-        left_grid_ind = get_left_grid_ind(spiro_fig_wo_axes_rz, 75)
-        right_grid_ind = get_right_grid_ind(spiro_fig_wo_axes_rz, 75)
-
-        # plotdigitizer does not evaulate data outside the indices it is given
-        # get values at the edges of the figure so all data is evaluated
-        # co2 values don't go to 0 when using the mod_axis_num due to rounding
-        if screenshot_type != 'co2':
-            ver_num_first = mod_axis_num(
-                top_grid_ind, ver_num_last,
-                bottom_grid_ind, ver_num_first, 0
-            )
-            bottom_grid_ind = 0
+    # use figure in colour to distinguish between data points and grid lines
+    (
+        left_grid_ind, right_grid_ind, top_grid_ind, bottom_grid_ind
+    ) = get_grid_inds(spiro_fig_wo_axes_rz, digitize_params['num_points'])
+
+    # plotdigitizer does not evaulate data outside the indices it is given
+    # get values at the edges of the figure so all data is evaluated
+    # co2 values don't go to 0 when using the mod_axis_num due to rounding
+    if screenshot_type != 'co2':
+        ver_num_first = mod_axis_num(
+            top_grid_ind, ver_num_last,
+            bottom_grid_ind, ver_num_first, 0
+        )
+        bottom_grid_ind = 0
+
+    # digitize black and white figure
+    return plotdigitizer_digitize(
+        convert_bw(spiro_fig_wo_axes_rz, digitize_params['bw_threshold']),
+        output_path,
+        0, hor_num_last, ver_num_last, ver_num_first,
+        left_grid_ind, right_grid_ind, top_grid_ind, bottom_grid_ind,
+        resize_fx, resize_fy
+    )
+
+
+# populated once per worker process by init_worker
+worker_state = {}
+
+
+def init_worker(cache_dir=None, validate_title=False, params=None):
+    """Initialize a worker process used to digitize screenshots
 
-        # create a temporary file that will be digitized by plotdigitizer
-        cv2.imwrite(
-            os.path.join(digitize_path, 'temp_fig_file.png'),
-            convert_bw(spiro_fig_wo_axes_rz)
+    Parameters
+    ----------
+    cache_dir : str, optional
+        Folder containing the digitization cache, by default None (results
+        are not cached)
+    validate_title : bool, optional
+        Check the vertical axis title of each screenshot against
+        expected_text, by default False
+    params : dict, optional
+        Values of digitize_params which differ from the defaults (i.e. from
+        the command line); passed explicitly since worker processes may not
+        inherit the parent's module state, by default None
+    """
+    digitize_params.update(params or {})
+    # corner locations are remembered between screenshots of a worker
+    worker_state['corner_matcher'] = corner_match.CornerMatcher(
+        corner_match.load_corner_imgs()
+    )
+    worker_state['glyph_bank'] = axis_ocr.GlyphBank.load(glyph_bank_path)
+    worker_state['cache_dir'] = cache_dir
+    worker_state['validate_title'] = validate_title
+    # load the tesseract model before the first screenshot is digitized
+    ocr_service.get_service()
+
+
+def digitize_worker(screenshot_path, output_path, key=None):
+    """Digitize a screenshot in a worker process
+
+    Exceptions are caught so a single problematic screenshot does not stop
+    the remaining screenshots from being digitized.
+
+    Parameters
+    ----------
+    screenshot_path : str
+        Path to the Spiroware screenshot
+    output_path : str
+        Path to save results of plotdigitizer
+    key : str, optional
+        Cache key of the screenshot; the trajectory is saved in the cache if
+        given, by default None
+
+    Returns
+    -------
+    fname : str
+        File name of the screenshot
+    status : str
+        'success' or 'failure'
+    error : str
+        Error message if the screenshot could not be digitized
+    title_check : str
+        'pass' or 'fail' if the axis title was validated, 'error' if it could
+        not be validated, otherwise ''
+    crop_confidence : float
+        Lowest match confidence of the two corners; None if the screenshot
+        could not be cropped
+    """
+    fname = os.path.basename(screenshot_path)
+    title_check = ''
+    crop_confidence = None
+    try:
+        # the figure is cropped once for both the title check and digitizing
+        screenshot_type, spiro_fig, crop_confidence = crop_figure(
+            screenshot_path, worker_state['corner_matcher']
+        )
+        if worker_state['validate_title']:
+            # the title check is a diagnostic; its errors do not stop the
+            # screenshot from being digitized
+            try:
+                title_check = (
+                    'pass' if check_axis_title(spiro_fig, screenshot_type)
+                    else 'fail'
+                )
+            except Exception:
+                title_check = 'error'
+        traj = digitize_figure(
+            spiro_fig, screenshot_type, output_path,
+            worker_state['glyph_bank']
         )
+        if key is not None:
+            digitize_cache.save_entry(worker_state['cache_dir'], key, traj)
+    except Exception as e:
+        return (
+            fname, 'failure', '{}: {}'.format(type(e).__name__, e),
+            title_check, crop_confidence
+        )
+
+    return fname, 'success', '', title_check, crop_confidence
+
+
+def digitize_batch(
+    screenshot_paths, digitize_path, workers=1, cache=None,
+    validate_title=False
+):
+    """Digitize screenshots using a pool of worker processes
+
+    Parameters
+    ----------
+    screenshot_paths : list of str
+        Paths of the Spiroware screenshots to be digitized
+    digitize_path : str
+        Folder used to save the results of plotdigitizer
+    workers : int, optional
+        Number of worker processes; screenshots are digitized in the current
+        process if 1, by default 1
+    cache : digitize_cache.DigitizeCache, optional
+        Screenshots found in the cache are written from the cache instead of
+        being digitized, by default None
+    validate_title : bool, optional
+        Check the vertical axis title of each screenshot against
+        expected_text; cached screenshots without a title check are
+        digitized again, by default False
+
+    Returns
+    -------
+    list of tuple
+        (fname, status, error, title_check, crop_confidence) for every
+        screenshot; see digitize_worker. status is 'cached' if the screenshot
+        was found in the cache
+    """
+    output_paths = [
+        os.path.join(digitize_path, '{}.csv'.format(
+            re.sub(r'\.png', '', os.path.basename(screenshot_path))
+        ))
+        for screenshot_path in screenshot_paths
+    ]
 
-        # digitize black and white figure
-        plotdigitizer_digitize(
-            os.path.join(digitize_path, 'temp_fig_file.png'),
-            os.path.join(digitize_path, '{}.csv'.format(file_no_path)),
-            0, hor_num_last, ver_num_last, ver_num_first,
-            left_grid_ind, right_grid_ind, top_grid_ind, bottom_grid_ind
+    results = []
+    if cache is None:
+        keys = [None] * len(screenshot_paths)
+        cache_dir = None
+    else:
+        # look up the whole batch at once; only screenshots with new content
+        # (or digitized by another version of the pipeline) are digitized
+        # the glyph bank affects how the axis numbers are read
+        cache_params = dict(
+            digitize_params, glyph_bank=axis_ocr.bank_hash(glyph_bank_path)
         )
+        keys = digitize_cache.screenshot_keys(
+            screenshot_paths, pipeline_version, cache_params
+        )
+        cache_dir = cache.cache_dir
+        is_cached = cache.lookup(keys)
+        if validate_title:
+            is_cached = [
+                cached and cache.get_check(key, 'title_check') is not None
+                for key, cached in zip(keys, is_cached)
+            ]
+        for screenshot_path, output_path, key, cached in zip(
+            screenshot_paths, output_paths, keys, is_cached
+        ):
+            if cached:
+                if not cache.is_output_current(output_path, key):
+                    write_traj(output_path, cache.load(key))
+                    cache.set_output(output_path, key)
+                results.append((
+                    os.path.basename(screenshot_path), 'cached', '',
+                    cache.get_check(key, 'title_check')
+                    if validate_title else '',
+                    cache.get_check(key, 'crop_confidence')
+                ))
+        screenshot_paths, output_paths, keys = [
+            [item for item, cached in zip(items, is_cached) if not cached]
+            for items in [screenshot_paths, output_paths, keys]
+        ]
+
+    batch_results = []
+    if workers == 1:
+        init_worker(cache_dir, validate_title, digitize_params)
+        for paths in zip(screenshot_paths, output_paths, keys):
+            batch_results.append(digitize_worker(*paths))
+            print(batch_results[-1][0])
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker,
+            initargs=(cache_dir, validate_title, digitize_params)
+        ) as executor:
+            futures = [
+                executor.submit(digitize_worker, *paths)
+                for paths in zip(screenshot_paths, output_paths, keys)
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                batch_results.append(future.result())
+                print(batch_results[-1][0])
+
+    if cache is not None:
+        # only the parent process updates the index
+        key_lookup = {
+            os.path.basename(screenshot_path): (key, output_path)
+            for screenshot_path, output_path, key in zip(
+                screenshot_paths, output_paths, keys
+            )
+        }
+        for fname, status, _, title_check, crop_confidence in batch_results:
+            if status == 'success':
+                # title checks which could not be run are tried again
+                cache.add(*key_lookup[fname], {
+                    'title_check': (
+                        title_check if title_check in ['pass', 'fail']
+                        else None
+                    ),
+                    'crop_confidence': crop_confidence
+                })
+        cache.write_index()
+
+    return results + batch_results
+
+
+def write_report(results, report_path):
+    """Save the result of every digitized screenshot
+
+    Parameters
+    ----------
+    results : list of tuple
+        (fname, status, error, title_check, crop_confidence) for every
+        screenshot; see digitize_batch
+    report_path : str
+        Path of the csv report
+    """
+    with open(report_path, 'w', newline='') as report_file:
+        writer = csv.writer(report_file)
+        writer.writerow(
+            ['fname', 'status', 'error', 'title_check', 'crop_confidence']
+        )
+        writer.writerows(sorted(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Digitize Spiroware screenshots'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count(),
+        help='Number of worker processes, by default the number of CPUs'
+    )
+    parser.add_argument(
+        '--cache-dir', default=os.path.abspath(os.path.join(
+            os.path.dirname(__file__),
+            '../../data/intermediary/digitize_cache'
+        )),
+        help='Folder containing the digitization cache'
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='Do not use the cache; only screenshots without a csv file in '
+        'the digitize folder are digitized'
+    )
+    parser.add_argument(
+        '--evict-stale', action='store_true',
+        help='Remove cache entries created by other pipeline versions'
+    )
+    parser.add_argument(
+        '--upsample', type=int, nargs=2, metavar=('FX', 'FY'),
+        default=[digitize_params['resize_fx'], digitize_params['resize_fy']],
+        help='Factors the figure is upsampled by before digitizing; 1 1 '
+        'digitizes the figure at its native resolution, by default 7 2'
+    )
+    parser.add_argument(
+        '--validate-title', action='store_true',
+        help='Check the vertical axis title of each screenshot (see '
+        '2-confirm_screenshot.py) while digitizing'
+    )
+    parser.add_argument(
+        '--report', default=os.path.abspath(os.path.join(
+            os.path.dirname(__file__),
+            '../../data/intermediary/digitize_screenshots_report.csv'
+        )),
+        help='Path of the csv file summarizing the result of each screenshot'
+    )
+    args = parser.parse_args()
+    digitize_params['resize_fx'], digitize_params['resize_fy'] = args.upsample
+
+    digitize_path = os.path.abspath(os.path.join(
+        os.path.dirname(__file__), '../../data/raw/digitize_screenshots'
+    ))
+    spiroware_screenshots_path = os.path.abspath(os.path.join(
+        os.path.dirname(__file__), '../../data/raw/spiroware_screenshots'
+    ))
+
+    # get list of all screenshots
+    spiroware_screenshots = []
+    for (_, _, filenames) in os.walk(spiroware_screenshots_path):
+        spiroware_screenshots.extend(filenames)
+        break
+
+    if args.no_cache:
+        cache = None
+
+        # get list of all screenshots digitized
+        completed_digits = []
+        for (_, _, filenames) in os.walk(digitize_path):
+            completed_digits.extend(filenames)
+            break
+        completed_digits = [
+            re.sub('.csv', '', fname) for fname in completed_digits
+        ]
+
+        # spiroware_screenshots contains all screenshots not digitized
+        spiroware_screenshots = [
+            fname
+            for fname in spiroware_screenshots
+            if re.sub('.png', '', fname) not in completed_digits
+        ]
+    else:
+        # the cache determines which screenshots need to be digitized
+        cache = digitize_cache.DigitizeCache(args.cache_dir, pipeline_version)
+        if args.evict_stale:
+            print('Evicted {} stale cache entries'.format(cache.evict_stale()))
+
+    spiroware_screenshots = [
+        os.path.join(spiroware_screenshots_path, fname)
+        for fname in spiroware_screenshots
+    ]
+
+    results = digitize_batch(
+        spiroware_screenshots, digitize_path, args.workers, cache,
+        args.validate_title
+    )
+    write_report(results, args.report)
+
+    # print screenshots with issues so they can be followed up
+    for fname, status, error, title_check, crop_confidence in sorted(results):
+        if status == 'failure':
+            print('Image issue: {} ({})'.format(fname, error))
+        if title_check == 'fail':
+            print('Axis title issue: {}'.format(fname))
+        elif title_check == 'error':
+            print('Axis title could not be checked: {}'.format(fname))
+        if (
+            crop_confidence is not None
+            and crop_confidence < corner_match.min_confidence
+        ):
+            print('Low crop confidence: {} ({:.3f})'.format(
+                fname, crop_confidence
+            ))
 
 
 if __name__ == "__main__":
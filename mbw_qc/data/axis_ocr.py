@@ -0,0 +1,330 @@
+"""Read Spiroware axis numbers by matching glyphs against a glyph bank
+
+Spiroware always renders the axis numbers with the same font, so the digits
+can be read by segmenting the axis image into connected components and
+comparing each component to templates ('glyphs') collected from previously
+processed screenshots. The glyph bank is created with
+helper_build_glyph_bank.py.
+"""
+
+import hashlib
+import os
+import cv2
+import numpy as np
+
+# size of the normalized glyph images
+glyph_shape = (20, 20)
+
+
+def binarize_axis(num_axis, threshold=150):
+    """Get the foreground (dark text) of an axis image
+
+    Parameters
+    ----------
+    num_axis : numpy.ndarray
+        Colour image of the axis numbers; numbers should be upright and read
+        from left to right
+    threshold : int, optional
+        Pixels less than or equal to the threshold are foreground, by default
+        150
+
+    Returns
+    -------
+    numpy.ndarray
+        uint8 image where foreground pixels are 1
+    """
+    num_axis_gray = cv2.cvtColor(num_axis, cv2.COLOR_BGR2GRAY)
+
+    return (num_axis_gray <= threshold).astype(np.uint8)
+
+
+def normalize_glyph(glyph):
+    """Resize a glyph to glyph_shape while keeping its aspect ratio
+
+    Parameters
+    ----------
+    glyph : numpy.ndarray
+        Foreground mask of a single glyph spanning the height of the text line
+
+    Returns
+    -------
+    numpy.ndarray
+        Flattened float32 glyph with zero mean and unit norm
+    """
+    (glyph_h, glyph_w) = glyph_shape
+    new_w = round(glyph.shape[1] * glyph_h / glyph.shape[0])
+    new_w = max(1, min(glyph_w, new_w))
+    resized = cv2.resize(
+        glyph.astype(np.float32), (new_w, glyph_h),
+        interpolation=cv2.INTER_AREA
+    )
+    # center horizontally so narrow glyphs (i.e. '1') keep their shape
+    padded = np.zeros(glyph_shape, dtype=np.float32)
+    left = (glyph_w - new_w) // 2
+    padded[:, left:(left + new_w)] = resized
+
+    padded = padded.ravel() - padded.mean()
+    norm = np.linalg.norm(padded)
+
+    return padded / norm if norm > 0 else padded
+
+
+def segment_axis(num_axis, min_area=2, space_ratio=0.4):
+    """Split an axis image into glyphs grouped into numbers
+
+    Parameters
+    ----------
+    num_axis : numpy.ndarray
+        Colour image of the axis numbers
+    min_area : int, optional
+        Components with fewer pixels are considered noise, by default 2
+    space_ratio : float, optional
+        A gap wider than space_ratio times the text height starts a new
+        number, by default 0.4
+
+    Returns
+    -------
+    glyphs : numpy.ndarray
+        Normalized glyphs of shape (number of glyphs, glyph size); see
+        normalize_glyph
+    token_ids : numpy.ndarray
+        Index of the number each glyph belongs to
+    """
+    foreground = binarize_axis(num_axis)
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(
+        foreground, connectivity=8
+    )
+    # label 0 is the background
+    comp_ids = np.flatnonzero(stats[1:, cv2.CC_STAT_AREA] >= min_area) + 1
+    if comp_ids.size == 0:
+        glyphs = np.empty((0, glyph_shape[0] * glyph_shape[1]), np.float32)
+        return glyphs, np.empty(0, dtype=int)
+
+    comp_ids = comp_ids[np.argsort(stats[comp_ids, cv2.CC_STAT_LEFT])]
+    left = stats[comp_ids, cv2.CC_STAT_LEFT]
+    right = left + stats[comp_ids, cv2.CC_STAT_WIDTH]
+    top = stats[comp_ids, cv2.CC_STAT_TOP]
+    bottom = top + stats[comp_ids, cv2.CC_STAT_HEIGHT]
+
+    # glyphs span the full text line so '-' can be distinguished by position
+    line_top, line_bottom = top.min(), bottom.max()
+    line_height = line_bottom - line_top
+
+    glyphs = np.stack([
+        normalize_glyph(
+            labels[line_top:line_bottom, comp_left:comp_right] == comp_id
+        )
+        for comp_id, comp_left, comp_right in zip(comp_ids, left, right)
+    ])
+
+    gaps = left[1:] - right[:-1]
+    token_ids = np.concatenate(
+        [[0], np.cumsum(gaps > (space_ratio * line_height))]
+    )
+
+    return glyphs, token_ids
+
+
+class GlyphBank:
+    """Templates of the characters used in the Spiroware axis numbers
+
+    Parameters
+    ----------
+    chars : list of str, optional
+        Character associated with each template
+    templates : numpy.ndarray, optional
+        Normalized templates of shape (number of templates, glyph size)
+    """
+
+    def __init__(self, chars=None, templates=None):
+        self.chars = np.array(chars if chars is not None else [], dtype='<U1')
+        self.templates = (
+            np.asarray(templates, dtype=np.float32) if templates is not None
+            else np.empty((0, glyph_shape[0] * glyph_shape[1]), np.float32)
+        )
+        self.glyph_sums = {}
+        self.glyph_counts = {}
+
+    @classmethod
+    def load(cls, bank_path):
+        """Load a glyph bank saved with GlyphBank.save
+
+        Parameters
+        ----------
+        bank_path : str
+            Path of the .npz file
+
+        Returns
+        -------
+        GlyphBank
+            Glyph bank; None if bank_path does not exist
+        """
+        if not os.path.exists(bank_path):
+            return None
+        with np.load(bank_path) as bank:
+            return cls(bank['chars'], bank['templates'])
+
+    def save(self, bank_path):
+        """Save the glyph bank
+
+        Parameters
+        ----------
+        bank_path : str
+            Path of the .npz file
+        """
+        np.savez_compressed(
+            bank_path, chars=self.chars, templates=self.templates
+        )
+
+    def add_labelled(self, num_axis, axis_text):
+        """Add the glyphs of an axis image with a known text
+
+        The glyphs are only used if the number of characters in axis_text is
+        the same as the number of segmented glyphs.
+
+        Parameters
+        ----------
+        num_axis : numpy.ndarray
+            Colour image of the axis numbers
+        axis_text : str
+            Text of the axis image (i.e. from Tesseract)
+
+        Returns
+        -------
+        bool
+            True if the glyphs were added
+        """
+        chars = ''.join(axis_text.split())
+        glyphs, _ = segment_axis(num_axis)
+        if len(glyphs) == 0 or len(glyphs) != len(chars):
+            return False
+
+        for char, glyph in zip(chars, glyphs):
+            self.glyph_sums[char] = self.glyph_sums.get(char, 0) + glyph
+            self.glyph_counts[char] = self.glyph_counts.get(char, 0) + 1
+
+        return True
+
+    def finalize(self, source=None):
+        """Create the templates from the average of the labelled glyphs
+
+        Parameters
+        ----------
+        source : str, optional
+            Where the labelled glyphs came from (i.e. a screenshot folder),
+            only used in the error message
+
+        Raises
+        ------
+        ValueError
+            If no glyphs were added with add_labelled
+        """
+        if not self.glyph_sums:
+            raise ValueError('No glyphs were added to the glyph bank{}'.format(
+                '' if source is None else ' from {}'.format(source)
+            ))
+        self.chars = np.array(sorted(self.glyph_sums), dtype='<U1')
+        self.templates = np.stack([
+            normalize_template(
+                self.glyph_sums[char] / self.glyph_counts[char]
+            )
+            for char in self.chars
+        ]).astype(np.float32)
+
+    def match(self, glyphs, allowed_chars):
+        """Match glyphs against the templates
+
+        Parameters
+        ----------
+        glyphs : numpy.ndarray
+            Normalized glyphs; see segment_axis
+        allowed_chars : str
+            Characters which can be matched
+
+        Returns
+        -------
+        chars : numpy.ndarray
+            Best matching character of each glyph
+        scores : numpy.ndarray
+            Normalized cross-correlation of each glyph with its best match
+        """
+        allowed = np.isin(self.chars, list(allowed_chars))
+        # glyphs and templates have zero mean and unit norm so the dot
+        # product is the normalized cross-correlation
+        scores = glyphs @ self.templates[allowed].T
+        best = scores.argmax(axis=1)
+
+        return self.chars[allowed][best], scores[np.arange(len(best)), best]
+
+    def read(self, num_axis, allowed_chars, min_confidence):
+        """Read the numbers of an axis image
+
+        Parameters
+        ----------
+        num_axis : numpy.ndarray
+            Colour image of the axis numbers
+        allowed_chars : str
+            Characters which can be matched
+        min_confidence : float
+            Minimum normalized cross-correlation every glyph must have with
+            its best match
+
+        Returns
+        -------
+        str
+            Numbers separated by spaces (the same layout as Tesseract); None
+            if any glyph is matched with low confidence
+        """
+        glyphs, token_ids = segment_axis(num_axis)
+        has_allowed = np.isin(self.chars, list(allowed_chars)).any()
+        if len(glyphs) == 0 or not has_allowed:
+            return None
+
+        chars, scores = self.match(glyphs, allowed_chars)
+        if scores.min() < min_confidence:
+            return None
+
+        tokens = [''] * (token_ids[-1] + 1)
+        for char, token_id in zip(chars, token_ids):
+            tokens[token_id] += char
+
+        # the gap after a minus sign can be wider than the gap between digits
+        return ' '.join(tokens).replace('- ', '-')
+
+
+def normalize_template(template):
+    """Give a template zero mean and unit norm
+
+    Parameters
+    ----------
+    template : numpy.ndarray
+        Flattened template
+
+    Returns
+    -------
+    numpy.ndarray
+        Normalized template
+    """
+    template = template - template.mean()
+    norm = np.linalg.norm(template)
+
+    return template / norm if norm > 0 else template
+
+
+def bank_hash(bank_path):
+    """Get the hash of a saved glyph bank
+
+    Parameters
+    ----------
+    bank_path : str
+        Path of the .npz file
+
+    Returns
+    -------
+    str
+        Hexadecimal hash; None if bank_path does not exist
+    """
+    if not os.path.exists(bank_path):
+        return None
+    with open(bank_path, 'rb') as bank_file:
+        return hashlib.sha1(bank_file.read()).hexdigest()
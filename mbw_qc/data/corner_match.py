@@ -0,0 +1,286 @@
+"""Locate the corners of the Spiroware figure in a screenshot
+
+The Spiroware window layout is fixed, so the figure corners are found in
+almost the same place in every screenshot. Instead of matching the corner
+templates over the whole screenshot, each corner is searched for near its
+last known location, then in a downscaled screenshot (refined at full
+resolution), and only then over the whole screenshot.
+"""
+
+import math
+import os
+import cv2
+
+# matches below this normalized correlation coefficient are considered
+# unreliable; a bad capture (i.e. another window on top of Spiroware) is
+# usually well below this
+min_confidence = 0.9
+
+# screenshot types with corner images in the assets folder
+screenshot_types = ['co2', 'flow', 'n2', 'o2', 'volume']
+
+
+def load_corner_imgs():
+    """Load the corner images used as landmarks for cropping purposes
+
+    Returns
+    -------
+    dict
+        Maps the screenshot type to the 'bottom_left' and 'top_right' corner
+        images
+    """
+    corner_imgs = {}
+    for screenshot_type in screenshot_types:
+        corner_imgs[screenshot_type] = {
+            corner: cv2.imread(os.path.join(
+                os.path.dirname(__file__),
+                'assets/{}_{}.png'.format(screenshot_type, corner)
+            ))
+            for corner in ['bottom_left', 'top_right']
+        }
+
+    return corner_imgs
+
+
+def match_in_roi(screenshot_gray, template_gray, left, top, right, bottom):
+    """Match a template inside a region of interest
+
+    Parameters
+    ----------
+    screenshot_gray : numpy.ndarray
+        Grayscale screenshot
+    template_gray : numpy.ndarray
+        Grayscale template
+    left, top, right, bottom : int
+        Bounds of the region of interest; clipped to the screenshot
+
+    Returns
+    -------
+    loc : tuple of int
+        (x, y) of the top left corner of the best match in the screenshot
+    confidence : float
+        Normalized correlation coefficient of the best match; -1 if the
+        region is smaller than the template
+    """
+    left, top = max(left, 0), max(top, 0)
+    right = min(right, screenshot_gray.shape[1])
+    bottom = min(bottom, screenshot_gray.shape[0])
+    if (
+        (bottom - top) < template_gray.shape[0]
+        or (right - left) < template_gray.shape[1]
+    ):
+        return (left, top), -1.0
+
+    result = cv2.matchTemplate(
+        screenshot_gray[top:bottom, left:right], template_gray,
+        cv2.TM_CCOEFF_NORMED
+    )
+    (_, confidence, _, (x, y)) = cv2.minMaxLoc(result)
+
+    return (x + left, y + top), confidence
+
+
+def match_near(screenshot_gray, template_gray, loc, margin):
+    """Match a template within a margin of an expected location
+
+    Parameters
+    ----------
+    screenshot_gray : numpy.ndarray
+        Grayscale screenshot
+    template_gray : numpy.ndarray
+        Grayscale template
+    loc : tuple of int
+        Expected (x, y) of the top left corner of the template
+    margin : int
+        Number of pixels the template can be from loc
+
+    Returns
+    -------
+    loc : tuple of int
+        (x, y) of the top left corner of the best match
+    confidence : float
+        Normalized correlation coefficient of the best match
+    """
+    (x, y) = loc
+    return match_in_roi(
+        screenshot_gray, template_gray,
+        x - margin, y - margin,
+        x + template_gray.shape[1] + margin,
+        y + template_gray.shape[0] + margin
+    )
+
+
+def resize(img, scale):
+    """Downscale an image
+
+    Parameters
+    ----------
+    img : numpy.ndarray
+        Image to be resized
+    scale : float
+        Scale factor
+
+    Returns
+    -------
+    numpy.ndarray
+        Resized image
+    """
+    return cv2.resize(
+        img, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+    )
+
+
+class CornerMatcher:
+    """Coarse to fine matcher of the figure corner templates
+
+    The location of each corner is remembered per screenshot type and used as
+    the starting point of the next search.
+
+    Parameters
+    ----------
+    corner_imgs : dict
+        Maps the screenshot type to the 'bottom_left' and 'top_right' corner
+        images; see load_corner_imgs
+    min_confidence : float, optional
+        Matches below this normalized correlation coefficient fall back to a
+        wider search, by default corner_match.min_confidence
+    scale : float, optional
+        Scale of the downscaled screenshot, by default 0.25
+    prior_margin : int, optional
+        Number of pixels a corner is searched for around its last location,
+        by default 8
+    """
+
+    def __init__(
+        self, corner_imgs, min_confidence=min_confidence, scale=0.25,
+        prior_margin=8
+    ):
+        for screenshot_type, corners in corner_imgs.items():
+            for corner, img in corners.items():
+                if img is None:
+                    raise ValueError(
+                        'Corner image {} {} could not be read (see '
+                        'load_corner_imgs)'.format(screenshot_type, corner)
+                    )
+        self.min_confidence = min_confidence
+        self.scale = scale
+        self.prior_margin = prior_margin
+        self.templates = {
+            screenshot_type: {
+                corner: cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+                for corner, img in corners.items()
+            }
+            for screenshot_type, corners in corner_imgs.items()
+        }
+        self.small_templates = {
+            screenshot_type: {
+                corner: resize(template, scale)
+                for corner, template in corners.items()
+            }
+            for screenshot_type, corners in self.templates.items()
+        }
+        self.priors = {}
+
+    def locate(self, screenshot_gray, screenshot_type, corner, small=None):
+        """Find a corner template in a screenshot
+
+        Parameters
+        ----------
+        screenshot_gray : numpy.ndarray
+            Grayscale screenshot
+        screenshot_type : str
+            Type of screenshot (i.e. 'co2', 'flow')
+        corner : str
+            'bottom_left' or 'top_right'
+        small : numpy.ndarray, optional
+            Downscaled screenshot; created if needed, by default None
+
+        Returns
+        -------
+        loc : tuple of int
+            (x, y) of the top left corner of the template
+        confidence : float
+            Normalized correlation coefficient of the match
+        """
+        template = self.templates[screenshot_type][corner]
+        prior = self.priors.get((screenshot_type, corner))
+
+        # search near the last location of the corner
+        if prior is not None:
+            loc, confidence = match_near(
+                screenshot_gray, template, prior, self.prior_margin
+            )
+            if confidence >= self.min_confidence:
+                self.priors[(screenshot_type, corner)] = loc
+                return loc, confidence
+
+        # search the downscaled screenshot and refine at full resolution
+        if small is None:
+            small = resize(screenshot_gray, self.scale)
+        (small_x, small_y), _ = match_in_roi(
+            small, self.small_templates[screenshot_type][corner],
+            0, 0, small.shape[1], small.shape[0]
+        )
+        loc, confidence = match_near(
+            screenshot_gray, template,
+            (round(small_x / self.scale), round(small_y / self.scale)),
+            math.ceil(2 / self.scale)
+        )
+
+        # search the whole screenshot
+        if confidence < self.min_confidence:
+            loc, confidence = match_in_roi(
+                screenshot_gray, template,
+                0, 0, screenshot_gray.shape[1], screenshot_gray.shape[0]
+            )
+
+        if confidence >= self.min_confidence:
+            self.priors[(screenshot_type, corner)] = loc
+
+        return loc, confidence
+
+    def crop(self, screenshot, screenshot_type):
+        """Crop a Spiroware screenshot to the figure
+
+        Crops to the same corners as matching both templates against the
+        whole screenshot.
+
+        Parameters
+        ----------
+        screenshot : numpy.ndarray
+            Screenshot to be cropped
+        screenshot_type : str
+            Type of screenshot (i.e. 'co2', 'flow')
+
+        Returns
+        -------
+        crop_img : numpy.ndarray
+            Screenshot that is cropped based on templates
+        confidence : float
+            Lowest normalized correlation coefficient of the two corners; a
+            low value indicates a bad capture
+        """
+        screenshot_gray = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
+        small = None
+        if any(
+            (screenshot_type, corner) not in self.priors
+            for corner in ['bottom_left', 'top_right']
+        ):
+            small = resize(screenshot_gray, self.scale)
+
+        bottom_left_coor, bottom_left_conf = self.locate(
+            screenshot_gray, screenshot_type, 'bottom_left', small
+        )
+        top_right_coor, top_right_conf = self.locate(
+            screenshot_gray, screenshot_type, 'top_right', small
+        )
+        top_right_shape = self.templates[screenshot_type]['top_right'].shape
+
+        # crop using the top left corner of bottom_left_coordinates and
+        # bottom right corner of top_right_template
+        crop_img = screenshot[
+            (top_right_coor[1] + top_right_shape[0]):bottom_left_coor[1],
+            bottom_left_coor[0]:(top_right_coor[0] + top_right_shape[1]),
+        ]
+
+        return crop_img, min(bottom_left_conf, top_right_conf)
@@ -0,0 +1,282 @@
+"""Content addressed cache of digitized Spiroware screenshots"""
+
+import concurrent.futures
+import hashlib
+import json
+import os
+import numpy as np
+
+
+def screenshot_key(screenshot_path, version, params):
+    """Get the cache key of a screenshot
+
+    The key is the hash of the screenshot bytes combined with the pipeline
+    version and parameters, so a screenshot is only digitized again if the
+    image or the way it is digitized changes.
+
+    Parameters
+    ----------
+    screenshot_path : str
+        Path to the Spiroware screenshot
+    version : str
+        Version of the digitization pipeline
+    params : dict
+        Parameters which affect the digitization result; must be JSON
+        serializable
+
+    Returns
+    -------
+    str
+        Hexadecimal cache key
+    """
+    key_hash = hashlib.sha1()
+    with open(screenshot_path, 'rb') as screenshot_file:
+        key_hash.update(screenshot_file.read())
+    key_hash.update(
+        json.dumps(
+            {'version': version, 'params': params}, sort_keys=True
+        ).encode()
+    )
+
+    return key_hash.hexdigest()
+
+
+def screenshot_keys(screenshot_paths, version, params, workers=8):
+    """Get the cache keys of several screenshots
+
+    Screenshots are read and hashed in a thread pool since hashing releases
+    the GIL and reading is I/O bound.
+
+    Parameters
+    ----------
+    screenshot_paths : list of str
+        Paths to the Spiroware screenshots
+    version : str
+        Version of the digitization pipeline
+    params : dict
+        Parameters which affect the digitization result
+    workers : int, optional
+        Number of threads, by default 8
+
+    Returns
+    -------
+    list of str
+        Cache key of each screenshot in screenshot_paths
+    """
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=workers
+    ) as executor:
+        return list(executor.map(
+            lambda path: screenshot_key(path, version, params),
+            screenshot_paths
+        ))
+
+
+def entry_path(cache_dir, key):
+    """Get the path of a cache entry
+
+    Parameters
+    ----------
+    cache_dir : str
+        Folder containing the cache
+    key : str
+        Cache key; see screenshot_key
+
+    Returns
+    -------
+    str
+        Path of the .npy file containing the trajectory
+    """
+    # entries are split into sub folders to keep folder sizes manageable
+    return os.path.join(cache_dir, key[:2], '{}.npy'.format(key))
+
+
+def save_entry(cache_dir, key, traj):
+    """Save a trajectory in the cache
+
+    Only the .npy file is written, so this can be safely called from worker
+    processes; the entry is added to the index with DigitizeCache.add.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Folder containing the cache
+    key : str
+        Cache key; see screenshot_key
+    traj : numpy.ndarray
+        Trajectory of shape (n, 2)
+    """
+    path = entry_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write to a temporary file first so partially written entries are never
+    # read
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'wb') as entry_file:
+        np.save(entry_file, np.asarray(traj, dtype=np.float64))
+    os.replace(temp_path, path)
+
+
+class DigitizeCache:
+    """Cache of digitized screenshots keyed by screenshot content
+
+    Trajectories are stored as individual .npy files and an index
+    (index.json) records the pipeline version of every entry as well as the
+    entry last written to each output file.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Folder containing the cache
+    version : str
+        Current version of the digitization pipeline
+    """
+
+    def __init__(self, cache_dir, version):
+        self.cache_dir = cache_dir
+        self.version = version
+        self.index_path = os.path.join(cache_dir, 'index.json')
+
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as index_file:
+                index = json.load(index_file)
+        else:
+            index = {'entries': {}, 'outputs': {}}
+        self.entries = index['entries']
+        self.outputs = index['outputs']
+
+    def lookup(self, keys):
+        """Get the keys which are in the cache
+
+        Parameters
+        ----------
+        keys : list of str
+            Cache keys of interest
+
+        Returns
+        -------
+        list of bool
+            True if the associated key is in the cache
+        """
+        return [key in self.entries for key in keys]
+
+    def load(self, key):
+        """Load a trajectory from the cache
+
+        Parameters
+        ----------
+        key : str
+            Cache key; see screenshot_key
+
+        Returns
+        -------
+        numpy.ndarray
+            Trajectory of shape (n, 2)
+        """
+        return np.load(entry_path(self.cache_dir, key))
+
+    def add(self, key, output_path=None, checks=None):
+        """Add an entry saved with save_entry to the index
+
+        Parameters
+        ----------
+        key : str
+            Cache key; see screenshot_key
+        output_path : str, optional
+            Output file the trajectory was written to, by default None
+        checks : dict, optional
+            Quality checks of the screenshot (i.e. 'title_check',
+            'crop_confidence'); None values are not stored, by default None
+        """
+        self.entries[key] = {'version': self.version}
+        for name, value in (checks or {}).items():
+            if value is not None:
+                self.entries[key][name] = value
+        if output_path is not None:
+            self.set_output(output_path, key)
+
+    def get_check(self, key, name):
+        """Get a quality check of a cache entry
+
+        Parameters
+        ----------
+        key : str
+            Cache key; see screenshot_key
+        name : str
+            Name of the check (i.e. 'title_check')
+
+        Returns
+        -------
+        object
+            Value of the check; None if it was not recorded
+        """
+        return self.entries[key].get(name)
+
+    def is_output_current(self, output_path, key):
+        """Check if an output file contains the trajectory of a cache entry
+
+        Parameters
+        ----------
+        output_path : str
+            Path of the output file
+        key : str
+            Cache key; see screenshot_key
+
+        Returns
+        -------
+        bool
+            True if the output file exists and was last written from key
+        """
+        return (
+            self.outputs.get(os.path.basename(output_path)) == key
+            and os.path.exists(output_path)
+        )
+
+    def set_output(self, output_path, key):
+        """Record the cache entry last written to an output file
+
+        Parameters
+        ----------
+        output_path : str
+            Path of the output file
+        key : str
+            Cache key; see screenshot_key
+        """
+        self.outputs[os.path.basename(output_path)] = key
+
+    def evict_stale(self):
+        """Remove entries created by other versions of the pipeline
+
+        Returns
+        -------
+        int
+            Number of entries removed
+        """
+        stale_keys = [
+            key for key, entry in self.entries.items()
+            if entry['version'] != self.version
+        ]
+        for key in stale_keys:
+            del self.entries[key]
+            try:
+                os.remove(entry_path(self.cache_dir, key))
+            except FileNotFoundError:
+                pass
+
+        stale_keys = set(stale_keys)
+        self.outputs = {
+            fname: key for fname, key in self.outputs.items()
+            if key not in stale_keys
+        }
+
+        return len(stale_keys)
+
+    def write_index(self):
+        """Save the index"""
+        temp_path = '{}.tmp'.format(self.index_path)
+        with open(temp_path, 'w') as index_file:
+            json.dump(
+                {'entries': self.entries, 'outputs': self.outputs},
+                index_file
+            )
+        os.replace(temp_path, self.index_path)
@@ -0,0 +1,136 @@
+"""Build the glyph bank used to read the axis numbers of Spiroware screenshots
+
+The axis numbers of existing screenshots are read with Tesseract; glyphs are
+only added to the bank when the Tesseract text has as many characters as the
+segmented glyphs. The bank is then checked against Tesseract on a separate set
+of screenshots.
+"""
+
+import argparse
+import importlib
+import os
+import random
+import axis_ocr
+import corner_match
+
+digitize = importlib.import_module('3-digitize_screenshot')
+
+
+def axis_imgs(screenshot_path, corner_matcher):
+    """Get the images of the vertical and horizontal axis numbers
+
+    Parameters
+    ----------
+    screenshot_path : str
+        Path to the Spiroware screenshot
+    corner_matcher : corner_match.CornerMatcher
+        Matcher of the corner images used to crop the screenshot
+
+    Returns
+    -------
+    list of tuple
+        (axis image, horizontal) for the vertical and horizontal axes
+    """
+    _, spiro_fig, _ = digitize.crop_figure(screenshot_path, corner_matcher)
+    hor_text_ind, ver_text_ind = digitize.char_row_inds(spiro_fig)
+    spiro_fig_wo_text = spiro_fig[:hor_text_ind, ver_text_ind:]
+    hor_num_axis_ind, ver_num_axis_ind = digitize.char_row_inds(
+        spiro_fig_wo_text
+    )
+
+    return [
+        (digitize.get_axis_img(
+            spiro_fig_wo_text, ver_num_axis_ind, False
+        ), False),
+        (digitize.get_axis_img(
+            spiro_fig_wo_text, hor_num_axis_ind, True
+        ), True),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build the glyph bank used to read axis numbers'
+    )
+    parser.add_argument(
+        '--n-build', type=int, default=500,
+        help='Number of screenshots used to build the bank'
+    )
+    parser.add_argument(
+        '--n-validate', type=int, default=200,
+        help='Number of screenshots used to compare the bank to Tesseract'
+    )
+    args = parser.parse_args()
+
+    spiroware_screenshots_path = os.path.abspath(os.path.join(
+        os.path.dirname(__file__), '../../data/raw/spiroware_screenshots'
+    ))
+    spiroware_screenshots = sorted(
+        os.path.join(spiroware_screenshots_path, fname)
+        for fname in os.listdir(spiroware_screenshots_path)
+        if fname.endswith('.png')
+    )
+    random.seed(12345)
+    random.shuffle(spiroware_screenshots)
+    build_screenshots = spiroware_screenshots[:args.n_build]
+    validate_screenshots = spiroware_screenshots[
+        args.n_build:(args.n_build + args.n_validate)
+    ]
+
+    corner_matcher = corner_match.CornerMatcher(
+        corner_match.load_corner_imgs()
+    )
+
+    glyph_bank = axis_ocr.GlyphBank()
+    n_added = 0
+    n_axes = 0
+    for screenshot_path in build_screenshots:
+        try:
+            for num_axis, horizontal in axis_imgs(
+                screenshot_path, corner_matcher
+            ):
+                axis_text = digitize.read_axis_text(num_axis, horizontal)
+                n_axes += 1
+                n_added += glyph_bank.add_labelled(num_axis, axis_text)
+        except Exception as e:
+            print('Image issue: {} ({})'.format(screenshot_path, e))
+    # an empty bank is never saved, so Tesseract stays the only reader
+    glyph_bank.finalize(spiroware_screenshots_path)
+    glyph_bank.save(digitize.glyph_bank_path)
+    print('Added glyphs from {} of {} axes; characters: {}'.format(
+        n_added, n_axes, ''.join(glyph_bank.chars)
+    ))
+
+    # compare the glyph bank to tesseract on screenshots not used to build it
+    n_read = 0
+    n_agree = 0
+    n_axes = 0
+    for screenshot_path in validate_screenshots:
+        try:
+            for num_axis, horizontal in axis_imgs(
+                screenshot_path, corner_matcher
+            ):
+                n_axes += 1
+                allowed_chars = '0123456789' if horizontal else '0123456789-'
+                glyph_text = glyph_bank.read(
+                    num_axis, allowed_chars,
+                    digitize.digitize_params['glyph_min_confidence']
+                )
+                if glyph_text is None:
+                    # low confidence; tesseract would be used as a fallback
+                    continue
+                tesseract_text = digitize.read_axis_text(num_axis, horizontal)
+                n_read += 1
+                n_agree += (
+                    digitize.parse_axis_text(glyph_text, horizontal)
+                    == digitize.parse_axis_text(tesseract_text, horizontal)
+                )
+        except Exception as e:
+            print('Image issue: {} ({})'.format(screenshot_path, e))
+    print('Glyph bank read {} of {} axes; {} agree with Tesseract'.format(
+        n_read, n_axes, n_agree
+    ))
+
+
+if __name__ == "__main__":
+    main()
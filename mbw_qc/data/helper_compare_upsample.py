@@ -0,0 +1,182 @@
+"""Compare digitizing Spiroware screenshots upsampled and at native resolution
+
+A sample of screenshots is digitized with the original 7x2 upsampling and with
+the given upsampling factors (by default the native resolution). Both
+trajectories are interpolated onto a common grid of the horizontal axis and
+the difference is summarized relative to the range of the upsampled
+trajectory.
+"""
+
+import argparse
+import csv
+import importlib
+import os
+import random
+import tempfile
+import time
+import numpy as np
+
+digitize = importlib.import_module('3-digitize_screenshot')
+
+
+def digitize_timed(
+    spiro_fig, screenshot_type, output_path, upsample, glyph_bank=None
+):
+    """Digitize a cropped figure with the given upsampling factors
+
+    Parameters
+    ----------
+    spiro_fig : numpy.ndarray
+        Cropped figure including the axis text
+    screenshot_type : str
+        Type of screenshot (i.e. 'co2', 'flow')
+    output_path : str
+        Path to save results of plotdigitizer
+    upsample : tuple of int
+        Horizontal and vertical upsampling factors
+    glyph_bank : axis_ocr.GlyphBank, optional
+        Templates used to read the axis numbers, by default None
+
+    Returns
+    -------
+    traj : numpy.ndarray
+        Trajectory of shape (n, 2)
+    seconds : float
+        Time taken to digitize the figure
+    """
+    (
+        digitize.digitize_params['resize_fx'],
+        digitize.digitize_params['resize_fy']
+    ) = upsample
+    start = time.perf_counter()
+    traj = digitize.digitize_figure(
+        spiro_fig, screenshot_type, output_path, glyph_bank
+    )
+
+    return traj, time.perf_counter() - start
+
+
+def compare_trajs(ref_traj, traj, num_points=1000):
+    """Compare two trajectories on a common grid of the horizontal axis
+
+    Parameters
+    ----------
+    ref_traj : numpy.ndarray
+        Reference trajectory of shape (n, 2) sorted by x
+    traj : numpy.ndarray
+        Trajectory of shape (m, 2) sorted by x
+    num_points : int, optional
+        Number of points in the common grid, by default 1000
+
+    Returns
+    -------
+    mean_abs_diff : float
+        Mean absolute difference relative to the range of ref_traj
+    max_abs_diff : float
+        Maximum absolute difference relative to the range of ref_traj
+    """
+    x_min = max(ref_traj[0, 0], traj[0, 0])
+    x_max = min(ref_traj[-1, 0], traj[-1, 0])
+    x_grid = np.linspace(x_min, x_max, num_points)
+    ref_range = np.ptp(ref_traj[:, 1]) or 1.0
+
+    abs_diff = np.abs(
+        np.interp(x_grid, ref_traj[:, 0], ref_traj[:, 1])
+        - np.interp(x_grid, traj[:, 0], traj[:, 1])
+    ) / ref_range
+
+    return abs_diff.mean(), abs_diff.max()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare upsampled and native resolution digitization'
+    )
+    parser.add_argument(
+        '--n-sample', type=int, default=200,
+        help='Number of screenshots compared'
+    )
+    parser.add_argument(
+        '--upsample', type=int, nargs=2, metavar=('FX', 'FY'),
+        default=[1, 1],
+        help='Upsampling factors compared to 7 2, by default 1 1 (native)'
+    )
+    parser.add_argument(
+        '--report', default=os.path.abspath(os.path.join(
+            os.path.dirname(__file__),
+            '../../data/intermediary/compare_upsample_report.csv'
+        )),
+        help='Path of the csv file comparing each screenshot'
+    )
+    args = parser.parse_args()
+
+    spiroware_screenshots_path = os.path.abspath(os.path.join(
+        os.path.dirname(__file__), '../../data/raw/spiroware_screenshots'
+    ))
+    spiroware_screenshots = sorted(
+        fname for fname in os.listdir(spiroware_screenshots_path)
+        if fname.endswith('.png')
+    )
+    random.seed(12345)
+    spiroware_screenshots = random.sample(
+        spiroware_screenshots, min(args.n_sample, len(spiroware_screenshots))
+    )
+
+    digitize.init_worker()
+    corner_matcher = digitize.worker_state['corner_matcher']
+    glyph_bank = digitize.worker_state['glyph_bank']
+
+    rows = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, 'traj.csv')
+        for fname in spiroware_screenshots:
+            try:
+                screenshot_type, spiro_fig, _ = digitize.crop_figure(
+                    os.path.join(spiroware_screenshots_path, fname),
+                    corner_matcher
+                )
+                ref_traj, ref_seconds = digitize_timed(
+                    spiro_fig, screenshot_type, output_path, (7, 2), glyph_bank
+                )
+                traj, seconds = digitize_timed(
+                    spiro_fig, screenshot_type, output_path, args.upsample,
+                    glyph_bank
+                )
+            except Exception as e:
+                print('Image issue: {} ({})'.format(fname, e))
+                continue
+            if len(ref_traj) == 0 or len(traj) == 0:
+                print('Empty trajectory: {}'.format(fname))
+                continue
+
+            mean_abs_diff, max_abs_diff = compare_trajs(ref_traj, traj)
+            rows.append([
+                fname, screenshot_type, len(ref_traj), len(traj),
+                ref_seconds, seconds, mean_abs_diff, max_abs_diff
+            ])
+
+    with open(args.report, 'w', newline='') as report_file:
+        writer = csv.writer(report_file)
+        writer.writerow([
+            'fname', 'screenshot_type', 'ref_points', 'points',
+            'ref_seconds', 'seconds', 'mean_abs_diff', 'max_abs_diff'
+        ])
+        writer.writerows(rows)
+
+    # summarize by screenshot type
+    for screenshot_type in sorted(set(row[1] for row in rows)):
+        type_rows = np.array(
+            [row[4:] for row in rows if row[1] == screenshot_type]
+        )
+        print(
+            '{}: n={} time {:.3f}s -> {:.3f}s, mean abs diff {:.4f}, '
+            'max abs diff {:.4f} (relative to range)'.format(
+                screenshot_type, len(type_rows),
+                type_rows[:, 0].mean(), type_rows[:, 1].mean(),
+                type_rows[:, 2].mean(), type_rows[:, 3].max()
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Long-lived Tesseract engines for reading Spiroware screenshot text
+
+pytesseract launches a new tesseract process and writes the image to a
+temporary file for every call, so the language model is loaded again for each
+axis image. If tesserocr is installed, the Tesseract API is used instead and
+the model is loaded once per process; images are passed from memory.
+tesserocr is pinned in requirements.txt. If it cannot be installed, the
+tesseract executable is used as before, which loads the model again for each
+call: single images are piped through stdin and batches are read by a single
+tesseract process, so the model is only loaded once per batch.
+"""
+
+import os
+import subprocess
+import tempfile
+import cv2
+import numpy as np
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# engines are created once per process; see get_service
+services = {}
+
+
+class OcrService:
+    """Tesseract engine which is reused for every image
+
+    The engine is only kept loaded with tesserocr; without it, every call
+    starts the tesseract executable.
+
+    Parameters
+    ----------
+    lang : str, optional
+        Tesseract language, by default 'eng'
+    oem : int, optional
+        Tesseract OCR engine mode, by default 3
+    psm : int, optional
+        Tesseract page segmentation mode, by default 6
+    """
+
+    def __init__(self, lang='eng', oem=3, psm=6):
+        self.lang = lang
+        self.oem = oem
+        self.psm = psm
+        if tesserocr is not None:
+            # the modes are passed as ints; the enums of tesserocr only hold
+            # constants and cannot be called with a value
+            self.api = tesserocr.PyTessBaseAPI(lang=lang, oem=oem, psm=psm)
+        else:
+            self.api = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Release the Tesseract engine"""
+        if self.api is not None:
+            self.api.End()
+            self.api = None
+
+    def image_to_string(self, img, whitelist=None):
+        """Convert an image into a string
+
+        Parameters
+        ----------
+        img : numpy.ndarray
+            Grayscale or colour image
+        whitelist : str, optional
+            Characters Tesseract is allowed to return, by default None
+
+        Returns
+        -------
+        str
+            Text of the image
+        """
+        if self.api is not None:
+            return self.api_image_to_string(img, whitelist)
+
+        # tesseract reads a single image from stdin so no file is written
+        proc = subprocess.run(
+            [pytesseract.pytesseract.tesseract_cmd, 'stdin', 'stdout']
+            + self.cli_config(whitelist),
+            input=encode_png(img), stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, check=True
+        )
+
+        return clean_text(proc.stdout.decode('utf-8'))
+
+    def image_to_strings(self, imgs, whitelist=None):
+        """Convert several images into strings
+
+        Parameters
+        ----------
+        imgs : list of numpy.ndarray
+            Grayscale or colour images
+        whitelist : str, optional
+            Characters Tesseract is allowed to return, by default None
+
+        Returns
+        -------
+        list of str
+            Text of each image in imgs
+        """
+        if self.api is not None or len(imgs) <= 1:
+            return [self.image_to_string(img, whitelist) for img in imgs]
+
+        # without tesserocr, the images are read by a single tesseract process
+        # using a list of image files
+        with tempfile.TemporaryDirectory() as temp_dir:
+            img_paths = []
+            for i, img in enumerate(imgs):
+                img_path = os.path.join(temp_dir, '{}.png'.format(i))
+                with open(img_path, 'wb') as img_file:
+                    img_file.write(encode_png(img))
+                img_paths.append(img_path)
+            list_path = os.path.join(temp_dir, 'images.txt')
+            with open(list_path, 'w') as list_file:
+                list_file.write('\n'.join(img_paths) + '\n')
+
+            proc = subprocess.run(
+                [pytesseract.pytesseract.tesseract_cmd, list_path, 'stdout']
+                + self.cli_config(whitelist),
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+            )
+
+        # tesseract ends the text of every page with a form feed
+        texts = proc.stdout.decode('utf-8').split('\f')[:-1]
+        if len(texts) != len(imgs):
+            return [self.image_to_string(img, whitelist) for img in imgs]
+
+        return [clean_text(text) for text in texts]
+
+    def api_image_to_string(self, img, whitelist=None):
+        """Convert an image into a string with the Tesseract API
+
+        Parameters
+        ----------
+        img : numpy.ndarray
+            Grayscale or colour image
+        whitelist : str, optional
+            Characters Tesseract is allowed to return, by default None
+
+        Returns
+        -------
+        str
+            Text of the image
+        """
+        self.api.SetVariable('tessedit_char_whitelist', whitelist or '')
+        img = np.ascontiguousarray(img, dtype=np.uint8)
+        bytes_per_pixel = 1 if img.ndim == 2 else img.shape[2]
+        self.api.SetImageBytes(
+            img.tobytes(), img.shape[1], img.shape[0], bytes_per_pixel,
+            img.strides[0]
+        )
+
+        return clean_text(self.api.GetUTF8Text())
+
+    def cli_config(self, whitelist=None):
+        """Get the tesseract command line options
+
+        Parameters
+        ----------
+        whitelist : str, optional
+            Characters Tesseract is allowed to return, by default None
+
+        Returns
+        -------
+        list of str
+            Command line options
+        """
+        config = [
+            '-l', self.lang, '--oem', str(self.oem), '--psm', str(self.psm)
+        ]
+        if whitelist:
+            config += ['-c', 'tessedit_char_whitelist={}'.format(whitelist)]
+
+        return config
+
+
+def encode_png(img):
+    """Encode an image as PNG in memory
+
+    Parameters
+    ----------
+    img : numpy.ndarray
+        Grayscale or colour image
+
+    Returns
+    -------
+    bytes
+        PNG file contents
+    """
+    _, buffer = cv2.imencode('.png', img)
+
+    return buffer.tobytes()
+
+
+def clean_text(text):
+    """Remove the page separator from Tesseract output
+
+    Parameters
+    ----------
+    text : str
+        Tesseract output
+
+    Returns
+    -------
+    str
+        Text without form feeds
+    """
+    return text.replace('\f', '')
+
+
+def get_service(lang='eng', oem=3, psm=6):
+    """Get the Tesseract engine of the current process
+
+    Engines are not shared between processes, so a worker process creates its
+    own engine the first time it is used.
+
+    Parameters
+    ----------
+    lang : str, optional
+        Tesseract language, by default 'eng'
+    oem : int, optional
+        Tesseract OCR engine mode, by default 3
+    psm : int, optional
+        Tesseract page segmentation mode, by default 6
+
+    Returns
+    -------
+    OcrService
+        Tesseract engine
+    """
+    key = (os.getpid(), lang, oem, psm)
+    if key not in services:
+        services[key] = OcrService(lang, oem, psm)
+
+    return services[key]
@@ -0,0 +1,521 @@
+"""Build the train, validate and test TFRecord files in parallel
+
+Replaces the TFRecord writing of the project notebook (see 'Section 2.iv').
+The trials of each split are shuffled with a seed and assigned to shards, so
+rebuilding with the same seed gives the same files. Shards are written in
+parallel by worker processes and a manifest with the number of records in
+every shard is saved, from which steps_per_epoch and validation_steps are
+derived (see steps). Records use the dense schema by default (see
+record_schema.py).
+
+Requires the Parquet files of load_tables.py and the transforms of
+transform.py. The screenshots are taken from the screenshot records of
+stream_screenshots.py where they exist, so the digitized screenshots are not
+written to and parsed from text; the plotdigitizer csv files are read for the
+other trials and for the manually corrected screenshots, which overrule the
+digitized ones. The records are built by running this script.
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import json
+import math
+import os
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+import file_index
+import load_tables
+import preprocess
+import record_schema
+import transform
+
+processed_path = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '../../data/processed')
+)
+
+manifest_path = os.path.join(processed_path, 'manifest.json')
+
+screenshot_records_dir = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../../data/intermediary/screenshot_records'
+))
+
+split_groups = ['train', 'validate', 'test']
+
+qc_grade_label_dict = {
+    'A/B': [1, 0, 0, 0, 0, 0],
+    'C': [0, 1, 0, 0, 0, 0],
+    'D': [0, 0, 1, 0, 0, 0],
+    'E': [0, 0, 0, 1, 0, 0],
+    'F': [0, 0, 0, 0, 1, 0],
+    'N/A': [0, 0, 0, 0, 0, 1]
+}
+
+# transforms, loaded once per worker process; see init_worker
+worker_state = {}
+
+
+def assign_shards(n_trials, records_per_shard, seed, split_group):
+    """Shuffle trials and assign them to shards
+
+    Parameters
+    ----------
+    n_trials : int
+        Number of trials in the split
+    records_per_shard : int
+        Maximum number of trials in each shard
+    seed : int
+        Seed of the shuffle
+    split_group : str
+        'train', 'validate' or 'test'; each split is shuffled differently
+
+    Returns
+    -------
+    list of numpy.ndarray
+        Indices of the trials in each shard
+    """
+    rng = np.random.default_rng([seed, split_groups.index(split_group)])
+    order = rng.permutation(n_trials)
+    n_shards = max(1, math.ceil(n_trials / records_per_shard))
+
+    return np.array_split(order, n_shards)
+
+
+def read_screenshot(screenshot_path, ss_type):
+    """Read and process a digitized screenshot
+
+    Parameters
+    ----------
+    screenshot_path : str
+        Path of the plotdigitizer csv file
+    ss_type : str
+        Raw MBW signal to be processed
+
+    Returns
+    -------
+    numpy.ndarray
+        float32 array of length preprocess.screenshot_len
+    """
+    try:
+        traj = pd.read_csv(
+            screenshot_path, header=None, sep=r'\s+'
+        ).to_numpy(dtype=np.float64)
+    except pd.errors.EmptyDataError:
+        # empty if screenshot is empty due to white screenshot
+        traj = np.empty((0, 2))
+
+    return preprocess.screenshot_vector(traj, ss_type)
+
+
+def load_screenshots(records_dir=screenshot_records_dir, trial_ids=None):
+    """Read the screenshot vectors of the screenshot records
+
+    Parameters
+    ----------
+    records_dir : str, optional
+        Folder containing the TFRecord files of stream_screenshots.py, by
+        default data/intermediary/screenshot_records
+    trial_ids : set of str, optional
+        Ids of the trials to read (see record_schema.trial_id), by default
+        None (all trials)
+
+    Returns
+    -------
+    dict
+        Maps each trial id to a dict of screenshot type to a float32 array of
+        length preprocess.screenshot_len; empty if there are no records
+    """
+    paths = sorted(glob.glob(os.path.join(records_dir, 'screenshots_*.tfrec')))
+    screenshots = {}
+    if not paths:
+        return screenshots
+
+    for serialized in tf.data.TFRecordDataset(paths).batch(256):
+        if trial_ids is not None:
+            # only the ids are parsed to select the records
+            ids = tf.io.parse_example(
+                serialized, {'trial': tf.io.FixedLenFeature([], tf.string)}
+            )['trial'].numpy()
+            serialized = tf.boolean_mask(
+                serialized, [trial.decode() in trial_ids for trial in ids]
+            )
+        features = record_schema.parse_screenshots(serialized)
+        for i, trial in enumerate(features['trial'].numpy()):
+            screenshots[trial.decode()] = {
+                ss_type: features[ss_type][i].numpy()
+                for ss_type in preprocess.screenshot_types
+            }
+
+    return screenshots
+
+
+def is_manual_screenshot(path):
+    """Check if a screenshot file was manually corrected
+
+    Parameters
+    ----------
+    path : str
+        Path of the plotdigitizer csv file
+
+    Returns
+    -------
+    bool
+        True if the file is in data/raw/digitize_screenshots_manual
+    """
+    manual_path = os.path.normcase(file_index.manual_screenshots_path)
+    return os.path.normcase(os.path.normpath(path)).startswith(
+        manual_path + os.sep
+    )
+
+
+def model_inputs(screenshot_paths, table_values, screenshot_vectors=None):
+    """Create the model inputs from the files of a trial
+
+    Must be called in a process initialized with init_worker.
+
+    Parameters
+    ----------
+    screenshot_paths : dict
+        Maps each screenshot type to the path of its plotdigitizer csv file
+    table_values : dict
+        Maps each table type to an array of shape (rows, columns); see
+        preprocess.table_types
+    screenshot_vectors : dict, optional
+        Maps screenshot types to their processed vector, which is used
+        instead of the csv file; see load_screenshots, by default None
+
+    Returns
+    -------
+    dict
+        Maps each model input to an array; see record_schema.input_shapes
+    """
+    inputs = {}
+
+    # process the screenshot data
+    screenshot_vectors = screenshot_vectors or {}
+    for ss_type in preprocess.screenshot_types:
+        if ss_type in screenshot_vectors:
+            inputs['{}_input'.format(ss_type)] = screenshot_vectors[ss_type]
+        else:
+            inputs['{}_input'.format(ss_type)] = read_screenshot(
+                screenshot_paths[ss_type], ss_type
+            )
+
+    # process the tables
+    for name, table_type in record_schema.table_inputs.items():
+        inputs[name] = worker_state['transforms'][table_type].transform(
+            table_values[table_type]
+        )
+
+    return inputs
+
+
+def trial_inputs(trial, tables, screenshots=None):
+    """Create the model inputs and labels of a trial
+
+    Parameters
+    ----------
+    trial : pandas.Series
+        Row of main_id_associated_files.csv
+    tables : dict
+        Maps each table type to a dict of (spx_filename, trial) to values;
+        see load_tables.load_tables
+    screenshots : dict, optional
+        Maps trial ids to their screenshot vectors; see load_screenshots, by
+        default None (the csv files are read)
+
+    Returns
+    -------
+    inputs : dict
+        Maps each model input to an array; see record_schema.input_shapes
+    labels : dict
+        Maps 'trial_outcome' and 'grade' to a list of int
+    """
+    key = (str(trial['spx_filename']), int(trial['trial']))
+    screenshot_paths = {
+        ss_type: preprocess.resolve_path(trial['{}_path'.format(ss_type)])
+        for ss_type in preprocess.screenshot_types
+    }
+    streamed = (screenshots or {}).get(record_schema.trial_id(*key), {})
+    inputs = model_inputs(
+        screenshot_paths,
+        {
+            table_type: tables[table_type].get(
+                key, np.empty((0, len(preprocess.table_types[table_type][3])))
+            )
+            for table_type in preprocess.table_types
+        },
+        {
+            ss_type: vector for ss_type, vector in streamed.items()
+            if not is_manual_screenshot(screenshot_paths[ss_type])
+        }
+    )
+
+    # process trial outcome
+    labels = {
+        'trial_outcome': [int(trial['trial_accepted_label'] == 'Accepted')],
+        'grade': qc_grade_label_dict[trial['qc_grade_label']],
+    }
+
+    return inputs, labels
+
+
+def init_worker(transform_dir=transform.transform_dir):
+    """Load the transforms of the worker process
+
+    Parameters
+    ----------
+    transform_dir : str, optional
+        Folder containing the transforms, by default
+        data/intermediary/combine_data_type
+    """
+    worker_state['transforms'] = transform.load_transforms(transform_dir)
+
+
+def write_shard(
+    shard_path, trials, tables_dir=load_tables.tables_dir, schema='dense',
+    records_dir=screenshot_records_dir
+):
+    """Write the records of several trials to a TFRecord file
+
+    Must be called in a process initialized with init_worker.
+
+    Parameters
+    ----------
+    shard_path : str
+        Path of the TFRecord file
+    trials : pandas.dataframe
+        Rows of main_id_associated_files.csv, in the order of the records
+    tables_dir : str, optional
+        Folder containing the Parquet files of load_tables.py, by default
+        data/intermediary/tables
+    schema : str, optional
+        Record schema, 'dense' or 'columns' (see record_schema.py), by
+        default 'dense'
+    records_dir : str, optional
+        Folder containing the screenshot records of stream_screenshots.py;
+        the csv files are read for trials without a record, by default
+        data/intermediary/screenshot_records
+
+    Returns
+    -------
+    n_records : int
+        Number of records written
+    failures : list of tuple
+        (spx_filename, trial, error) of the trials which were not written
+    """
+    keys = list(zip(trials['spx_filename'], trials['trial']))
+    tables = {
+        table_type: load_tables.load_tables(table_type, tables_dir, keys)
+        for table_type in preprocess.table_types
+    }
+    screenshots = load_screenshots(
+        records_dir, {
+            record_schema.trial_id(str(spx_filename), int(trial))
+            for spx_filename, trial in keys
+        }
+    )
+
+    n_records = 0
+    failures = []
+    # write to a temporary file first so partially written shards are never
+    # read
+    temp_path = '{}.tmp'.format(shard_path)
+    with tf.io.TFRecordWriter(temp_path) as writer:
+        for _, trial in trials.iterrows():
+            try:
+                feature = record_schema.record_features(
+                    schema, *trial_inputs(trial, tables, screenshots)
+                )
+            except Exception as e:
+                failures.append((
+                    trial['spx_filename'], trial['trial'],
+                    '{}: {}'.format(type(e).__name__, e)
+                ))
+                continue
+            example = tf.train.Example(
+                features=tf.train.Features(feature=feature)
+            )
+            writer.write(example.SerializeToString())
+            n_records += 1
+    os.replace(temp_path, shard_path)
+
+    return n_records, failures
+
+
+def load_manifest(path=manifest_path):
+    """Load the manifest of the TFRecord files
+
+    Parameters
+    ----------
+    path : str, optional
+        Path of the manifest, by default data/processed/manifest.json
+
+    Returns
+    -------
+    dict
+        Seed, record schema, records per shard and, for each split, the
+        number of records and the path (relative to the manifest) and number
+        of records of each shard
+    """
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def shard_paths(manifest, split_group, path=manifest_path):
+    """Get the TFRecord files of a split
+
+    Parameters
+    ----------
+    manifest : dict
+        Manifest of the TFRecord files; see load_manifest
+    split_group : str
+        'train', 'validate' or 'test'
+    path : str, optional
+        Path of the manifest, by default data/processed/manifest.json
+
+    Returns
+    -------
+    list of str
+        Paths of the TFRecord files
+    """
+    return [
+        os.path.join(os.path.dirname(path), shard['path'])
+        for shard in manifest['splits'][split_group]['shards']
+    ]
+
+
+def steps(manifest, split_group, batch_size):
+    """Get the number of batches in a split
+
+    Used for steps_per_epoch, validation_steps and the steps of evaluate.
+
+    Parameters
+    ----------
+    manifest : dict
+        Manifest of the TFRecord files; see load_manifest
+    split_group : str
+        'train', 'validate' or 'test'
+    batch_size : int
+        Number of records in each batch
+
+    Returns
+    -------
+    int
+        Number of batches needed to go through the split once
+    """
+    return math.ceil(manifest['splits'][split_group]['records'] / batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build the train, validate and test TFRecord files'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count(),
+        help='Number of worker processes, by default the number of CPUs'
+    )
+    parser.add_argument(
+        '--records-per-shard', type=int, default=1000,
+        help='Maximum number of records in each TFRecord file'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=12345,
+        help='Seed used to shuffle the trials into shards'
+    )
+    parser.add_argument(
+        '--schema', choices=record_schema.schemas, default='dense',
+        help='Record schema; see record_schema.py'
+    )
+    parser.add_argument(
+        '--output-dir', default=processed_path,
+        help='Folder to save the TFRecord files and the manifest'
+    )
+    parser.add_argument(
+        '--tables-dir', default=load_tables.tables_dir,
+        help='Folder containing the Parquet files of load_tables.py'
+    )
+    parser.add_argument(
+        '--transform-dir', default=transform.transform_dir,
+        help='Folder containing the transforms of transform.py'
+    )
+    parser.add_argument(
+        '--screenshot-records', default=screenshot_records_dir,
+        help='Folder containing the screenshot records of '
+        'stream_screenshots.py'
+    )
+    args = parser.parse_args()
+
+    redcap_qc = pd.read_csv(
+        os.path.abspath(os.path.join(
+            os.path.dirname(__file__),
+            '../../data/intermediary/main_id_associated_files.csv'
+        )),
+        keep_default_na=False
+    )
+
+    shards = []
+    for split_group in split_groups:
+        redcap_split = redcap_qc.loc[
+            redcap_qc['split_group'] == split_group
+        ].reset_index(drop=True)
+        os.makedirs(os.path.join(args.output_dir, split_group), exist_ok=True)
+        for tfrec_num, indices in enumerate(assign_shards(
+            len(redcap_split), args.records_per_shard, args.seed, split_group
+        )):
+            shards.append((
+                split_group,
+                os.path.join(
+                    split_group,
+                    '{}_{:02d}.tfrec'.format(split_group, tfrec_num + 1)
+                ),
+                redcap_split.iloc[indices]
+            ))
+
+    manifest = {
+        'seed': args.seed,
+        'schema': args.schema,
+        'records_per_shard': args.records_per_shard,
+        'splits': {
+            split_group: {'records': 0, 'shards': []}
+            for split_group in split_groups
+        }
+    }
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=args.workers, initializer=init_worker,
+        initargs=(args.transform_dir,)
+    ) as executor:
+        futures = [
+            executor.submit(
+                write_shard, os.path.join(args.output_dir, shard_path),
+                trials, args.tables_dir, args.schema,
+                args.screenshot_records
+            )
+            for _, shard_path, trials in shards
+        ]
+        for (split_group, shard_path, _), future in zip(shards, futures):
+            n_records, failures = future.result()
+            for spx_filename, trial, error in failures:
+                print('Trial issue: {} trial {} ({})'.format(
+                    spx_filename, trial, error
+                ))
+            manifest['splits'][split_group]['records'] += n_records
+            manifest['splits'][split_group]['shards'].append(
+                {'path': shard_path, 'records': n_records}
+            )
+
+    with open(
+        os.path.join(args.output_dir, 'manifest.json'), 'w'
+    ) as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+
+    for split_group in split_groups:
+        print('{}: {} records in {} files'.format(
+            split_group, manifest['splits'][split_group]['records'],
+            len(manifest['splits'][split_group]['shards'])
+        ))
+
+
+if __name__ == "__main__":
+    main()
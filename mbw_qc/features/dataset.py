@@ -0,0 +1,245 @@
+"""tf.data input pipeline of the TFRecord files
+
+Replaces get_dataset of the project notebook (see 'Section 2.iv'). Shards are
+read in an interleaved order, records are shuffled while still serialized,
+batched and then parsed a batch at a time (see record_schema.py), so the
+parser runs once per batch instead of once per record. The serialized records
+can be cached in memory or to a local file, and batches are prefetched while
+the model trains.
+
+The throughput of the pipeline is reported in examples/sec by running this
+script, e.g. to confirm the model is not waiting for input on a CPU-only
+machine.
+"""
+
+import argparse
+import math
+import time
+import tensorflow as tf
+import build_tfrecords
+import record_schema
+
+
+def shuffle_buffer_size(manifest, split_group, max_records=None):
+    """Get the shuffle buffer size of a split from the manifest
+
+    Shards are already shuffled at build time (see build_tfrecords.py) and
+    are read in a random order, so a buffer of one shard of records mixes
+    records across the interleaved shards.
+
+    Parameters
+    ----------
+    manifest : dict
+        Manifest of the TFRecord files; see build_tfrecords.load_manifest
+    split_group : str
+        'train', 'validate' or 'test'
+    max_records : int, optional
+        Upper limit of the buffer to bound memory use, by default None
+
+    Returns
+    -------
+    int
+        Number of records in the shuffle buffer
+    """
+    buffer_size = min(
+        manifest['records_per_shard'],
+        manifest['splits'][split_group]['records']
+    )
+    if max_records is not None:
+        buffer_size = min(buffer_size, max_records)
+
+    return max(1, buffer_size)
+
+
+def get_dataset(
+    filenames, batch_size, schema='dense', shuffle_buffer=0, cache=None,
+    repeat=False, drop_remainder=False, cycle_length=4, seed=None
+):
+    """Create the dataset of model inputs and labels
+
+    Parameters
+    ----------
+    filenames : list of str
+        Paths of the TFRecord files
+    batch_size : int
+        Number of records in each batch
+    schema : str, optional
+        Record schema, 'dense' or 'columns' (see record_schema.py), by
+        default 'dense'
+    shuffle_buffer : int, optional
+        Number of records in the shuffle buffer; the records and the order of
+        the files are not shuffled if 0, by default 0
+    cache : str, optional
+        Cache the serialized records in memory if '', or in files with this
+        prefix on a local disk; not cached if None, by default None
+    repeat : bool, optional
+        Repeat the records indefinitely, by default False
+    drop_remainder : bool, optional
+        Drop the last batch if it has less than batch_size records, by
+        default False
+    cycle_length : int, optional
+        Number of files read at the same time, by default 4
+    seed : int, optional
+        Seed of the shuffles, by default None
+
+    Returns
+    -------
+    tf.data.Dataset
+        Batches of (input_dict, output_dict); see record_schema.parse_dense
+    """
+    shuffle = shuffle_buffer > 0
+    files = tf.data.Dataset.from_tensor_slices(list(filenames))
+    if shuffle:
+        files = files.shuffle(len(filenames), seed=seed)
+
+    # the record order only matters if the records are not shuffled
+    dataset = files.interleave(
+        tf.data.TFRecordDataset,
+        cycle_length=min(cycle_length, len(filenames)),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not shuffle
+    )
+    if cache is not None:
+        dataset = dataset.cache(cache)
+    if shuffle:
+        dataset = dataset.shuffle(
+            shuffle_buffer, seed=seed, reshuffle_each_iteration=True
+        )
+    if repeat:
+        dataset = dataset.repeat()
+
+    # batch before parsing so each batch is parsed in a single call
+    return (
+        dataset
+        .batch(batch_size, drop_remainder=drop_remainder)
+        .map(
+            record_schema.get_parser(schema),
+            num_parallel_calls=tf.data.AUTOTUNE,
+            deterministic=not shuffle
+        )
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+
+def split_dataset(
+    split_group, batch_size, path=build_tfrecords.manifest_path,
+    training=None, cache=None, max_shuffle=None, seed=None
+):
+    """Create the dataset of a split from the manifest
+
+    Parameters
+    ----------
+    split_group : str
+        'train', 'validate' or 'test'
+    batch_size : int
+        Number of records in each batch
+    path : str, optional
+        Path of the manifest, by default data/processed/manifest.json
+    training : bool, optional
+        Shuffle and repeat the records, as the notebook does for model.fit;
+        by default None (only the train split)
+    cache : str, optional
+        See get_dataset, by default None
+    max_shuffle : int, optional
+        Upper limit of the shuffle buffer, by default None
+    seed : int, optional
+        Seed of the shuffles, by default None
+
+    Returns
+    -------
+    dataset : tf.data.Dataset
+        Batches of (input_dict, output_dict)
+    steps : int
+        Number of batches in one pass through the split; see
+        build_tfrecords.steps
+    """
+    manifest = build_tfrecords.load_manifest(path)
+    if training is None:
+        training = split_group == 'train'
+
+    dataset = get_dataset(
+        build_tfrecords.shard_paths(manifest, split_group, path),
+        batch_size,
+        schema=manifest.get('schema', 'columns'),
+        shuffle_buffer=(
+            shuffle_buffer_size(manifest, split_group, max_shuffle)
+            if training else 0
+        ),
+        cache=cache,
+        repeat=training,
+        seed=seed
+    )
+
+    return dataset, build_tfrecords.steps(manifest, split_group, batch_size)
+
+
+def benchmark(dataset, steps):
+    """Measure the throughput of a dataset
+
+    Parameters
+    ----------
+    dataset : tf.data.Dataset
+        Batches of (input_dict, output_dict)
+    steps : int
+        Number of batches to read
+
+    Returns
+    -------
+    float
+        Examples read per second
+    """
+    n_examples = 0
+    start = time.perf_counter()
+    for input_dict, _ in dataset.take(steps):
+        # the leading dimension is the number of records in the batch
+        n_examples += int(next(iter(input_dict.values())).shape[0])
+    elapsed = time.perf_counter() - start
+
+    return n_examples / elapsed if elapsed > 0 else math.inf
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Report the throughput of the input pipeline'
+    )
+    parser.add_argument(
+        '--split', choices=build_tfrecords.split_groups, default='train',
+        help='Split to read'
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=32,
+        help='Number of records in each batch'
+    )
+    parser.add_argument(
+        '--steps', type=int, default=None,
+        help='Number of batches in each pass, by default one pass through '
+        'the split'
+    )
+    parser.add_argument(
+        '--passes', type=int, default=2,
+        help='Number of passes; passes after the first read from the cache'
+    )
+    parser.add_argument(
+        '--cache', default=None,
+        help="Cache the records in memory ('') or in files with this prefix"
+    )
+    parser.add_argument(
+        '--manifest', default=build_tfrecords.manifest_path,
+        help='Path of the manifest of build_tfrecords.py'
+    )
+    args = parser.parse_args()
+
+    # repeated so every pass has the same number of batches
+    dataset, steps = split_dataset(
+        args.split, args.batch_size, args.manifest, training=True,
+        cache=args.cache
+    )
+    steps = args.steps or steps
+    for pass_num in range(args.passes):
+        print('Pass {}: {:.1f} examples/sec'.format(
+            pass_num + 1, benchmark(dataset, steps)
+        ))
+
+
+if __name__ == "__main__":
+    main()
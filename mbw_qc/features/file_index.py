@@ -0,0 +1,462 @@
+"""Index the feature files of every trial by spx file name and trial
+
+Replaces get_table_path of the project notebook (see 'Section 2.ii.b'), which
+searched every path with two regular expressions for every trial. Each file
+name is parsed once into (spx_filename, trial, signal_type) keys, so linking
+the feature files to the REDCap trials is a dictionary lookup. The index is
+saved so only new files are parsed when it is updated.
+
+Screenshots and spx exports are named '<spx_filename>_trial_<trial>_...'
+(i.e. '202.2_trial_3_co2.csv'); breath and TBFVL tables contain
+'-<spx_filename>-Trial-<trial>-'.
+
+The index is updated and saved by running this script.
+"""
+
+import argparse
+import collections
+import json
+import os
+import re
+
+data_path = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '../../data')
+)
+training_path = os.path.join(data_path, 'external/Primary Training Data Set')
+
+manual_screenshots_path = os.path.join(
+    data_path, 'raw/digitize_screenshots_manual'
+)
+
+# folders of each signal type: (folder, file extension, file names overrule
+# the other folders of the signal type); the signal type of screenshots is
+# taken from the file name
+signal_folders = {
+    'breath': [
+        (
+            os.path.join(
+                training_path, 'TRACK DATA SET/Track Breath Tables TXT'
+            ),
+            '.txt', False
+        ),
+        (
+            os.path.join(
+                training_path, 'PS LONGITUDINAL DATA SET/breathtables/breath'
+            ),
+            '.txt', False
+        ),
+    ],
+    'tbfvl': [
+        (
+            os.path.join(training_path, 'TRACK DATA SET/Track TBFVL Tables'),
+            '.txt', False
+        ),
+        (
+            os.path.join(
+                training_path, 'PS LONGITUDINAL DATA SET/tbfvltables/tbfvl'
+            ),
+            '.txt', False
+        ),
+    ],
+    'spx': [
+        (os.path.join(data_path, 'raw/spx_exports'), '.csv', False),
+    ],
+    None: [
+        (os.path.join(data_path, 'raw/digitize_screenshots'), '.csv', False),
+        # files that were manually manipulated (Section 2.i.c) are used
+        # instead of the digitized files
+        (manual_screenshots_path, '.csv', True),
+    ],
+}
+
+# columns of main_id_associated_files.csv and the signal type of their files
+path_cols = {
+    'spx_export_path': 'spx',
+    'breath_path': 'breath',
+    'tbfvl_path': 'tbfvl',
+    'o2_path': 'o2',
+    'n2_path': 'n2',
+    'flow_path': 'flow',
+    'co2_path': 'co2',
+    'volume_path': 'volume',
+}
+
+index_path = os.path.join(data_path, 'intermediary/file_index.json')
+
+underscore_pattern = re.compile(r'^(.+)_trial_(\d+)_([^_.]*)')
+dash_pattern = re.compile(r'-Trial-(\d+)-')
+
+
+def parse_fname(fname, signal_type=None):
+    """Parse a file name into the keys of the trials it can belong to
+
+    A table name can contain dashes before the spx file name, so a key is
+    returned for every part of the name between a dash and '-Trial-'; this is
+    the same as the '-<id>-' search of the project notebook.
+
+    Parameters
+    ----------
+    fname : str
+        Name of the file (without folder)
+    signal_type : str, optional
+        Signal type of the file, by default None (taken from the file name)
+
+    Returns
+    -------
+    list of tuple
+        (spx_filename, trial, signal_type) keys; empty if the file name does
+        not contain a trial
+    """
+    match = underscore_pattern.search(fname)
+    if match is not None:
+        return [(
+            match.group(1), int(match.group(2)),
+            signal_type or match.group(3)
+        )]
+
+    keys = []
+    for match in dash_pattern.finditer(fname):
+        prefix = fname[:match.start()]
+        for dash in [i for i, char in enumerate(prefix) if char == '-']:
+            keys.append(
+                (prefix[(dash + 1):], int(match.group(1)), signal_type)
+            )
+
+    return keys
+
+
+def get_file_paths(folder_path, file_ext='.txt'):
+    """Get path of all files in all folder
+
+    Parameters
+    ----------
+    folder_path : str
+        Path to folder of interest
+    file_ext : str, optional
+        File extension of interest; will only return files ending in file_ext,
+        by default '.txt'
+
+    Returns
+    -------
+    list of str
+        Contains the file paths in folder_path of all files ending in file_ext
+    """
+    file_paths = []
+
+    for root, _, files in os.walk(folder_path):
+        for file in files:
+            if file.endswith(file_ext):
+                file_paths.append(os.path.join(root, file))
+
+    return file_paths
+
+
+def find_shared_paths(paths):
+    """Find file paths which are assigned to more than one trial
+
+    Parameters
+    ----------
+    paths : list of str
+        Assigned path of every trial; None if no file was found
+
+    Returns
+    -------
+    list of str
+        Paths which occur more than once
+    """
+    return [
+        item
+        for item, count in collections.Counter(paths).items()
+        if count > 1 and item is not None
+    ]
+
+
+class FileIndex:
+    """Dictionary from (spx_filename, trial, signal_type) to file paths
+
+    Parameters
+    ----------
+    entries : dict, optional
+        Maps each indexed path to its folder, signal type, keys and whether it
+        overrules the other files of its keys; see save, by default None
+    """
+
+    def __init__(self, entries=None):
+        self.entries = {}
+        self.index = collections.defaultdict(list)
+        for path, entry in (entries or {}).items():
+            self.add(
+                path, entry['folder'], entry['signal_type'], entry['override'],
+                [tuple(key) for key in entry['keys']]
+            )
+
+    @classmethod
+    def load(cls, path=index_path):
+        """Load an index saved with save
+
+        Parameters
+        ----------
+        path : str, optional
+            Path of the json file, by default data/intermediary/file_index.json
+
+        Returns
+        -------
+        FileIndex
+            Saved index; empty if the file does not exist
+        """
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as index_file:
+            return cls(json.load(index_file))
+
+    def save(self, path=index_path):
+        """Save the index
+
+        Parameters
+        ----------
+        path : str, optional
+            Path of the json file, by default data/intermediary/file_index.json
+        """
+        temp_path = '{}.tmp'.format(path)
+        with open(temp_path, 'w') as index_file:
+            json.dump(self.entries, index_file, indent=1, sort_keys=True)
+        os.replace(temp_path, path)
+
+    def add(
+        self, path, folder, signal_type=None, override=False, keys=None
+    ):
+        """Add a file to the index
+
+        Parameters
+        ----------
+        path : str
+            Path of the file
+        folder : str
+            Indexed folder containing the file
+        signal_type : str, optional
+            Signal type of the file, by default None (taken from the file name)
+        override : bool, optional
+            Whether the file is used instead of the other files of its keys,
+            by default False
+        keys : list of tuple, optional
+            Keys of the file, by default None (parsed from the file name)
+
+        Returns
+        -------
+        list of tuple
+            Keys of the file
+        """
+        if keys is None:
+            keys = parse_fname(os.path.basename(path), signal_type)
+        self.entries[path] = {
+            'folder': folder, 'signal_type': signal_type, 'override': override,
+            'keys': keys
+        }
+        for key in keys:
+            self.index[key].append(path)
+
+        return keys
+
+    def remove(self, path):
+        """Remove a file from the index
+
+        Parameters
+        ----------
+        path : str
+            Path of the file
+        """
+        entry = self.entries.pop(path)
+        for key in entry['keys']:
+            self.index[key].remove(path)
+            if not self.index[key]:
+                del self.index[key]
+
+    def update(self, folder, file_ext, signal_type=None, override=False):
+        """Index new files of a folder and remove deleted files
+
+        Parameters
+        ----------
+        folder : str
+            Folder of interest
+        file_ext : str
+            File extension of interest
+        signal_type : str, optional
+            Signal type of the files, by default None (taken from the file
+            names)
+        override : bool, optional
+            Whether the files are used instead of the other files of their
+            keys, by default False
+
+        Returns
+        -------
+        added : int
+            Number of new files
+        removed : int
+            Number of deleted files
+        """
+        paths = set(get_file_paths(folder, file_ext))
+        stale = [
+            path for path, entry in self.entries.items()
+            if entry['folder'] == folder and path not in paths
+        ]
+        for path in stale:
+            self.remove(path)
+
+        new_paths = sorted(paths.difference(self.entries))
+        for path in new_paths:
+            self.add(path, folder, signal_type, override)
+
+        return len(new_paths), len(stale)
+
+    def get(self, spx_filename, trial, signal_type):
+        """Get the file of a trial
+
+        Parameters
+        ----------
+        spx_filename : str
+            Spx file name of the trial
+        trial : int
+            Trial number
+        signal_type : str
+            Signal type of interest (i.e. 'breath', 'co2')
+
+        Returns
+        -------
+        str
+            Path of the file; None if there is no file
+        """
+        paths = self.index.get((str(spx_filename), int(trial), signal_type))
+        if not paths:
+            return None
+        for path in paths:
+            if self.entries[path]['override']:
+                return path
+
+        return paths[0]
+
+    def resolve(self, id_trials, signal_type):
+        """Order file paths based on id-trial combinations
+
+        Replaces get_table_path of the project notebook.
+
+        Parameters
+        ----------
+        id_trials : iterable of tuple
+            (spx_filename, trial) of each trial
+        signal_type : str
+            Signal type of interest (i.e. 'breath', 'co2')
+
+        Returns
+        -------
+        list of str
+            Contains the file paths ordered according to id-trial; None if
+            there is no file
+        """
+        return [
+            self.get(spx_filename, trial, signal_type)
+            for spx_filename, trial in id_trials
+        ]
+
+    def duplicates(self):
+        """Find keys with more than one file
+
+        Files which overrule other files (i.e. manually digitized
+        screenshots) are not duplicates of the files they overrule.
+
+        Returns
+        -------
+        dict
+            Maps each ambiguous key to its paths
+        """
+        duplicates = {}
+        for key, paths in self.index.items():
+            for override in [True, False]:
+                same_paths = [
+                    path for path in paths
+                    if self.entries[path]['override'] == override
+                ]
+                if len(same_paths) > 1:
+                    duplicates[key] = paths
+        return duplicates
+
+
+def update_index(file_index):
+    """Update the index with the files of every signal folder
+
+    Parameters
+    ----------
+    file_index : FileIndex
+        Index to be updated
+
+    Returns
+    -------
+    FileIndex
+        Updated index
+    """
+    for signal_type, folders in signal_folders.items():
+        for folder, file_ext, override in folders:
+            added, removed = file_index.update(
+                folder, file_ext, signal_type, override
+            )
+            print('{}: {} new files, {} deleted files'.format(
+                folder, added, removed
+            ))
+
+    return file_index
+
+
+def assign_paths(redcap_qc, file_index):
+    """Add the file path columns to the REDCap dataframe
+
+    Parameters
+    ----------
+    redcap_qc : pandas.dataframe
+        Trials with the 'spx_filename' and 'trial' columns
+    file_index : FileIndex
+        Index of the feature files
+
+    Returns
+    -------
+    pandas.dataframe
+        redcap_qc with a column for the path of every signal type
+    """
+    redcap_qc = redcap_qc.copy()
+    for col_name, signal_type in path_cols.items():
+        redcap_qc[col_name] = file_index.resolve(
+            zip(redcap_qc['spx_filename'], redcap_qc['trial']), signal_type
+        )
+
+        # check if file(s) are assigned to more than one trial
+        shared_paths = find_shared_paths(redcap_qc[col_name].tolist())
+        if shared_paths:
+            print('{} assigned to more than one trial: {}'.format(
+                col_name, shared_paths
+            ))
+
+    return redcap_qc
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Update the index of the feature files'
+    )
+    parser.add_argument(
+        '--index', default=index_path, help='Path of the saved index'
+    )
+    parser.add_argument(
+        '--rebuild', action='store_true',
+        help='Parse every file again instead of only new files'
+    )
+    args = parser.parse_args()
+
+    file_index = FileIndex() if args.rebuild else FileIndex.load(args.index)
+    update_index(file_index)
+    file_index.save(args.index)
+
+    # keys with more than one file need to be manually reviewed
+    for key, paths in sorted(file_index.duplicates().items()):
+        print('Duplicate files: {} {}'.format(key, paths))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Read the breath, TBFVL and spx tables once into Parquet files
+
+The project notebook reads every table with pandas several times (to find the
+maximum number of rows, to get the mean and SD, and to write the TFRecord
+files), one file at a time. Here every table is read once in parallel, cleaned
+into the columns used by the model (see preprocess.py) and saved with the
+other tables of its type as a single Parquet file with the 'spx_filename',
+'trial' and 'row' of every value. Later stages read the Parquet file with a
+memory map instead of the original files.
+
+Requires pyarrow. The tables are read and saved by running this script.
+"""
+
+import argparse
+import concurrent.futures
+import os
+import numpy as np
+import pandas as pd
+import preprocess
+
+tables_dir = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../../data/intermediary/tables'
+))
+
+key_cols = ['spx_filename', 'trial']
+
+
+def read_table(table_path, table_type):
+    """Read and clean a single table
+
+    Parameters
+    ----------
+    table_path : str
+        Path of the exported table
+    table_type : str
+        'breath', 'tbfvl' or 'spx'
+
+    Returns
+    -------
+    values : numpy.ndarray
+        Array of shape (rows, columns); None if the table could not be read
+    error : str
+        Reason the table could not be read; empty if it was read
+    """
+    _, sep, values_func, _, _, _ = preprocess.table_types[table_type]
+    try:
+        return values_func(pd.read_csv(table_path, sep=sep)), ''
+    except Exception as e:
+        return None, '{}: {}'.format(type(e).__name__, e)
+
+
+def read_tables(table_paths, table_type, workers=None):
+    """Read and clean tables in parallel
+
+    Parameters
+    ----------
+    table_paths : list of str
+        Paths of the exported tables
+    table_type : str
+        'breath', 'tbfvl' or 'spx'
+    workers : int, optional
+        Number of worker processes, by default None (number of CPUs)
+
+    Returns
+    -------
+    list of tuple
+        (values, error) of each table; see read_table
+    """
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers
+    ) as executor:
+        return list(executor.map(
+            read_table, table_paths, [table_type] * len(table_paths),
+            chunksize=64
+        ))
+
+
+def tables_to_frame(keys, tables, columns):
+    """Combine tables into a single dataframe
+
+    Parameters
+    ----------
+    keys : list of tuple
+        (spx_filename, trial) of each table
+    tables : list of numpy.ndarray
+        Values of each table, of shape (rows, len(columns))
+    columns : list of str
+        Columns of the tables
+
+    Returns
+    -------
+    pandas.dataframe
+        Values of every table with the 'spx_filename', 'trial' and 'row' of
+        each row
+    """
+    n_rows = np.array([len(table) for table in tables], dtype=np.int64)
+    frame = pd.DataFrame(
+        np.concatenate(tables) if tables else np.empty((0, len(columns))),
+        columns=columns
+    )
+    frame.insert(0, 'spx_filename', np.repeat(
+        np.array([str(key[0]) for key in keys], dtype=object), n_rows
+    ))
+    frame.insert(1, 'trial', np.repeat(
+        np.array([int(key[1]) for key in keys], dtype=np.int64), n_rows
+    ))
+    # row within its table
+    frame.insert(2, 'row', (
+        np.arange(n_rows.sum()) - np.repeat(np.cumsum(n_rows) - n_rows, n_rows)
+    ))
+
+    return frame
+
+
+def save_tables(frame, path):
+    """Save combined tables as a Parquet file
+
+    Parameters
+    ----------
+    frame : pandas.dataframe
+        Combined tables; see tables_to_frame
+    path : str
+        Path of the Parquet file
+    """
+    temp_path = '{}.tmp'.format(path)
+    frame.to_parquet(temp_path, index=False)
+    os.replace(temp_path, path)
+
+
+def load_frame(table_type, path=tables_dir, keys=None):
+    """Load combined tables saved by this script
+
+    Parameters
+    ----------
+    table_type : str
+        'breath', 'tbfvl' or 'spx'
+    path : str, optional
+        Folder containing the '<table type>.parquet' files, by default
+        data/intermediary/tables
+    keys : list of tuple, optional
+        Only load the tables of these (spx_filename, trial), by default None
+        (all tables)
+
+    Returns
+    -------
+    pandas.dataframe
+        Combined tables; see tables_to_frame
+    """
+    frame = pd.read_parquet(
+        os.path.join(path, '{}.parquet'.format(table_type)), memory_map=True
+    )
+    if keys is not None:
+        keys = pd.MultiIndex.from_tuples(
+            [(str(key[0]), int(key[1])) for key in keys], names=key_cols
+        )
+        frame = frame[
+            pd.MultiIndex.from_frame(frame[key_cols]).isin(keys)
+        ].reset_index(drop=True)
+
+    return frame
+
+
+def load_tables(table_type, path=tables_dir, keys=None):
+    """Load the values of each table saved by this script
+
+    Parameters
+    ----------
+    table_type : str
+        'breath', 'tbfvl' or 'spx'
+    path : str, optional
+        Folder containing the '<table type>.parquet' files, by default
+        data/intermediary/tables
+    keys : list of tuple, optional
+        Only load the tables of these (spx_filename, trial), by default None
+        (all tables)
+
+    Returns
+    -------
+    dict
+        Maps (spx_filename, trial) to an array of shape (rows, columns);
+        tables without rows are not included
+    """
+    columns = preprocess.table_types[table_type][3]
+    frame = load_frame(table_type, path, keys)
+    values = frame[columns].to_numpy(dtype=np.float64)
+
+    # tables are saved as consecutive rows starting at row 0
+    starts = np.flatnonzero(frame['row'].to_numpy() == 0)
+    spx_filenames = frame['spx_filename'].to_numpy()[starts]
+    trials = frame['trial'].to_numpy()[starts]
+
+    return {
+        (spx_filename, int(trial)): table
+        for spx_filename, trial, table in zip(
+            spx_filenames, trials, np.split(values, starts[1:])
+        )
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Read the breath, TBFVL and spx tables into Parquet files'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count(),
+        help='Number of worker processes, by default the number of CPUs'
+    )
+    parser.add_argument(
+        '--output-dir', default=tables_dir,
+        help='Folder to save the Parquet files'
+    )
+    args = parser.parse_args()
+
+    redcap_qc = pd.read_csv(
+        os.path.abspath(os.path.join(
+            os.path.dirname(__file__),
+            '../../data/intermediary/main_id_associated_files.csv'
+        )),
+        keep_default_na=False
+    )
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    for table_type, (path_col, _, _, columns, _, _) in (
+        preprocess.table_types.items()
+    ):
+        trials = redcap_qc[key_cols + [path_col]].drop_duplicates(key_cols)
+        keys = list(zip(trials['spx_filename'], trials['trial']))
+        results = read_tables(
+            [preprocess.resolve_path(path) for path in trials[path_col]],
+            table_type, args.workers
+        )
+
+        read_keys, tables = [], []
+        for key, table_path, (values, error) in zip(
+            keys, trials[path_col], results
+        ):
+            if values is None:
+                print('Table issue: {} ({})'.format(table_path, error))
+                continue
+            read_keys.append(key)
+            tables.append(values)
+
+        save_tables(
+            tables_to_frame(read_keys, tables, columns),
+            os.path.join(args.output_dir, '{}.parquet'.format(table_type))
+        )
+
+        # maximum number of rows (steps) is used to pad the tables
+        print('{}: {} tables, maximum of {} rows'.format(
+            table_type, len(tables), max((len(t) for t in tables), default=0)
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+"""Preprocess digitized Spiroware signals into model features
+
+Functions are taken from 'Section 2.iii' and 'Section 2.iv' of the project
+notebook so digitized screenshots can be processed outside of the notebook.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+# paths in main_id_associated_files.csv are relative to the notebook folder
+notebook_path = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '../../notebooks')
+)
+
+# raw MBW signals captured as screenshots
+screenshot_types = ['o2', 'co2', 'n2', 'flow', 'volume']
+
+# number of time steps of every processed signal; signals are padded to this
+# length (see Section 2.iii)
+screenshot_len = 5748
+
+# obtained from Section 2.iii; used to standardize data
+screenshot_mean_sd = {
+    'o2':  {'mean': 68.23157418109633, 'sd': 35.262795056959945},
+    'co2': {'mean': 2.196753669014523, 'sd': 2.153852461462564},
+    'flow': {'mean': -42.97922884856061, 'sd': 356.93793207438284},
+    'n2': {'mean': 28.151857103277152, 'sd': 34.40444632705889},
+    'volume': {'mean': -26.96673191012796, 'sd': 967.9686423120496}
+}
+
+# columns of the breath, TBFVL and spx tables used by the model; not all
+# columns were available for all trials (see Section 2.iv)
+breath_cols = [
+    'N2 Cet [%]', 'TO', 'FRC [l]', 'SnIIIms [1/l]', 'N2 Cet-Start [%]',
+    'N2 Cet Norm [%]', 'N2 C mean slope', 'N2 C mean breath', 'VolInsp [l]',
+    'VolExp [l]', 'CEV [l]', 'CEV-DS [l]', 'N2InspMean [%]', 'VolN2Exp [ml]',
+    'VolN2Netto [ml]', 'CumVolN2Netto [ml]', 'VolN2Reinsp [ml]', 'SIII',
+    'SnIII, C breath*VT', 'VdCO2 [ml]', 'FlowInsp. mean [ml/s]',
+    'FlowExp. mean [ml/s]', 'RR', 'VolExp-DS [l]', 'VolN2Netto filtered [ml]',
+    'VolN2Netto fast [ml]', 'VdN2 [ml]', 'VT alv. N2 [ml]',
+]
+
+tbfvl_cols = [
+    'Insp.Time [s]', 'Exp.Time [s]', 'Total breath time [s]', 'PIF [ml/s]',
+    'PEF [ml/s]', 'Time to PIF [s]', 'Time to PEF [s]', 'Insp. Volume [ml]',
+    'Exp. Volume [ml]', 'EEL [ml]', 'EEL cum. [ml]', 'Tidal Volume [ml]',
+    'RR [1/min]', 'Ratio Insp./Tot. Time [%]', 'Ratio Exp./Tot. Time [%]',
+    'Ratio Insp./Exp. Time [%]', 'Ratio PEF/Exp. Time [%]', 'MTIF [ml/s]',
+    'MTEF [ml/s]', 'Minute ventilation [ml/min]', 'TEF75 [ml/s]',
+    'TEF50 [ml/s]', 'TEF25 [ml/s]', 'TEF10 [ml/s]', 'TIF50 [ml/s]',
+    'VPIF [ml]', 'VPEF [ml]', 'TEF50/TIF50 [%]', 'TEF75/PEF [%]',
+    'TEF50/PEF [%]', 'TEF25/PEF [%]', 'TEF10/PEF [%]', 'PEF/Exp.Vol. [1/s]',
+    'VPEF/VT [%]', 'AFV [l*l/s]', 'VTinsp/Tinsp [ml/s]', 'O2 consumed [ml]',
+    'CO2 emitted [ml]', 'RQ', 'et CO2 [%]', 'et O2 [%]', 'W', 'P'
+]
+
+spx_cols = [
+    'Date of birth', 'Height [cm]', 'Weight [kg]', 'Trial #',
+    'Washout time [s]', '# Washout Breaths', 'FRC [l]', 'LCI-2.5', 'LCI-5',
+    'FidN2', 'VdF/VT [%]', 'W faster', 'W slower', 'W full',
+    'VT alv. faster [ml]', 'VT alv. slower [ml]', 'VT alv. full [ml]',
+    'FRC faster / FRC full [%]', 'FRC slower / FRC full [%]',
+    'Specific ventilation faster [%]', 'Specific ventilation slower [%]',
+    'Specific ventilation ratio', 'FRC faster [ml]', 'FRC slower [ml]',
+    'FRC full [ml]', 'VT alv. N2 mean [ml]', 'M1/M0', 'M2/M0', 'M1/M0-6',
+    'M2/M0-6', 'M1/M0-8', 'M2/M0-8', 'CEV [l]', 'N2 Cet-Start [%]',
+    'Flow Insp. mean [ml/s]', 'Flow Exp. mean [ml/s]', 'VT Insp. mean [ml]',
+    'VT Exp. mean [ml]', 'VT mean [ml]', 'RQ', 'VT mean/FRC',
+    'N2Cet norm @ TO6 [%]', 'Vd CO2 mean [ml]', 'et CO2 mean [%]', 'Male',
+    'Female'
+]
+
+# dummy columns are not standardized
+tbfvl_dummy_cols = ['W', 'P']
+spx_dummy_cols = ['Male', 'Female']
+
+# maximum number of rows (steps) of each table; tables are padded to this
+# length (see Section 2.iii)
+breath_len = 187
+tbfvl_len = 203
+spx_len = 1
+
+
+def resolve_path(path):
+    """Get the path of a file listed in main_id_associated_files.csv
+
+    Parameters
+    ----------
+    path : str
+        Path relative to the notebook folder (or absolute)
+
+    Returns
+    -------
+    str
+        Absolute path
+    """
+    return os.path.normpath(os.path.join(notebook_path, path))
+
+
+def resample_screenshot(traj, round_dig=1):
+    """Resample a digitized trajectory onto a uniform time grid
+
+    NumPy implementation of the original pandas interpolate_screenshot (see
+    'Section 2.iii' of the project notebook) with the pinned pandas (1.4).
+    Times are rounded and deduplicated (keeping the first value), combined
+    with the grid time_inc, 2 * time_inc, ..., and the missing values are
+    linearly interpolated by time order (as DataFrame.interpolate does) with
+    the edge values held constant. Rows with a time of 0 are removed.
+
+    Rows are labelled in the order of the outer merge of pandas 1.4, which
+    does not sort the keys: the deduplicated times in the order of the
+    trajectory, then the grid times which are not in the trajectory. The
+    labels are the rows of the padded signal (see pad_rows), so a signal is
+    only in time order if the trajectory is sorted and covers the grid.
+    pandas 2.2 and later sort the keys of an outer merge, so the notebook
+    gives different signals there.
+
+    Parameters
+    ----------
+    traj : numpy.ndarray
+        Trajectory of shape (n, 2) containing the time and value
+    round_dig : int, optional
+        Number of digits to round the time, by default 1
+
+    Returns
+    -------
+    time : numpy.ndarray
+        Time of each row, in increasing order
+    val : numpy.ndarray
+        Interpolated value of each row
+    index : numpy.ndarray
+        Row label of each row in the merged dataframe; the label of the
+        removed time 0 row is skipped. All three are empty if traj is empty
+    """
+    traj = np.asarray(traj, dtype=np.float64).reshape(-1, 2)
+    raw_time = np.round(traj[:, 0], round_dig)
+    # first occurrence of every rounded time
+    raw_time, first_inds = np.unique(raw_time, return_index=True)
+    raw_val = traj[first_inds, 1]
+
+    time_inc = 10**-(round_dig)
+    grid_time = np.round(
+        np.arange(time_inc, raw_time.max(initial=0) + time_inc, time_inc),
+        round_dig
+    )
+
+    # sorted union of the rounded times and the grid (the outer merge)
+    time = np.union1d(raw_time, grid_time)
+    if raw_time.size == 0:
+        # an empty trajectory has no values to interpolate
+        empty = np.empty(0)
+        return empty, empty, np.empty(0, dtype=np.int64)
+    known = np.searchsorted(time, raw_time)
+    val = np.interp(np.arange(time.size), known, raw_val)
+
+    # merge order: trajectory times by first occurrence, then the grid times
+    # which are not in the trajectory
+    labels = np.empty(time.size, dtype=np.int64)
+    labels[known] = np.argsort(np.argsort(first_inds, kind='stable'))
+    grid_only = np.ones(time.size, dtype=bool)
+    grid_only[known] = False
+    labels[grid_only] = raw_time.size + np.arange(np.count_nonzero(grid_only))
+
+    # inconsistency with capturing 0, so remove
+    keep = time != 0
+
+    return time[keep], val[keep], labels[keep]
+
+
+def interpolate_screenshot(raw_ss, round_dig=1):
+    """Interpolate the screenshot values
+
+    Parameters
+    ----------
+    raw_ss : pandas.dataframe
+        Screenshot values to be interpolated
+    round_dig : int, optional
+        Number of digits to round the time, by default 1
+
+    Returns
+    -------
+    pandas.dataframe
+        Modified raw_ss dataframe with interpolated values
+    """
+    raw_ss = raw_ss.rename(columns={0: 'time', 1: 'val'})
+    time, val, index = resample_screenshot(
+        raw_ss[['time', 'val']].to_numpy(dtype=np.float64), round_dig
+    )
+
+    return pd.DataFrame({'time': time, 'val': val}, index=index)
+
+
+def pad_rows(raw_table, n_rows):
+    """Pad/add additional rows to dataframe
+
+    Parameters
+    ----------
+    raw_table : pandas.dataframe
+        Dataframe of interest
+    n_rows : int
+        Number of rows to add to raw_table
+
+    Returns
+    -------
+    pandas.dataframe
+        Dataframe with padded rows of 0
+    """
+    padded_table = raw_table.reindex(range(n_rows)).fillna(0)
+
+    return padded_table
+
+
+def standardize(raw_table, mean_sd_dict):
+    """Standardize the columns of a dataframe
+
+    Parameters
+    ----------
+    raw_table : pandas.dataframe
+        Dataframe of interest
+    mean_sd_dict : dict
+        Maps each column of raw_table to its 'mean' and 'sd'
+
+    Returns
+    -------
+    pandas.dataframe
+        Dataframe of z-scores
+    """
+    for raw_table_cols in raw_table.columns.values:
+
+        feature_mean = mean_sd_dict[raw_table_cols]['mean']
+        feature_sd = mean_sd_dict[raw_table_cols]['sd']
+
+        raw_table[raw_table_cols] = (
+            (raw_table[raw_table_cols] - feature_mean)/(feature_sd)
+        )
+
+    # subset raw table using only the keys from dictionary
+    # final_table should only contain z-scores
+    standardize_table = raw_table[raw_table.columns.values]
+
+    return standardize_table
+
+
+def process_screenshot(screenshot, ss_type):
+    """Process single screenshot type
+
+    Parameters
+    ----------
+    screenshot : pandas.dataframe
+        The dataframe to be processed
+    ss_type : str
+        Raw MBW signal to be processed
+
+    Returns
+    -------
+    pandas.dataframe
+        Screenshot data that is cleaned, standardized, padded, with a boolean
+        column to indicate missing values
+    """
+    screenshot = interpolate_screenshot(screenshot)
+    screenshot.rename(columns={'val': ss_type}, inplace=True)
+    screenshot = screenshot.drop(columns=['time'])
+    screenshot = standardize(screenshot, screenshot_mean_sd)
+    screenshot = pad_rows(screenshot, screenshot_len)
+
+    return screenshot
+
+
+def screenshots_to_dense(trajs, ss_type, length=screenshot_len, round_dig=1):
+    """Process digitized trajectories into a dense array of signals
+
+    Equivalent to processing each trajectory with process_screenshot under the
+    pinned pandas (see resample_screenshot): values are resampled,
+    standardized and placed at their row label, rows without a value are 0
+    and rows with a label past length are dropped.
+
+    Parameters
+    ----------
+    trajs : list of numpy.ndarray
+        Trajectories of shape (n, 2) containing the time and value; lengths
+        can differ between trajectories
+    ss_type : str
+        Raw MBW signal to be processed
+    length : int, optional
+        Number of time steps of each signal, by default screenshot_len
+    round_dig : int, optional
+        Number of digits to round the time, by default 1
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (len(trajs), length)
+    """
+    feature_mean = screenshot_mean_sd[ss_type]['mean']
+    feature_sd = screenshot_mean_sd[ss_type]['sd']
+
+    dense = np.zeros((len(trajs), length))
+    for i, traj in enumerate(trajs):
+        _, val, index = resample_screenshot(traj, round_dig)
+        keep = index < length
+        dense[i, index[keep]] = (val[keep] - feature_mean)/(feature_sd)
+
+    return dense
+
+
+def screenshot_vector(traj, ss_type):
+    """Process a digitized trajectory into the signal used by the model
+
+    Equivalent to reading the plotdigitizer csv file and processing it with
+    process_screenshot under the pinned pandas, which is how the signals of
+    the final model were made, without the round trip through a text file.
+    Newer pandas versions give different signals (see resample_screenshot).
+
+    Parameters
+    ----------
+    traj : numpy.ndarray
+        Trajectory of shape (n, 2); see digitize_figure in
+        3-digitize_screenshot.py
+    ss_type : str
+        Raw MBW signal to be processed
+
+    Returns
+    -------
+    numpy.ndarray
+        float32 array of length screenshot_len
+    """
+    if len(traj) == 0:
+        # empty dataframe if screenshot is empty due to white screenshot
+        traj = np.zeros((1, 2))
+    else:
+        # keep the precision of the plotdigitizer csv files (see write_traj)
+        # so the result is the same as processing the csv file
+        traj = np.char.mod('%g', np.asarray(traj, dtype=np.float64)).astype(
+            np.float64
+        )
+
+    return screenshots_to_dense([traj], ss_type)[0].astype(np.float32)
+
+
+def table_values(table, cols):
+    """Select columns of a table as a float array
+
+    Infinite values are considered missing.
+
+    Parameters
+    ----------
+    table : pandas.dataframe
+        Table of interest
+    cols : list of str
+        Columns to select, in order
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (rows, len(cols)) with NaN for missing values
+    """
+    values = table[cols].to_numpy(dtype=np.float64, copy=True)
+    values[np.isinf(values)] = np.nan
+
+    return values
+
+
+def breath_values(breath_table):
+    """Clean a breath table into the columns used by the model
+
+    Parameters
+    ----------
+    breath_table : pandas.dataframe
+        Breath table as read from the exported tab separated file
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (rows, len(breath_cols))
+    """
+    # older exports have a single VdCO2 column
+    breath_table = breath_table.rename(
+        columns={'VdCO2 Fowler [ml]': 'VdCO2 [ml]'}
+    )
+
+    return table_values(breath_table, breath_cols)
+
+
+def tbfvl_values(tbfvl_table):
+    """Clean a TBFVL table into the columns used by the model
+
+    Parameters
+    ----------
+    tbfvl_table : pandas.dataframe
+        TBFVL table as read from the exported tab separated file
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (rows, len(tbfvl_cols))
+    """
+    tbfvl_table = tbfvl_table.assign(**{
+        phase: (tbfvl_table['Phase'] == phase).astype(np.float64)
+        for phase in tbfvl_dummy_cols
+    })
+
+    return table_values(tbfvl_table, tbfvl_cols)
+
+
+def spx_values(spx_df):
+    """Clean a spx export into the columns used by the model
+
+    Parameters
+    ----------
+    spx_df : pandas.dataframe
+        Spx export as read from the csv file
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (rows, len(spx_cols))
+    """
+    spx_df = spx_df.assign(**{
+        gender: (spx_df['Gender'] == gender).astype(np.float64)
+        for gender in spx_dummy_cols
+    })
+    # convert date of birth to unix time
+    spx_df['Date of birth'] = (
+        pd.to_datetime(spx_df['Date of birth'], format='%d.%m.%Y')
+        - pd.Timestamp('1970-01-01')
+    ) // pd.Timedelta('1s')
+
+    return table_values(spx_df, spx_cols)
+
+
+# for each table type: column of main_id_associated_files.csv with the path of
+# the table, separator of the file, function returning the values, columns,
+# number of rows and columns which are not standardized
+table_types = {
+    'breath': (
+        'breath_path', '\t', breath_values, breath_cols, breath_len, []
+    ),
+    'tbfvl': (
+        'tbfvl_path', '\t', tbfvl_values, tbfvl_cols, tbfvl_len,
+        tbfvl_dummy_cols
+    ),
+    'spx': (
+        'spx_export_path', ',', spx_values, spx_cols, spx_len, spx_dummy_cols
+    ),
+}
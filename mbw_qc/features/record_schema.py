@@ -0,0 +1,359 @@
+"""Layout of the TFRecord files used to train the model
+
+Two record schemas are supported:
+
+- 'columns': the layout of the project notebook (see 'Section 2.iv'); every
+  column of the breath, TBFVL and spx tables and its boolean column is a
+  separate feature ('breath_1', 'breath_1_bool', ...), which are stacked back
+  into the model inputs after parsing.
+- 'dense': every model input is stored as a single float32 tensor of bytes in
+  the shape of the model input, so a record is parsed with a few features and
+  no stacking.
+
+Both parsers return the inputs and labels of the model (see prepare_sample of
+the project notebook).
+
+The screenshot records of stream_screenshots.py only hold the five screenshot
+vectors of a trial and its id (see trial_id); they are read by
+build_tfrecords.py in place of the plotdigitizer csv files.
+"""
+
+import numpy as np
+import tensorflow as tf
+import preprocess
+
+schemas = ['dense', 'columns']
+
+# shape of each model input
+input_shapes = {
+    'breath_input': (
+        preprocess.breath_len, 2 * len(preprocess.breath_cols)
+    ),
+    'tbfvl_input': (preprocess.tbfvl_len, 2 * len(preprocess.tbfvl_cols)),
+    'spx_input': (preprocess.spx_len, 2 * len(preprocess.spx_cols)),
+}
+for ss_type in preprocess.screenshot_types:
+    input_shapes['{}_input'.format(ss_type)] = (preprocess.screenshot_len,)
+
+# table type of each table input
+table_inputs = {
+    'breath_input': 'breath', 'tbfvl_input': 'tbfvl', 'spx_input': 'spx'
+}
+
+# length of each label
+label_lens = {'trial_outcome': 1, 'grade': 6}
+
+
+def float_feature(value):
+    """Returns a float_list from a float / double."""
+    return tf.train.Feature(float_list=tf.train.FloatList(value=value))
+
+
+# types need to be uniform in tensor
+def int64_feature(value):
+    """Returns an int64_list from a bool / enum / int / uint."""
+    return tf.train.Feature(int64_list=tf.train.Int64List(value=value))
+
+
+def bytes_feature(value):
+    """Returns a bytes_list from a string / byte."""
+    return tf.train.Feature(bytes_list=tf.train.BytesList(value=value))
+
+
+def dense_features(inputs, labels):
+    """Create the features of a record with the dense schema
+
+    Parameters
+    ----------
+    inputs : dict
+        Maps each model input to an array of its shape (see input_shapes)
+    labels : dict
+        Maps 'trial_outcome' and 'grade' to a list of int
+
+    Returns
+    -------
+    dict
+        Maps each feature name to a tf.train.Feature
+    """
+    feature = {
+        name: bytes_feature([
+            np.asarray(inputs[name], dtype='<f4').reshape(shape).tobytes()
+        ])
+        for name, shape in input_shapes.items()
+    }
+    for name, label in labels.items():
+        feature[name] = int64_feature(label)
+
+    return feature
+
+
+def column_features(inputs, labels):
+    """Create the features of a record with the columns schema
+
+    Parameters
+    ----------
+    inputs : dict
+        Maps each model input to an array of its shape (see input_shapes)
+    labels : dict
+        Maps 'trial_outcome' and 'grade' to a list of int
+
+    Returns
+    -------
+    dict
+        Maps each feature name to a tf.train.Feature
+    """
+    feature = {}
+    for ss_type in preprocess.screenshot_types:
+        feature[ss_type] = float_feature(inputs['{}_input'.format(ss_type)])
+
+    # each column is followed by its boolean column
+    for name, table_type in table_inputs.items():
+        for i in range(input_shapes[name][1] // 2):
+            feature['{}_{}'.format(table_type, i + 1)] = float_feature(
+                inputs[name][:, 2 * i]
+            )
+            feature['{}_{}_bool'.format(table_type, i + 1)] = float_feature(
+                inputs[name][:, 2 * i + 1]
+            )
+
+    for name, label in labels.items():
+        feature[name] = int64_feature(label)
+
+    return feature
+
+
+def label_description():
+    """Get the description of the label features
+
+    Returns
+    -------
+    dict
+        Maps each label to a tf.io.FixedLenFeature
+    """
+    return {
+        name: tf.io.FixedLenFeature([label_len], tf.int64)
+        for name, label_len in label_lens.items()
+    }
+
+
+def restore_batch_shape(tensors, batch_shape):
+    """Replace the leading dimension of parsed tensors with the batch shape
+
+    Records are parsed as a vector; a single record has a batch shape of [].
+
+    Parameters
+    ----------
+    tensors : dict
+        Maps names to tensors with a leading dimension of records
+    batch_shape : tf.Tensor
+        Shape of the serialized records
+
+    Returns
+    -------
+    dict
+        Maps names to the reshaped tensors
+    """
+    return {
+        name: tf.reshape(
+            tensor, tf.concat([batch_shape, tf.shape(tensor)[1:]], axis=0)
+        )
+        for name, tensor in tensors.items()
+    }
+
+
+def parse_dense(serialized):
+    """Parse records with the dense schema
+
+    Parameters
+    ----------
+    serialized : tf.Tensor
+        Serialized record (scalar) or batch of records (vector)
+
+    Returns
+    -------
+    input_dict : dict
+        Maps each model input to a float32 tensor of its shape, with a
+        leading batch dimension if serialized is a batch
+    output_dict : dict
+        Maps each label to an int32 tensor
+    """
+    description = label_description()
+    for name in input_shapes:
+        description[name] = tf.io.FixedLenFeature([], tf.string)
+    features = tf.io.parse_example(tf.reshape(serialized, [-1]), description)
+
+    input_dict = {
+        name: tf.reshape(
+            tf.io.decode_raw(features[name], tf.float32), (-1,) + shape
+        )
+        for name, shape in input_shapes.items()
+    }
+    output_dict = {
+        name: tf.cast(features[name], tf.int32) for name in label_lens
+    }
+
+    batch_shape = tf.shape(serialized)
+    return (
+        restore_batch_shape(input_dict, batch_shape),
+        restore_batch_shape(output_dict, batch_shape)
+    )
+
+
+def parse_columns(serialized):
+    """Parse records with the columns schema
+
+    Equivalent to parse_tfrecord_fn followed by prepare_sample of the project
+    notebook.
+
+    Parameters
+    ----------
+    serialized : tf.Tensor
+        Serialized record (scalar) or batch of records (vector)
+
+    Returns
+    -------
+    input_dict : dict
+        Maps each model input to a float32 tensor of its shape, with a
+        leading batch dimension if serialized is a batch
+    output_dict : dict
+        Maps each label to an int32 tensor
+    """
+    description = label_description()
+    for ss_type in preprocess.screenshot_types:
+        description[ss_type] = tf.io.FixedLenFeature(
+            [preprocess.screenshot_len], tf.float32
+        )
+    for name, table_type in table_inputs.items():
+        n_rows, n_cols = input_shapes[name]
+        for i in range(n_cols // 2):
+            for suffix in ['', '_bool']:
+                description[
+                    '{}_{}{}'.format(table_type, i + 1, suffix)
+                ] = tf.io.FixedLenFeature([n_rows], tf.float32)
+    features = tf.io.parse_example(tf.reshape(serialized, [-1]), description)
+
+    input_dict = {}
+    for name, table_type in table_inputs.items():
+        table_list = []
+        for i in range(input_shapes[name][1] // 2):
+            table_list.append(features['{}_{}'.format(table_type, i + 1)])
+            table_list.append(
+                features['{}_{}_bool'.format(table_type, i + 1)]
+            )
+        input_dict[name] = tf.stack(table_list, axis=-1)
+    for ss_type in preprocess.screenshot_types:
+        input_dict['{}_input'.format(ss_type)] = features[ss_type]
+    output_dict = {
+        name: tf.cast(features[name], tf.int32) for name in label_lens
+    }
+
+    batch_shape = tf.shape(serialized)
+    return (
+        restore_batch_shape(input_dict, batch_shape),
+        restore_batch_shape(output_dict, batch_shape)
+    )
+
+
+def get_parser(schema):
+    """Get the parser of a record schema
+
+    Parameters
+    ----------
+    schema : str
+        'dense' or 'columns'
+
+    Returns
+    -------
+    function
+        parse_dense or parse_columns
+    """
+    return {'dense': parse_dense, 'columns': parse_columns}[schema]
+
+
+def record_features(schema, inputs, labels):
+    """Create the features of a record
+
+    Parameters
+    ----------
+    schema : str
+        'dense' or 'columns'
+    inputs : dict
+        Maps each model input to an array of its shape (see input_shapes)
+    labels : dict
+        Maps 'trial_outcome' and 'grade' to a list of int
+
+    Returns
+    -------
+    dict
+        Maps each feature name to a tf.train.Feature
+    """
+    return {'dense': dense_features, 'columns': column_features}[schema](
+        inputs, labels
+    )
+
+
+def trial_id(spx_filename, trial):
+    """Get the id of a trial in the screenshot records
+
+    The id is the screenshot file name without the screenshot type (i.e.
+    '202.2_trial_3' for '202.2_trial_3_co2.png').
+
+    Parameters
+    ----------
+    spx_filename : str
+        spx file name of the trial
+    trial : int
+        Trial number
+
+    Returns
+    -------
+    str
+        Trial id
+    """
+    return '{}_trial_{}'.format(spx_filename, trial)
+
+
+def screenshot_features(trial, vectors):
+    """Create the features of a screenshot record
+
+    Parameters
+    ----------
+    trial : str
+        Trial id; see trial_id
+    vectors : dict
+        Maps each screenshot type to an array of length
+        preprocess.screenshot_len
+
+    Returns
+    -------
+    dict
+        Maps each feature name to a tf.train.Feature
+    """
+    feature = {'trial': bytes_feature([trial.encode()])}
+    for ss_type in preprocess.screenshot_types:
+        feature[ss_type] = float_feature(vectors[ss_type])
+
+    return feature
+
+
+def parse_screenshots(serialized):
+    """Parse a batch of screenshot records
+
+    Parameters
+    ----------
+    serialized : tf.Tensor
+        Batch of records (vector)
+
+    Returns
+    -------
+    dict
+        Maps 'trial' to a string tensor and each screenshot type to a float32
+        tensor of shape (records, preprocess.screenshot_len)
+    """
+    description = {'trial': tf.io.FixedLenFeature([], tf.string)}
+    for ss_type in preprocess.screenshot_types:
+        description[ss_type] = tf.io.FixedLenFeature(
+            [preprocess.screenshot_len], tf.float32
+        )
+
+    return tf.io.parse_example(serialized, description)
@@ -0,0 +1,283 @@
+"""Single pass statistics of the breath, TBFVL and spx tables
+
+The project notebook combines every training table into a single dataframe to
+get the mean and SD of each column (see 'Section 2.iii') and finds the maximum
+number of rows in a separate pass. Here the count, mean, SD, minimum, maximum
+and number of missing values of each column, as well as the maximum number of
+rows, are accumulated one table at a time (Welford's algorithm, merged with
+Chan et al.'s formula), so memory does not grow with the number of tables.
+Workers accumulate their own tables and the results are merged.
+
+The statistics of the training split are saved by running this script.
+"""
+
+import argparse
+import concurrent.futures
+import math
+import os
+import numpy as np
+import pandas as pd
+import load_tables
+import preprocess
+
+stats_dir = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../../data/intermediary/combine_data_type'
+))
+
+
+class RunningStats:
+    """Column statistics accumulated one table at a time
+
+    Missing and infinite values are ignored and counted as missing.
+
+    Parameters
+    ----------
+    n_cols : int
+        Number of columns
+    """
+
+    def __init__(self, n_cols):
+        self.count = np.zeros(n_cols, dtype=np.int64)
+        self.running_mean = np.zeros(n_cols)
+        self.m2 = np.zeros(n_cols)
+        self.min = np.full(n_cols, np.inf)
+        self.max = np.full(n_cols, -np.inf)
+        self.missing = np.zeros(n_cols, dtype=np.int64)
+        self.n_tables = 0
+        self.max_rows = 0
+
+    def combine(self, count, mean, m2, col_min, col_max, missing):
+        """Merge the statistics of another set of values
+
+        Parameters
+        ----------
+        count : numpy.ndarray
+            Number of values of each column
+        mean : numpy.ndarray
+            Mean of each column
+        m2 : numpy.ndarray
+            Sum of squared differences from the mean of each column
+        col_min : numpy.ndarray
+            Minimum of each column
+        col_max : numpy.ndarray
+            Maximum of each column
+        missing : numpy.ndarray
+            Number of missing values of each column
+        """
+        total = self.count + count
+        # columns without values keep a mean of 0
+        weight = np.divide(
+            count, total, out=np.zeros(len(total)), where=(total > 0)
+        )
+        delta = mean - self.running_mean
+        self.running_mean = self.running_mean + delta * weight
+        self.m2 = self.m2 + m2 + delta**2 * self.count * weight
+        self.count = total
+        self.min = np.minimum(self.min, col_min)
+        self.max = np.maximum(self.max, col_max)
+        self.missing = self.missing + missing
+
+    def update(self, values):
+        """Add the values of a table
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            Values of shape (rows, n_cols); a 1D array is a single column
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+        present = np.isfinite(values)
+        count = present.sum(axis=0)
+        mean = np.divide(
+            np.where(present, values, 0).sum(axis=0), count,
+            out=np.zeros(values.shape[1]), where=(count > 0)
+        )
+
+        self.combine(
+            count, mean,
+            (np.where(present, values - mean, 0)**2).sum(axis=0),
+            np.where(present, values, np.inf).min(axis=0, initial=np.inf),
+            np.where(present, values, -np.inf).max(axis=0, initial=-np.inf),
+            values.shape[0] - count
+        )
+        self.n_tables += 1
+        self.max_rows = max(self.max_rows, values.shape[0])
+
+    def merge(self, other):
+        """Add the statistics accumulated by another RunningStats
+
+        Parameters
+        ----------
+        other : RunningStats
+            Statistics of other tables with the same columns
+
+        Returns
+        -------
+        RunningStats
+            self
+        """
+        self.combine(
+            other.count, other.running_mean, other.m2, other.min, other.max,
+            other.missing
+        )
+        self.n_tables += other.n_tables
+        self.max_rows = max(self.max_rows, other.max_rows)
+
+        return self
+
+    @property
+    def mean(self):
+        """Mean of each column; NaN if the column has no values"""
+        return np.where(self.count > 0, self.running_mean, np.nan)
+
+    @property
+    def sd(self):
+        """Sample standard deviation of each column; NaN if the column has
+        less than 2 values"""
+        return np.sqrt(np.divide(
+            self.m2, self.count - 1, out=np.full(len(self.m2), np.nan),
+            where=(self.count > 1)
+        ))
+
+    def to_frame(self, columns):
+        """Summarize the statistics as a dataframe
+
+        Parameters
+        ----------
+        columns : list of str
+            Name of each column
+
+        Returns
+        -------
+        pandas.dataframe
+            Count, mean, SD, minimum, maximum and number of missing values of
+            each column
+        """
+        return pd.DataFrame({
+            'index': columns, 'count': self.count, 'mean': self.mean,
+            'sd': self.sd,
+            'min': np.where(self.count > 0, self.min, np.nan),
+            'max': np.where(self.count > 0, self.max, np.nan),
+            'missing': self.missing,
+        })
+
+
+def accumulate_tables(table_paths, table_type):
+    """Accumulate the statistics of tables read from their files
+
+    Parameters
+    ----------
+    table_paths : list of str
+        Paths of the exported tables
+    table_type : str
+        'breath', 'tbfvl' or 'spx'
+
+    Returns
+    -------
+    stats : RunningStats
+        Statistics of the tables which could be read
+    errors : list of tuple
+        (table_path, error) of the tables which could not be read
+    """
+    stats = RunningStats(len(preprocess.table_types[table_type][3]))
+    errors = []
+    for table_path in table_paths:
+        values, error = load_tables.read_table(table_path, table_type)
+        if values is None:
+            errors.append((table_path, error))
+        else:
+            stats.update(values)
+
+    return stats, errors
+
+
+def table_stats(table_paths, table_type, workers=None):
+    """Accumulate the statistics of tables in parallel
+
+    Parameters
+    ----------
+    table_paths : list of str
+        Paths of the exported tables
+    table_type : str
+        'breath', 'tbfvl' or 'spx'
+    workers : int, optional
+        Number of worker processes, by default None (number of CPUs)
+
+    Returns
+    -------
+    stats : RunningStats
+        Statistics of the tables which could be read
+    errors : list of tuple
+        (table_path, error) of the tables which could not be read
+    """
+    workers = workers or os.cpu_count()
+    chunk_size = max(1, math.ceil(len(table_paths) / (4 * workers)))
+    chunks = [
+        table_paths[start:(start + chunk_size)]
+        for start in range(0, len(table_paths), chunk_size)
+    ]
+
+    stats = RunningStats(len(preprocess.table_types[table_type][3]))
+    errors = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers
+    ) as executor:
+        for chunk_stats, chunk_errors in executor.map(
+            accumulate_tables, chunks, [table_type] * len(chunks)
+        ):
+            stats.merge(chunk_stats)
+            errors.extend(chunk_errors)
+
+    return stats, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Get the column statistics of the training tables'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count(),
+        help='Number of worker processes, by default the number of CPUs'
+    )
+    parser.add_argument(
+        '--output-dir', default=stats_dir,
+        help='Folder to save the statistics'
+    )
+    args = parser.parse_args()
+
+    redcap_qc = pd.read_csv(
+        os.path.abspath(os.path.join(
+            os.path.dirname(__file__),
+            '../../data/intermediary/main_id_associated_files.csv'
+        )),
+        keep_default_na=False
+    )
+    # only training data so the test data is wholly unseen
+    train_qc = redcap_qc.loc[redcap_qc['split_group'] == 'train']
+
+    for table_type, (path_col, _, _, columns, _, _) in (
+        preprocess.table_types.items()
+    ):
+        stats, errors = table_stats(
+            [
+                preprocess.resolve_path(path)
+                for path in train_qc[path_col].unique()
+            ],
+            table_type, args.workers
+        )
+        for table_path, error in errors:
+            print('Table issue: {} ({})'.format(table_path, error))
+
+        stats.to_frame(columns).to_csv(
+            os.path.join(args.output_dir, '{}_stats.csv'.format(table_type)),
+            index=False
+        )
+        print('{}: {} tables, maximum of {} rows'.format(
+            table_type, stats.n_tables, stats.max_rows
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Digitize Spiroware screenshots straight into TFRecord files
+
+Each screenshot is cropped, digitized, interpolated and standardized in memory
+(see 3-digitize_screenshot.py and preprocess.screenshot_vector) and the five
+signals of a trial are written as a single record (see
+record_schema.screenshot_features); the plotdigitizer csv files are only
+written if requested. The signals are those the final model was trained on,
+i.e. the notebook with the pinned pandas (see preprocess.resample_screenshot).
+Trials are split into shards which are written in parallel. build_tfrecords.py
+takes the screenshots of the training records from these records.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import importlib
+import math
+import os
+import re
+import sys
+import tensorflow as tf
+import build_tfrecords
+import preprocess
+import record_schema
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../data'))
+digitize = importlib.import_module('3-digitize_screenshot')
+
+
+def group_trials(screenshot_fnames):
+    """Group screenshot file names by trial
+
+    Screenshots are named '<trial>_<screenshot type>.png' (i.e.
+    '202.2_trial_3_co2.png'), so the trial is the id of
+    record_schema.trial_id.
+
+    Parameters
+    ----------
+    screenshot_fnames : list of str
+        File names of the Spiroware screenshots
+
+    Returns
+    -------
+    dict
+        Maps each trial to a dict of screenshot type to file name
+    """
+    trials = {}
+    for fname in sorted(screenshot_fnames):
+        file_no_ext = re.sub(r'\.png', '', fname)
+        trial = re.sub('_[^_]*$', '', file_no_ext)
+        screenshot_type = re.sub('.*_', '', file_no_ext)
+        trials.setdefault(trial, {})[screenshot_type] = fname
+
+    return trials
+
+
+def process_trial(trial_screenshots, screenshots_path, csv_dir=None):
+    """Digitize and process the screenshots of a trial
+
+    Must be called in a process initialized with init_worker of
+    3-digitize_screenshot.py.
+
+    Parameters
+    ----------
+    trial_screenshots : dict
+        Maps each screenshot type to a file name; see group_trials
+    screenshots_path : str
+        Folder containing the screenshots
+    csv_dir : str, optional
+        Folder to save the plotdigitizer csv files, by default None (not
+        saved)
+
+    Returns
+    -------
+    dict
+        Maps each screenshot type to a float32 array of length
+        preprocess.screenshot_len
+    """
+    vectors = {}
+    for screenshot_type in preprocess.screenshot_types:
+        fname = trial_screenshots[screenshot_type]
+        _, spiro_fig, _ = digitize.crop_figure(
+            os.path.join(screenshots_path, fname),
+            digitize.worker_state['corner_matcher']
+        )
+        output_path = None
+        if csv_dir is not None:
+            output_path = os.path.join(
+                csv_dir, re.sub(r'\.png', '.csv', fname)
+            )
+        traj = digitize.digitize_figure(
+            spiro_fig, screenshot_type, output_path,
+            digitize.worker_state['glyph_bank']
+        )
+        vectors[screenshot_type] = preprocess.screenshot_vector(
+            traj, screenshot_type
+        )
+
+    return vectors
+
+
+def write_shard(shard_path, trials, screenshots_path, csv_dir=None):
+    """Write the records of several trials to a TFRecord file
+
+    Parameters
+    ----------
+    shard_path : str
+        Path of the TFRecord file
+    trials : list of tuple
+        (trial, trial_screenshots) of each trial in the shard; see
+        group_trials
+    screenshots_path : str
+        Folder containing the screenshots
+    csv_dir : str, optional
+        Folder to save the plotdigitizer csv files, by default None (not
+        saved)
+
+    Returns
+    -------
+    list of tuple
+        (trial, status, error) for every trial; status is 'success' or
+        'failure'
+    """
+    results = []
+    # write to a temporary file first so partially written shards are never
+    # read
+    temp_path = '{}.tmp'.format(shard_path)
+    with tf.io.TFRecordWriter(temp_path) as writer:
+        for trial, trial_screenshots in trials:
+            try:
+                vectors = process_trial(
+                    trial_screenshots, screenshots_path, csv_dir
+                )
+            except Exception as e:
+                results.append(
+                    (trial, 'failure', '{}: {}'.format(type(e).__name__, e))
+                )
+                continue
+
+            example = tf.train.Example(features=tf.train.Features(
+                feature=record_schema.screenshot_features(trial, vectors)
+            ))
+            writer.write(example.SerializeToString())
+            results.append((trial, 'success', ''))
+    os.replace(temp_path, shard_path)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Digitize Spiroware screenshots into TFRecord files'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count(),
+        help='Number of worker processes, by default the number of CPUs'
+    )
+    parser.add_argument(
+        '--shard-size', type=int, default=1000,
+        help='Maximum number of trials in each TFRecord file'
+    )
+    parser.add_argument(
+        '--output-dir', default=build_tfrecords.screenshot_records_dir,
+        help='Folder to save the TFRecord files'
+    )
+    parser.add_argument(
+        '--csv-dir', default=None,
+        help='Also save the plotdigitizer csv files to this folder'
+    )
+    args = parser.parse_args()
+
+    spiroware_screenshots_path = os.path.abspath(os.path.join(
+        os.path.dirname(__file__), '../../data/raw/spiroware_screenshots'
+    ))
+    spiroware_screenshots = [
+        fname for fname in os.listdir(spiroware_screenshots_path)
+        if fname.endswith('.png')
+    ]
+
+    # only trials with all screenshot types can be used by the model
+    trials = []
+    for trial, trial_screenshots in group_trials(
+        spiroware_screenshots
+    ).items():
+        if all(
+            screenshot_type in trial_screenshots
+            for screenshot_type in preprocess.screenshot_types
+        ):
+            trials.append((trial, trial_screenshots))
+        else:
+            print('Incomplete trial: {}'.format(trial))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.csv_dir is not None:
+        os.makedirs(args.csv_dir, exist_ok=True)
+
+    # each shard is written by a single worker so there should be at least
+    # as many shards as workers
+    shard_size = max(1, min(
+        args.shard_size, math.ceil(len(trials) / args.workers)
+    ))
+    shards = [
+        trials[start:(start + shard_size)]
+        for start in range(0, len(trials), shard_size)
+    ]
+    shard_paths = [
+        os.path.join(
+            args.output_dir,
+            'screenshots_{:03d}-of-{:03d}.tfrec'.format(i + 1, len(shards))
+        )
+        for i in range(len(shards))
+    ]
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=args.workers, initializer=digitize.init_worker,
+        initargs=(None, False, digitize.digitize_params)
+    ) as executor:
+        futures = [
+            executor.submit(
+                write_shard, shard_path, shard, spiroware_screenshots_path,
+                args.csv_dir
+            )
+            for shard_path, shard in zip(shard_paths, shards)
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            results.extend(future.result())
+
+    with open(
+        os.path.join(args.output_dir, 'screenshots_report.csv'), 'w',
+        newline=''
+    ) as report_file:
+        writer = csv.writer(report_file)
+        writer.writerow(['trial', 'status', 'error'])
+        writer.writerows(sorted(results))
+
+    # print trials with issues so they can be followed up
+    for trial, status, error in sorted(results):
+        if status == 'failure':
+            print('Trial issue: {} ({})'.format(trial, error))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Standardize, mask and pad the breath, TBFVL and spx tables
+
+Replaces standardize, create_bool_col and pad_rows of the project notebook
+(see 'Section 2.iv') for the tables. The mean and standard deviation of each
+column are fitted once on the training split and saved as arrays in a fixed
+column order, so a table is transformed with a few array operations instead of
+a loop over dataframe columns.
+
+The transforms are fitted on the Parquet files of load_tables.py and saved by
+running this script.
+"""
+
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import load_tables
+import preprocess
+import stats
+
+transform_dir = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../../data/intermediary/combine_data_type'
+))
+
+
+class FeatureTransform:
+    """Standardization, missing value mask and padding of a table
+
+    Parameters
+    ----------
+    columns : list of str
+        Columns of the table, in order
+    mean : numpy.ndarray
+        Mean of each column
+    sd : numpy.ndarray
+        Standard deviation of each column
+    n_rows : int
+        Number of rows tables are padded (or truncated) to
+    """
+
+    def __init__(self, columns, mean, sd, n_rows):
+        self.columns = list(columns)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.sd = np.asarray(sd, dtype=np.float64)
+        self.n_rows = int(n_rows)
+
+    @classmethod
+    def fit(cls, tables, columns, n_rows, skip_cols=None):
+        """Fit the mean and standard deviation of each column
+
+        Missing and infinite values are ignored. Tables are accumulated one
+        at a time (see stats.RunningStats), so tables can be a generator.
+
+        Parameters
+        ----------
+        tables : iterable of numpy.ndarray
+            Values of the training tables, each of shape (rows, len(columns))
+        columns : list of str
+            Columns of the tables, in order
+        n_rows : int
+            Number of rows tables are padded (or truncated) to
+        skip_cols : list of str, optional
+            Columns which are not standardized (i.e. dummy columns), by
+            default None
+
+        Returns
+        -------
+        FeatureTransform
+            Fitted transform
+        """
+        table_stats = stats.RunningStats(len(columns))
+        for table in tables:
+            table_stats.update(table)
+
+        return cls.from_stats(table_stats, columns, n_rows, skip_cols)
+
+    @classmethod
+    def from_stats(cls, table_stats, columns, n_rows, skip_cols=None):
+        """Create a transform from accumulated column statistics
+
+        Parameters
+        ----------
+        table_stats : stats.RunningStats
+            Statistics of the training tables
+        columns : list of str
+            Columns of the tables, in order
+        n_rows : int
+            Number of rows tables are padded (or truncated) to
+        skip_cols : list of str, optional
+            Columns which are not standardized (i.e. dummy columns), by
+            default None
+
+        Returns
+        -------
+        FeatureTransform
+            Transform using the statistics
+        """
+        mean = table_stats.mean
+        sd = table_stats.sd
+
+        skip = np.isin(columns, skip_cols or [])
+        mean[skip] = 0
+        sd[skip] = 1
+
+        return cls(columns, mean, sd, n_rows)
+
+    @classmethod
+    def from_mean_sd(cls, mean_sd_dict, columns, n_rows):
+        """Create a transform from a dictionary of means and SDs
+
+        Parameters
+        ----------
+        mean_sd_dict : dict
+            Maps each column to its 'mean' and 'sd'; columns which are missing
+            are not standardized
+        columns : list of str
+            Columns of the table, in order
+        n_rows : int
+            Number of rows tables are padded (or truncated) to
+
+        Returns
+        -------
+        FeatureTransform
+            Transform using the given means and SDs
+        """
+        mean = [mean_sd_dict.get(col, {'mean': 0})['mean'] for col in columns]
+        sd = [mean_sd_dict.get(col, {'sd': 1})['sd'] for col in columns]
+
+        return cls(columns, mean, sd, n_rows)
+
+    @classmethod
+    def load(cls, path):
+        """Load a transform saved with save
+
+        Parameters
+        ----------
+        path : str
+            Path of the .npz file
+
+        Returns
+        -------
+        FeatureTransform
+            Saved transform
+        """
+        with np.load(path) as saved:
+            return cls(
+                saved['columns'].tolist(), saved['mean'], saved['sd'],
+                saved['n_rows']
+            )
+
+    def save(self, path):
+        """Save the transform
+
+        Parameters
+        ----------
+        path : str
+            Path of the .npz file
+        """
+        np.savez(
+            path, columns=np.array(self.columns), mean=self.mean, sd=self.sd,
+            n_rows=self.n_rows
+        )
+
+    def transform(self, values):
+        """Standardize, mask and pad the values of a table
+
+        Equivalent to standardize, create_bool_col and pad_rows of the
+        project notebook followed by stacking each column with its boolean
+        column (see prepare_sample).
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            Values of shape (rows, len(columns)); NaN or infinite values are
+            missing
+
+        Returns
+        -------
+        numpy.ndarray
+            float32 array of shape (n_rows, 2 * len(columns)); each column is
+            followed by 1 where the value is present and 0 where it is missing
+            or padded. Missing and padded values are 0
+        """
+        values = np.asarray(values, dtype=np.float64)[:self.n_rows]
+        present = np.isfinite(values)
+
+        features = np.zeros((self.n_rows, 2 * len(self.columns)), np.float32)
+        features[:len(values), 0::2] = np.where(
+            present, (values - self.mean)/(self.sd), 0
+        )
+        features[:len(values), 1::2] = present
+
+        return features
+
+
+def load_transforms(path=transform_dir):
+    """Load the saved transform of every table type
+
+    Parameters
+    ----------
+    path : str, optional
+        Folder containing the '<table type>_transform.npz' files, by default
+        data/intermediary/combine_data_type
+
+    Returns
+    -------
+    dict
+        Maps each table type to its FeatureTransform
+    """
+    return {
+        table_type: FeatureTransform.load(
+            os.path.join(path, '{}_transform.npz'.format(table_type))
+        )
+        for table_type in preprocess.table_types
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Fit the table transforms on the training split'
+    )
+    parser.add_argument(
+        '--output-dir', default=transform_dir,
+        help='Folder to save the transforms'
+    )
+    parser.add_argument(
+        '--tables-dir', default=load_tables.tables_dir,
+        help='Folder containing the Parquet files of load_tables.py'
+    )
+    args = parser.parse_args()
+
+    redcap_qc = pd.read_csv(
+        os.path.abspath(os.path.join(
+            os.path.dirname(__file__),
+            '../../data/intermediary/main_id_associated_files.csv'
+        )),
+        keep_default_na=False
+    )
+    # only training data so the test data is wholly unseen
+    train_qc = redcap_qc.loc[redcap_qc['split_group'] == 'train']
+    train_keys = list(zip(train_qc['spx_filename'], train_qc['trial']))
+
+    for table_type, (_, _, _, columns, n_rows, skip_cols) in (
+        preprocess.table_types.items()
+    ):
+        tables = load_tables.load_tables(
+            table_type, args.tables_dir, train_keys
+        ).values()
+        feature_transform = FeatureTransform.fit(
+            tables, columns, n_rows, skip_cols
+        )
+        feature_transform.save(os.path.join(
+            args.output_dir, '{}_transform.npz'.format(table_type)
+        ))
+        print('{}: fitted on {} tables'.format(table_type, len(tables)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+"""Export the saved model for CPU serving
+
+The final model is saved with model.save (see 'Section 2.v.c' of the project
+notebook), which keeps the training functions and a batch dimension of any
+size in every input. Here three serving variants are exported:
+
+- 'serving': a SavedModel with a single serving signature of fixed input
+  shapes (see record_schema.input_shapes)
+- 'xla': the same signature compiled with XLA
+- 'tflite': a TFLite model of a single trial, with dynamic range
+  quantization of the weights if requested
+
+The outputs of every variant are compared with the original model on the test
+split (the largest difference and the accuracy of the trial outcome), and the
+latency of a single trial and the throughput of batches are measured.
+
+The variants are exported and compared by running this script, with
+mbw_qc/features on the Python path.
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from tensorflow.python.framework import convert_to_constants
+import dataset
+import predict_model
+import record_schema
+
+export_dir = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../../models/baseline_BO/export'
+))
+
+output_names = list(record_schema.label_lens)
+
+
+def serving_function(model, jit_compile=False, batch_size=None):
+    """Wrap the model in a function of fixed input shapes
+
+    Parameters
+    ----------
+    model : keras.Model
+        Model of the project notebook
+    jit_compile : bool, optional
+        Compile the function with XLA, by default False
+    batch_size : int, optional
+        Fixed batch size, by default None (any batch size)
+
+    Returns
+    -------
+    tf.types.experimental.ConcreteFunction
+        Function of the model inputs returning the 'trial_outcome' and
+        'grade' probabilities
+    """
+    input_signature = {
+        name: tf.TensorSpec((batch_size,) + shape, tf.float32, name=name)
+        for name, shape in predict_model.model_input_shapes(model).items()
+    }
+
+    @tf.function(jit_compile=jit_compile)
+    def serve(inputs):
+        return dict(zip(output_names, model(inputs, training=False)))
+
+    return serve.get_concrete_function(input_signature)
+
+
+def export_saved_model(model, path, jit_compile=False):
+    """Export the serving signature as a SavedModel
+
+    Parameters
+    ----------
+    model : keras.Model
+        Model of the project notebook
+    path : str
+        Folder of the SavedModel
+    jit_compile : bool, optional
+        Compile the signature with XLA, by default False
+    """
+    module = tf.Module()
+    module.model = model
+    module.serve = serving_function(model, jit_compile)
+    tf.saved_model.save(
+        module, path, signatures={'serving_default': module.serve}
+    )
+
+
+def tflite_converter(function):
+    """Create the TFLite converter of a function of the model
+
+    The LSTM layers follow masking layers, so TensorFlow ops which TFLite
+    does not support are kept as select TensorFlow ops. The variables are
+    frozen into constants first, as the variables read inside the loops of
+    the LSTM layers are not initialized by the TFLite interpreter.
+
+    Parameters
+    ----------
+    function : tf.types.experimental.ConcreteFunction
+        Function of fixed input shapes; see serving_function
+
+    Returns
+    -------
+    tf.lite.TFLiteConverter
+        Converter of the frozen function
+    """
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([
+        convert_to_constants.convert_variables_to_constants_v2(function)
+    ])
+    converter.target_spec.supported_ops = [
+        tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS
+    ]
+
+    return converter
+
+
+def export_tflite(model, path, quantize=False):
+    """Export a TFLite model of a single trial
+
+    Parameters
+    ----------
+    model : keras.Model
+        Model of the project notebook
+    path : str
+        Path of the .tflite file
+    quantize : bool, optional
+        Quantize the weights to 8 bits (dynamic range quantization), by
+        default False
+    """
+    converter = tflite_converter(serving_function(model, batch_size=1))
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    with open(path, 'wb') as tflite_file:
+        tflite_file.write(converter.convert())
+
+
+class SavedModelRunner:
+    """Run the serving signature of an exported SavedModel
+
+    Parameters
+    ----------
+    path : str
+        Folder of the SavedModel
+    """
+
+    def __init__(self, path):
+        self.saved_model = tf.saved_model.load(path)
+        self.serve = self.saved_model.signatures['serving_default']
+
+    def __call__(self, inputs):
+        """Score a batch of trials
+
+        Parameters
+        ----------
+        inputs : dict
+            Maps each model input to a float32 array with a leading batch
+            dimension and the model input shape
+
+        Returns
+        -------
+        dict
+            Maps 'trial_outcome' and 'grade' to arrays of probabilities
+        """
+        outputs = self.serve(**{
+            name: tf.constant(values) for name, values in inputs.items()
+        })
+        return {name: outputs[name].numpy() for name in output_names}
+
+
+class TFLiteRunner:
+    """Run an exported TFLite model one trial at a time
+
+    Parameters
+    ----------
+    path : str
+        Path of the .tflite file
+    threads : int, optional
+        Number of threads of the interpreter, by default None (TFLite
+        default)
+    """
+
+    def __init__(self, path, threads=None):
+        self.interpreter = tf.lite.Interpreter(
+            model_path=path, num_threads=threads
+        )
+        self.interpreter.allocate_tensors()
+        self.inputs = {
+            detail['name'].split(':')[0].split('serving_default_')[-1]:
+            detail['index']
+            for detail in self.interpreter.get_input_details()
+        }
+        # outputs are matched to their names by their shape
+        self.outputs = {
+            name: next(
+                detail['index']
+                for detail in self.interpreter.get_output_details()
+                if detail['shape'][-1] == label_len
+            )
+            for name, label_len in record_schema.label_lens.items()
+        }
+
+    def __call__(self, inputs):
+        """Score a batch of trials; see SavedModelRunner"""
+        n_trials = len(next(iter(inputs.values())))
+        outputs = {name: [] for name in output_names}
+        for i in range(n_trials):
+            for name, index in self.inputs.items():
+                self.interpreter.set_tensor(index, inputs[name][i:(i + 1)])
+            self.interpreter.invoke()
+            for name, index in self.outputs.items():
+                outputs[name].append(self.interpreter.get_tensor(index))
+
+        return {
+            name: np.concatenate(values) for name, values in outputs.items()
+        }
+
+
+class KerasRunner:
+    """Run the saved Keras model; see SavedModelRunner
+
+    Parameters
+    ----------
+    model : keras.Model
+        Model of the project notebook
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, inputs):
+        outputs = self.model.predict_on_batch(inputs)
+        return {
+            name: np.asarray(output)
+            for name, output in zip(output_names, outputs)
+        }
+
+
+def load_runners(model, path=export_dir, threads=None):
+    """Load the original model and every exported variant
+
+    Parameters
+    ----------
+    model : keras.Model
+        Model of the project notebook
+    path : str, optional
+        Folder of the exported variants, by default
+        models/baseline_BO/export
+    threads : int, optional
+        Number of threads of the TFLite interpreter, by default None
+
+    Returns
+    -------
+    dict
+        Maps 'keras' and each variant to a function scoring a batch of
+        trials
+    """
+    return {
+        'keras': KerasRunner(model),
+        'serving': SavedModelRunner(os.path.join(path, 'serving')),
+        'xla': SavedModelRunner(os.path.join(path, 'xla')),
+        'tflite': TFLiteRunner(os.path.join(path, 'model.tflite'), threads),
+    }
+
+
+def test_batches(input_shapes, manifest, batch_size, n_batches=None):
+    """Read batches of the test split in the shape of the model inputs
+
+    Parameters
+    ----------
+    input_shapes : dict
+        Shape of each model input; see predict_model.model_input_shapes
+    manifest : str
+        Path of the manifest of build_tfrecords.py
+    batch_size : int
+        Number of trials in each batch
+    n_batches : int, optional
+        Number of batches, by default None (the whole split)
+
+    Yields
+    ------
+    inputs : dict
+        Maps each model input to a float32 array
+    labels : dict
+        Maps 'trial_outcome' and 'grade' to the labels of each trial
+    """
+    test_dataset, _ = dataset.split_dataset(
+        'test', batch_size, manifest, training=False
+    )
+    if n_batches is not None:
+        test_dataset = test_dataset.take(n_batches)
+
+    for input_dict, output_dict in test_dataset:
+        yield (
+            {
+                name: input_dict[name].numpy().reshape((-1,) + shape)
+                for name, shape in input_shapes.items()
+            },
+            {name: labels.numpy() for name, labels in output_dict.items()}
+        )
+
+
+def parity(runners, batches, threshold=0.5):
+    """Compare the outputs of the variants with the original model
+
+    Parameters
+    ----------
+    runners : dict
+        Maps 'keras' and each variant to its runner; see load_runners
+    batches : iterable of tuple
+        (inputs, labels) of each batch; see test_batches
+    threshold : float, optional
+        Probability above which a trial is accepted, by default 0.5
+
+    Returns
+    -------
+    pandas.dataframe
+        For each runner: the largest absolute difference from the original
+        model of each output, the proportion of trials with the same outcome
+        and the accuracy of the trial outcome
+    """
+    max_diff = {
+        name: {output: 0.0 for output in output_names} for name in runners
+    }
+    same = {name: 0 for name in runners}
+    correct = {name: 0 for name in runners}
+    n_trials = 0
+    for inputs, labels in batches:
+        reference = runners['keras'](inputs)
+        for name, runner in runners.items():
+            outputs = runner(inputs)
+            for output in output_names:
+                max_diff[name][output] = max(
+                    max_diff[name][output],
+                    float(np.abs(outputs[output] - reference[output]).max())
+                )
+            accepted = outputs['trial_outcome'][:, 0] >= threshold
+            same[name] += int((
+                accepted == (reference['trial_outcome'][:, 0] >= threshold)
+            ).sum())
+            correct[name] += int((
+                accepted == (labels['trial_outcome'][:, 0] == 1)
+            ).sum())
+        n_trials += len(accepted)
+
+    return pd.DataFrame([
+        {
+            'variant': name,
+            'max_diff_trial_outcome': max_diff[name]['trial_outcome'],
+            'max_diff_grade': max_diff[name]['grade'],
+            'same_outcome': same[name] / max(n_trials, 1),
+            'accuracy': correct[name] / max(n_trials, 1),
+        }
+        for name in runners
+    ])
+
+
+def benchmark(runners, inputs, batch_size, runs=20):
+    """Measure the latency and throughput of each runner
+
+    Parameters
+    ----------
+    runners : dict
+        Maps 'keras' and each variant to its runner; see load_runners
+    inputs : dict
+        Model inputs of at least batch_size trials
+    batch_size : int
+        Number of trials in the batches of the throughput
+    runs : int, optional
+        Number of timed calls of each measure, by default 20
+
+    Returns
+    -------
+    pandas.dataframe
+        For each runner: the p50 and p99 latency of a single trial in
+        seconds and the trials scored per second in batches
+    """
+    single = {name: values[:1] for name, values in inputs.items()}
+    batch = {name: values[:batch_size] for name, values in inputs.items()}
+    n_trials = len(next(iter(batch.values())))
+
+    rows = []
+    for name, runner in runners.items():
+        # the first calls trace and compile the functions
+        runner(single)
+        runner(batch)
+        latencies = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            runner(single)
+            latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        for _ in range(runs):
+            runner(batch)
+        elapsed = time.perf_counter() - start
+        rows.append({
+            'variant': name,
+            'latency_p50': np.quantile(latencies, 0.5),
+            'latency_p99': np.quantile(latencies, 0.99),
+            'trials_per_second': runs * n_trials / elapsed,
+        })
+
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Export and compare the serving variants of the model'
+    )
+    parser.add_argument(
+        '--model', default=predict_model.model_path,
+        help='Path of the saved model'
+    )
+    parser.add_argument(
+        '--output-dir', default=export_dir,
+        help='Folder to save the exported variants and reports'
+    )
+    parser.add_argument(
+        '--quantize', action='store_true',
+        help='Quantize the weights of the TFLite model (dynamic range)'
+    )
+    parser.add_argument(
+        '--skip-export', action='store_true',
+        help='Compare the variants which were already exported'
+    )
+    parser.add_argument(
+        '--manifest', default=dataset.build_tfrecords.manifest_path,
+        help='Path of the manifest of build_tfrecords.py'
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=32,
+        help='Number of trials in each batch'
+    )
+    parser.add_argument(
+        '--parity-batches', type=int, default=None,
+        help='Number of test batches compared, by default the whole split'
+    )
+    parser.add_argument(
+        '--runs', type=int, default=20,
+        help='Number of timed calls of each benchmark'
+    )
+    parser.add_argument(
+        '--threads', type=int, default=None,
+        help='Number of threads of the TFLite interpreter'
+    )
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(args.model, compile=False)
+    if not args.skip_export:
+        os.makedirs(args.output_dir, exist_ok=True)
+        export_saved_model(model, os.path.join(args.output_dir, 'serving'))
+        export_saved_model(
+            model, os.path.join(args.output_dir, 'xla'), jit_compile=True
+        )
+        export_tflite(
+            model, os.path.join(args.output_dir, 'model.tflite'),
+            args.quantize
+        )
+
+    runners = load_runners(model, args.output_dir, args.threads)
+    input_shapes = predict_model.model_input_shapes(model)
+
+    parity_report = parity(runners, test_batches(
+        input_shapes, args.manifest, args.batch_size, args.parity_batches
+    ))
+    inputs, _ = next(test_batches(
+        input_shapes, args.manifest, args.batch_size
+    ))
+    benchmark_report = benchmark(runners, inputs, args.batch_size, args.runs)
+
+    report = parity_report.merge(benchmark_report, on='variant')
+    report.to_csv(
+        os.path.join(args.output_dir, 'export_report.csv'), index=False
+    )
+    print(report.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Network of the project notebook
+
+model_builder of the project notebook (see 'Section 3'), so the network can
+be built outside the notebook, e.g. by train_model.py. The only change is
+that the two output layers are computed in float32, so the probabilities and
+the losses stay float32 when the rest of the network runs in bfloat16 (mixed
+precision); without mixed precision the network is unchanged.
+"""
+
+from tensorflow import keras
+
+# hyperparameters of the final model found by the tuner of the project
+# notebook
+best_hyperparameters = {
+    'kernal_pool': 3,
+    'units_1': 960,
+    'units_2': 960,
+    'rate_1': 0.0,
+    'rate_2': 0.0,
+    'rate_3': 0.8,
+    'rate_4': 0.0,
+}
+
+
+def model_builder(hp):
+    """Model summary
+
+    Parameters
+    ----------
+    hp : keras.HyperParameters
+        Hyperparameter used to train the model instance
+
+    Returns
+    -------
+    keras.Model
+        Compiled model incorporating hyperparameters
+    """
+    breath_input = keras.Input(shape=(187, 56), name="breath_input")
+    tbfvl_input = keras.Input(shape=(203, 86), name="tbfvl_input")
+    spx_input = keras.Input(shape=(1, 92), name="spx_input")
+    o2_input = keras.Input(shape=(5748, 1), name="o2_input")
+    co2_input = keras.Input(shape=(5748, 1), name="co2_input")
+    n2_input = keras.Input(shape=(5748, 1), name="n2_input")
+    flow_input = keras.Input(shape=(5748, 1), name="flow_input")
+    volume_input = keras.Input(shape=(5748, 1), name="volume_input")
+
+    screenshot_list = []
+    hp_kernal_pool = hp.Int('kernal_pool', min_value=3, max_value=33, step=5)
+
+    stride_pool = 1
+    stride_conv1d = 2
+
+    for ss_input in [o2_input, co2_input, n2_input, flow_input, volume_input]:
+        conv_layer_1 = keras.layers.Conv1D(
+            filters=512, kernel_size=hp_kernal_pool, activation='relu',
+            input_shape=(5748, 1), padding='valid', strides=stride_conv1d
+        )(ss_input)
+        pooling_layer_1 = keras.layers.MaxPooling1D(
+            pool_size=hp_kernal_pool, padding='same', strides=stride_pool
+        )(conv_layer_1)
+
+        conv_layer_2 = keras.layers.Conv1D(
+            filters=128, kernel_size=hp_kernal_pool, activation='relu',
+            input_shape=(2873, 512), padding='valid', strides=stride_conv1d
+        )(pooling_layer_1)
+        pooling_layer_2 = keras.layers.MaxPooling1D(
+            pool_size=hp_kernal_pool, padding='same', strides=stride_pool
+        )(conv_layer_2)
+
+        conv_layer_3 = keras.layers.Conv1D(
+            filters=64, kernel_size=hp_kernal_pool, activation='relu',
+            input_shape=(1436, 128), padding='valid', strides=stride_conv1d
+        )(pooling_layer_2)
+        pooling_layer_3 = keras.layers.MaxPooling1D(
+            pool_size=hp_kernal_pool, padding='same', strides=stride_pool
+        )(conv_layer_3)
+
+        conv_layer_4 = keras.layers.Conv1D(
+            filters=32, kernel_size=hp_kernal_pool, activation='relu',
+            input_shape=(717, 64), padding='valid', strides=stride_conv1d
+        )(pooling_layer_3)
+        pooling_layer_4 = keras.layers.MaxPooling1D(
+            pool_size=hp_kernal_pool, padding='same', strides=stride_pool
+        )(conv_layer_4)
+
+        screenshot_list.append(pooling_layer_4)
+
+    # combine all screen shots
+    screenshot = keras.layers.concatenate(screenshot_list)
+
+    # mask layers
+    breath_mask = keras.layers.Masking()(breath_input)
+    tbfvl_mask = keras.layers.Masking()(tbfvl_input)
+    screenshot_mask = keras.layers.Masking()(screenshot)
+
+    # LSTM for time series
+    hp_units_1 = hp.Int('units_1', min_value=64, max_value=1024, step=128)
+    breath_features = keras.layers.Bidirectional(
+        keras.layers.LSTM(units=hp_units_1, input_shape=[187, 56])
+    )(breath_mask)
+    tbfvl_features = keras.layers.Bidirectional(
+        keras.layers.LSTM(units=hp_units_1, input_shape=[203, 86])
+    )(tbfvl_mask)
+    screenshot_features = keras.layers.Bidirectional(
+        keras.layers.LSTM(units=hp_units_1, )
+    )(screenshot_mask)
+
+    # dense layer to non-time series data
+    hp_units_2 = hp.Int('units_2', min_value=64, max_value=1024, step=128)
+    spx_features = keras.layers.Dense(
+        units=hp_units_2, activation='relu'
+    )(spx_input)
+
+    # individual drop out layers
+    hp_rate_1 = hp.Float('rate_1', min_value=0, max_value=0.8, step=0.2)
+    breath_features = keras.layers.Dropout(rate=hp_rate_1)(breath_features)
+    hp_rate_2 = hp.Float('rate_2', min_value=0, max_value=0.4, step=0.2)
+    tbfvl_features = keras.layers.Dropout(rate=hp_rate_2)(tbfvl_features)
+    hp_rate_3 = hp.Float('rate_3', min_value=0, max_value=0.8, step=0.2)
+    screenshot_features = keras.layers.Dropout(
+        rate=hp_rate_3
+    )(screenshot_features)
+    hp_rate_4 = hp.Float('rate_4', min_value=0, max_value=0.4, step=0.2)
+    spx_features = keras.layers.Dropout(rate=hp_rate_4)(spx_features)
+
+    spx_features = keras.layers.Flatten()(spx_features)
+
+    total_features = keras.layers.concatenate(
+        [breath_features, tbfvl_features, screenshot_features, spx_features]
+    )
+
+    total_features = keras.layers.Dense(
+        units=1024, activation='relu', kernel_initializer='he_normal'
+    )(total_features)
+
+    # outputs in float32 under mixed precision
+    trial_outcome = keras.layers.Dense(
+        1, activation='sigmoid', name='trial_outcome', dtype='float32'
+    )(total_features)
+    grade = keras.layers.Dense(
+        6, activation='sigmoid', name='grade', dtype='float32'
+    )(total_features)
+
+    model = keras.Model(
+        inputs=[
+            breath_input, tbfvl_input, spx_input,
+            o2_input, co2_input, n2_input, flow_input, volume_input
+        ],
+        outputs=[trial_outcome, grade],
+    )
+    model.compile(
+        loss=[
+            keras.losses.BinaryCrossentropy(),
+            keras.losses.CategoricalCrossentropy()
+        ],
+        optimizer='adam',
+        metrics=['acc']
+    )
+
+    return model
@@ -0,0 +1,429 @@
+"""Score new MBW trials with the saved model
+
+The project notebook only runs the final model with model.evaluate on the
+test TFRecord files (see 'Section 3'). Here the trials of a folder of
+uploaded files are scored without building TFRecord files: the files are
+linked to their trial by file name (see file_index.py), every trial is
+preprocessed in parallel by worker processes in the same way as the training
+records (see build_tfrecords.py), and trials are scored in batches by a model
+loaded once. A batch is scored when it reaches the batch size or when its
+first trial has waited for the latency budget, so slow files do not hold up
+the trials which are ready.
+
+The upload folder contains a folder for each file type:
+
+- 'breath' and 'tbfvl': breath and TBFVL tables ('.txt')
+- 'spx': spx exports split by trial ('.csv')
+- 'screenshots': digitized screenshots of the five signals ('.csv'; see
+  3-digitize_screenshot.py)
+
+Trials are scored by running this script, with mbw_qc/features on the Python
+path.
+"""
+
+import argparse
+import concurrent.futures
+import os
+import time
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+import build_tfrecords
+import file_index
+import load_tables
+import preprocess
+import record_schema
+import transform
+
+model_path = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../../models/baseline_BO/final_model'
+))
+
+# folder and file extension of each signal type in an upload folder; the
+# signal type of screenshots is taken from the file name
+upload_folders = {
+    'breath': ('breath', '.txt'),
+    'tbfvl': ('tbfvl', '.txt'),
+    'spx': ('spx', '.csv'),
+    None: ('screenshots', '.csv'),
+}
+
+grade_labels = list(build_tfrecords.qc_grade_label_dict)
+
+
+def find_trials(upload_path):
+    """Link the files of an upload folder to their trials
+
+    Parameters
+    ----------
+    upload_path : str
+        Folder containing the 'breath', 'tbfvl', 'spx' and 'screenshots'
+        folders
+
+    Returns
+    -------
+    dict
+        Maps (spx_filename, trial) of every trial with an spx export to a
+        dict of signal type to path; None if the trial has no such file
+    """
+    upload_index = file_index.FileIndex()
+    for signal_type, (folder, file_ext) in upload_folders.items():
+        upload_index.update(
+            os.path.join(upload_path, folder), file_ext, signal_type
+        )
+
+    trial_keys = sorted({
+        key[:2] for key in upload_index.index if key[2] == 'spx'
+    })
+    signal_types = list(preprocess.table_types) + preprocess.screenshot_types
+
+    return {
+        key: {
+            signal_type: upload_index.get(*key, signal_type)
+            for signal_type in signal_types
+        }
+        for key in trial_keys
+    }
+
+
+def prepare_trial(key, paths):
+    """Read and preprocess the files of a trial
+
+    Must be called in a process initialized with build_tfrecords.init_worker.
+
+    Parameters
+    ----------
+    key : tuple
+        (spx_filename, trial) of the trial
+    paths : dict
+        Maps each signal type to the path of its file; see find_trials
+
+    Returns
+    -------
+    key : tuple
+        (spx_filename, trial) of the trial
+    inputs : dict
+        Maps each model input to an array; None if the trial could not be
+        preprocessed
+    error : str
+        Reason the trial could not be preprocessed; empty if it was
+    """
+    missing = [
+        signal_type for signal_type, path in paths.items() if path is None
+    ]
+    if missing:
+        return key, None, 'No file: {}'.format(', '.join(missing))
+
+    table_values = {}
+    for table_type in preprocess.table_types:
+        table_values[table_type], error = load_tables.read_table(
+            paths[table_type], table_type
+        )
+        if table_values[table_type] is None:
+            return key, None, '{} table: {}'.format(table_type, error)
+
+    try:
+        inputs = build_tfrecords.model_inputs(
+            {
+                ss_type: paths[ss_type]
+                for ss_type in preprocess.screenshot_types
+            },
+            table_values
+        )
+    except Exception as e:
+        return key, None, '{}: {}'.format(type(e).__name__, e)
+
+    return key, inputs, ''
+
+
+def micro_batches(futures, batch_size, max_latency):
+    """Group results of futures into batches as they complete
+
+    Parameters
+    ----------
+    futures : list of concurrent.futures.Future
+        Futures of prepare_trial
+    batch_size : int
+        Maximum number of results in a batch
+    max_latency : float
+        Maximum number of seconds the first result of a batch waits for the
+        batch to fill
+
+    Yields
+    ------
+    list of tuple
+        Results of prepare_trial, in the order they completed
+    """
+    pending = set(futures)
+    batch = []
+    batch_start = None
+    while pending:
+        timeout = None
+        if batch:
+            timeout = max(0, batch_start + max_latency - time.monotonic())
+        done, pending = concurrent.futures.wait(
+            pending, timeout=timeout,
+            return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        for future in done:
+            if not batch:
+                batch_start = time.monotonic()
+            batch.append(future.result())
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch and time.monotonic() - batch_start >= max_latency:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def model_input_shapes(model):
+    """Get the shape of each model input without the batch dimension
+
+    Parameters
+    ----------
+    model : keras.Model
+        Model of the project notebook
+
+    Returns
+    -------
+    dict
+        Maps each model input to its shape
+    """
+    return {
+        model_input.name.split(':')[0]: tuple(model_input.shape[1:])
+        for model_input in model.inputs
+    }
+
+
+class TrialClassifier:
+    """Saved model scoring batches of preprocessed trials
+
+    Parameters
+    ----------
+    path : str, optional
+        Path of the saved model, by default models/baseline_BO/final_model
+    """
+
+    def __init__(self, path=model_path):
+        self.model = tf.keras.models.load_model(path, compile=False)
+        # the screenshots are stored as vectors but the model has a channel
+        # dimension
+        self.input_shapes = model_input_shapes(self.model)
+
+    def stack_inputs(self, inputs_list):
+        """Stack the inputs of several trials into batches
+
+        Parameters
+        ----------
+        inputs_list : list of dict
+            Model inputs of each trial; see build_tfrecords.model_inputs
+
+        Returns
+        -------
+        dict
+            Maps each model input to a float32 array with a leading batch
+            dimension
+        """
+        return {
+            name: np.stack(
+                [inputs[name] for inputs in inputs_list]
+            ).astype(np.float32).reshape((-1,) + self.input_shapes.get(
+                name, record_schema.input_shapes[name]
+            ))
+            for name in record_schema.input_shapes
+        }
+
+    def predict(self, inputs_list):
+        """Score several trials
+
+        Parameters
+        ----------
+        inputs_list : list of dict
+            Model inputs of each trial; see build_tfrecords.model_inputs
+
+        Returns
+        -------
+        accept : numpy.ndarray
+            Probability that each trial is accepted
+        grade : numpy.ndarray
+            Array of shape (trials, 6) of the probability of each grade; see
+            grade_labels
+        """
+        trial_outcome, grade = self.model.predict_on_batch(
+            self.stack_inputs(inputs_list)
+        )
+
+        return np.asarray(trial_outcome)[:, 0], np.asarray(grade)
+
+
+def trial_scores(accept, grade, threshold=0.5):
+    """Summarize the model outputs of a trial
+
+    Parameters
+    ----------
+    accept : float
+        Probability that the trial is accepted
+    grade : numpy.ndarray
+        Probability of each grade; see grade_labels
+    threshold : float, optional
+        Probability above which a trial is accepted, by default 0.5
+
+    Returns
+    -------
+    dict
+        Accept probability, trial outcome, most likely grade and
+        (grade, probability) of each grade
+    """
+    return {
+        'accept_probability': float(accept),
+        'trial_outcome': 'Accepted' if accept >= threshold else 'Rejected',
+        'grade': grade_labels[int(np.argmax(grade))],
+        'grade_probabilities': [
+            (label, float(probability))
+            for label, probability in zip(grade_labels, grade)
+        ],
+    }
+
+
+def score_trials(
+    trials, classifier, transform_dir=transform.transform_dir, workers=None,
+    batch_size=32, max_latency=0.5, threshold=0.5
+):
+    """Preprocess trials in parallel and score them in batches
+
+    Parameters
+    ----------
+    trials : dict
+        Maps (spx_filename, trial) to the paths of its files; see find_trials
+    classifier : TrialClassifier
+        Loaded model
+    transform_dir : str, optional
+        Folder containing the transforms of transform.py, by default
+        data/intermediary/combine_data_type
+    workers : int, optional
+        Number of worker processes, by default None (number of CPUs)
+    batch_size : int, optional
+        Maximum number of trials scored together, by default 32
+    max_latency : float, optional
+        Maximum number of seconds a preprocessed trial waits for its batch to
+        fill, by default 0.5
+    threshold : float, optional
+        Probability above which a trial is accepted, by default 0.5
+
+    Returns
+    -------
+    pandas.dataframe
+        Accept probability, trial outcome and grade probabilities of each
+        trial, or the reason it could not be scored
+    """
+    rows = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=build_tfrecords.init_worker,
+        initargs=(transform_dir,)
+    ) as executor:
+        futures = [
+            executor.submit(prepare_trial, key, paths)
+            for key, paths in trials.items()
+        ]
+        for batch in micro_batches(futures, batch_size, max_latency):
+            ready = [result for result in batch if result[1] is not None]
+            for key, _, error in batch:
+                if error:
+                    rows.append({
+                        'spx_filename': key[0], 'trial': key[1],
+                        'error': error
+                    })
+            if not ready:
+                continue
+
+            accept, grade = classifier.predict(
+                [inputs for _, inputs, _ in ready]
+            )
+            for (key, _, _), trial_accept, trial_grade in zip(
+                ready, accept, grade
+            ):
+                row = {'spx_filename': key[0], 'trial': key[1]}
+                row.update(trial_scores(trial_accept, trial_grade, threshold))
+                for label, probability in row.pop('grade_probabilities'):
+                    row['grade_{}'.format(label)] = probability
+                row['error'] = ''
+                rows.append(row)
+
+    columns = (
+        ['spx_filename', 'trial', 'accept_probability', 'trial_outcome',
+         'grade']
+        + ['grade_{}'.format(label) for label in grade_labels]
+        + ['error']
+    )
+    return pd.DataFrame(rows, columns=columns).sort_values(
+        ['spx_filename', 'trial']
+    ).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Score the trials of an upload folder'
+    )
+    parser.add_argument(
+        'upload_path',
+        help="Folder containing the 'breath', 'tbfvl', 'spx' and "
+        "'screenshots' folders"
+    )
+    parser.add_argument(
+        '--output', default=None,
+        help="Path of the csv file of scores, by default 'scores.csv' in the "
+        "upload folder"
+    )
+    parser.add_argument(
+        '--model', default=model_path, help='Path of the saved model'
+    )
+    parser.add_argument(
+        '--transform-dir', default=transform.transform_dir,
+        help='Folder containing the transforms of transform.py'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count(),
+        help='Number of worker processes, by default the number of CPUs'
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=32,
+        help='Maximum number of trials scored together'
+    )
+    parser.add_argument(
+        '--max-latency', type=float, default=0.5,
+        help='Maximum number of seconds a trial waits for its batch to fill'
+    )
+    parser.add_argument(
+        '--threshold', type=float, default=0.5,
+        help='Probability above which a trial is accepted'
+    )
+    args = parser.parse_args()
+
+    trials = find_trials(args.upload_path)
+    classifier = TrialClassifier(args.model)
+
+    start = time.perf_counter()
+    scores = score_trials(
+        trials, classifier, args.transform_dir, args.workers,
+        args.batch_size, args.max_latency, args.threshold
+    )
+    elapsed = time.perf_counter() - start
+
+    for _, row in scores.loc[scores['error'] != ''].iterrows():
+        print('Trial issue: {} trial {} ({})'.format(
+            row['spx_filename'], row['trial'], row['error']
+        ))
+    scores.to_csv(
+        args.output or os.path.join(args.upload_path, 'scores.csv'),
+        index=False
+    )
+    print('{} of {} trials scored in {:.1f} seconds'.format(
+        (scores['error'] == '').sum(), len(scores), elapsed
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""Quantize the saved model to 8 bit integers
+
+Post-training quantization of the TFLite model of a single trial (see
+export_model.py), calibrated on a random sample of the train split. The
+model is split where the five screenshot heads are concatenated:
+
+- 'encoder': the Conv1D and pooling layers of the screenshots, with the
+  weights and activations quantized to int8 (full integer quantization);
+  the ranges of the activations are calibrated on the train sample
+- 'tail': the masked LSTM and dense layers, with the weights quantized to
+  int8 and float activations (dynamic range quantization). The TFLite
+  calibrator cannot run the loops of the masked LSTM layers, so these layers
+  are not fully quantized
+
+The inputs and outputs stay float32, so the quantized model is called like
+the float model. It is compared with the float Keras and TFLite models on the
+test split: the accuracy and AUC of 'trial_outcome' and 'grade', the latency
+of a single trial, the throughput and the size of the model.
+
+The model is quantized and compared by running this script, with
+mbw_qc/features on the Python path.
+"""
+
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import scipy.stats
+import tensorflow as tf
+import dataset
+import export_model
+import predict_model
+import preprocess
+import record_schema
+
+screenshot_inputs = [
+    '{}_input'.format(ss_type) for ss_type in preprocess.screenshot_types
+]
+table_inputs = list(record_schema.table_inputs)
+
+# name of the input of the tail with the output of the encoder
+features_name = 'screenshot_features'
+
+
+def split_model(model):
+    """Split the model into the screenshot encoder and the rest of the model
+
+    Parameters
+    ----------
+    model : keras.Model
+        Model of the project notebook
+
+    Returns
+    -------
+    encoder : keras.Model
+        Model of the screenshot inputs returning the concatenated features of
+        the screenshot heads
+    tail : keras.Model
+        Model of the table inputs and the screenshot features returning the
+        'trial_outcome' and 'grade' probabilities
+    """
+    inputs = {
+        model_input.name.split(':')[0]: model_input
+        for model_input in model.inputs
+    }
+    input_ids = {id(model_input) for model_input in model.inputs}
+    # the only masking layer which does not mask an input masks the
+    # screenshot features
+    features = [
+        layer.input for layer in model.layers
+        if isinstance(layer, tf.keras.layers.Masking)
+        and id(layer.input) not in input_ids
+    ]
+    if len(features) != 1:
+        raise ValueError(
+            'Expected a single masking layer of the screenshot features, '
+            'found {}'.format(len(features))
+        )
+
+    encoder = tf.keras.Model(
+        [inputs[name] for name in screenshot_inputs], features[0]
+    )
+    tail = tf.keras.Model(
+        [inputs[name] for name in table_inputs] + features, model.outputs
+    )
+
+    return encoder, tail
+
+
+def single_trial_function(model, input_names):
+    """Wrap a model in a function of a single trial
+
+    Parameters
+    ----------
+    model : keras.Model
+        Model to wrap
+    input_names : list of str
+        Name of each input, in the order of model.inputs
+
+    Returns
+    -------
+    tf.types.experimental.ConcreteFunction
+        Function of the inputs in the order of input_names
+    """
+    input_signature = [
+        tf.TensorSpec((1,) + tuple(model_input.shape[1:]), tf.float32, name)
+        for name, model_input in zip(input_names, model.inputs)
+    ]
+
+    @tf.function
+    def serve(*inputs):
+        return model(list(inputs), training=False)
+
+    return serve.get_concrete_function(*input_signature)
+
+
+def representative_dataset(input_shapes, manifest, n_samples=200, seed=12345):
+    """Create the calibration sample of the screenshots of the train split
+
+    Parameters
+    ----------
+    input_shapes : dict
+        Shape of each model input; see predict_model.model_input_shapes
+    manifest : str
+        Path of the manifest of build_tfrecords.py
+    n_samples : int, optional
+        Number of trials in the sample, by default 200
+    seed : int, optional
+        Seed of the sample, by default 12345
+
+    Returns
+    -------
+    function
+        Generator of the screenshot inputs of a single trial, as a list in
+        the order of screenshot_inputs
+    """
+    def generate():
+        train_dataset, _ = dataset.split_dataset(
+            'train', 1, manifest, training=True, seed=seed
+        )
+        for input_dict, _ in train_dataset.take(n_samples):
+            yield [
+                tf.reshape(input_dict[name], (1,) + input_shapes[name])
+                for name in screenshot_inputs
+            ]
+
+    return generate
+
+
+def export_int8(model, path, manifest, n_samples=200, seed=12345):
+    """Export the quantized encoder and tail as TFLite models
+
+    Parameters
+    ----------
+    model : keras.Model
+        Model of the project notebook
+    path : str
+        Folder to save 'encoder_int8.tflite' and 'tail_int8.tflite'
+    manifest : str
+        Path of the manifest of build_tfrecords.py
+    n_samples : int, optional
+        Number of train trials used to calibrate, by default 200
+    seed : int, optional
+        Seed of the calibration sample, by default 12345
+    """
+    encoder, tail = split_model(model)
+
+    converter = export_model.tflite_converter(
+        single_trial_function(encoder, screenshot_inputs)
+    )
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset(
+        predict_model.model_input_shapes(model), manifest, n_samples, seed
+    )
+    converter.target_spec.supported_ops = [
+        tf.lite.OpsSet.TFLITE_BUILTINS_INT8
+    ]
+    encoder_model = converter.convert()
+
+    converter = export_model.tflite_converter(
+        single_trial_function(tail, table_inputs + [features_name])
+    )
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    tail_model = converter.convert()
+
+    for name, tflite_model in [
+        ('encoder', encoder_model), ('tail', tail_model)
+    ]:
+        with open(
+            os.path.join(path, '{}_int8.tflite'.format(name)), 'wb'
+        ) as tflite_file:
+            tflite_file.write(tflite_model)
+
+
+class QuantizedRunner:
+    """Run the quantized encoder and tail one trial at a time
+
+    Parameters
+    ----------
+    path : str
+        Folder containing 'encoder_int8.tflite' and 'tail_int8.tflite'
+    threads : int, optional
+        Number of threads of the interpreters, by default None (TFLite
+        default)
+    """
+
+    def __init__(self, path, threads=None):
+        self.interpreters = {}
+        self.inputs = {}
+        for name in ['encoder', 'tail']:
+            interpreter = tf.lite.Interpreter(
+                model_path=os.path.join(path, '{}_int8.tflite'.format(name)),
+                num_threads=threads
+            )
+            interpreter.allocate_tensors()
+            self.interpreters[name] = interpreter
+            self.inputs[name] = {
+                detail['name'].split(':')[0]: detail['index']
+                for detail in interpreter.get_input_details()
+            }
+        self.features = (
+            self.interpreters['encoder'].get_output_details()[0]['index']
+        )
+        # outputs are matched to their names by their shape
+        self.outputs = {
+            name: next(
+                detail['index']
+                for detail in self.interpreters['tail'].get_output_details()
+                if detail['shape'][-1] == label_len
+            )
+            for name, label_len in record_schema.label_lens.items()
+        }
+
+    def __call__(self, inputs):
+        """Score a batch of trials; see export_model.SavedModelRunner"""
+        encoder = self.interpreters['encoder']
+        tail = self.interpreters['tail']
+        n_trials = len(next(iter(inputs.values())))
+        outputs = {name: [] for name in export_model.output_names}
+        for i in range(n_trials):
+            for name, index in self.inputs['encoder'].items():
+                encoder.set_tensor(index, inputs[name][i:(i + 1)])
+            encoder.invoke()
+            tail.set_tensor(
+                self.inputs['tail'][features_name],
+                encoder.get_tensor(self.features)
+            )
+            for name in table_inputs:
+                tail.set_tensor(
+                    self.inputs['tail'][name], inputs[name][i:(i + 1)]
+                )
+            tail.invoke()
+            for name, index in self.outputs.items():
+                outputs[name].append(tail.get_tensor(index))
+
+        return {
+            name: np.concatenate(values) for name, values in outputs.items()
+        }
+
+
+def auc(labels, scores):
+    """Area under the ROC curve (Mann-Whitney U statistic)
+
+    Parameters
+    ----------
+    labels : numpy.ndarray
+        True for the positive trials
+    scores : numpy.ndarray
+        Score of each trial
+
+    Returns
+    -------
+    float
+        AUC; NaN if there are no positive or no negative trials
+    """
+    labels = np.asarray(labels, dtype=bool)
+    n_pos = labels.sum()
+    n_neg = len(labels) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return np.nan
+    ranks = scipy.stats.rankdata(scores)
+
+    return (ranks[labels].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+
+
+def score_metrics(outputs, labels, threshold=0.5):
+    """Accuracy and AUC of the trial outcome and grade
+
+    Parameters
+    ----------
+    outputs : dict
+        Maps 'trial_outcome' and 'grade' to the probabilities of each trial
+    labels : dict
+        Maps 'trial_outcome' and 'grade' to the labels of each trial
+    threshold : float, optional
+        Probability above which a trial is accepted, by default 0.5
+
+    Returns
+    -------
+    dict
+        Accuracy and AUC of the trial outcome, and accuracy and mean one vs
+        rest AUC of the grade (grades without positive or negative trials
+        are ignored)
+    """
+    accepted = labels['trial_outcome'][:, 0] == 1
+    grade = np.argmax(labels['grade'], axis=1)
+    grade_aucs = np.array([
+        auc(grade == i, outputs['grade'][:, i])
+        for i in range(labels['grade'].shape[1])
+    ])
+
+    return {
+        'trial_outcome_accuracy': np.mean(
+            (outputs['trial_outcome'][:, 0] >= threshold) == accepted
+        ),
+        'trial_outcome_auc': auc(accepted, outputs['trial_outcome'][:, 0]),
+        'grade_accuracy': np.mean(
+            np.argmax(outputs['grade'], axis=1) == grade
+        ),
+        'grade_auc': (
+            np.nanmean(grade_aucs) if (~np.isnan(grade_aucs)).any()
+            else np.nan
+        ),
+    }
+
+
+def compare(runners, batches, threshold=0.5):
+    """Score the test split with every model
+
+    Parameters
+    ----------
+    runners : dict
+        Maps the name of each model to its runner; see
+        export_model.load_runners
+    batches : iterable of tuple
+        (inputs, labels) of each batch; see export_model.test_batches
+    threshold : float, optional
+        Probability above which a trial is accepted, by default 0.5
+
+    Returns
+    -------
+    pandas.dataframe
+        Metrics of each model; see score_metrics
+    """
+    outputs = {name: [] for name in runners}
+    labels = []
+    for inputs, batch_labels in batches:
+        for name, runner in runners.items():
+            outputs[name].append(runner(inputs))
+        labels.append(batch_labels)
+
+    labels = {
+        name: np.concatenate([batch[name] for batch in labels])
+        for name in export_model.output_names
+    }
+    rows = []
+    for name, model_outputs in outputs.items():
+        model_outputs = {
+            output: np.concatenate([batch[output] for batch in model_outputs])
+            for output in export_model.output_names
+        }
+        row = {'model': name}
+        row.update(score_metrics(model_outputs, labels, threshold))
+        rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Quantize the model to int8 and compare it on the test '
+        'split'
+    )
+    parser.add_argument(
+        '--model', default=predict_model.model_path,
+        help='Path of the saved model'
+    )
+    parser.add_argument(
+        '--output-dir', default=export_model.export_dir,
+        help='Folder to save the quantized model and the report'
+    )
+    parser.add_argument(
+        '--manifest', default=dataset.build_tfrecords.manifest_path,
+        help='Path of the manifest of build_tfrecords.py'
+    )
+    parser.add_argument(
+        '--calibration-samples', type=int, default=200,
+        help='Number of train trials used to calibrate the activations'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=12345,
+        help='Seed of the calibration sample'
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=32,
+        help='Number of trials in each batch'
+    )
+    parser.add_argument(
+        '--runs', type=int, default=20,
+        help='Number of timed calls of each benchmark'
+    )
+    parser.add_argument(
+        '--threads', type=int, default=None,
+        help='Number of threads of the TFLite interpreters'
+    )
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(args.model, compile=False)
+    os.makedirs(args.output_dir, exist_ok=True)
+    # the float TFLite model is the baseline of the size and speed
+    tflite_path = os.path.join(args.output_dir, 'model.tflite')
+    if not os.path.exists(tflite_path):
+        export_model.export_tflite(model, tflite_path)
+    export_int8(
+        model, args.output_dir, args.manifest, args.calibration_samples,
+        args.seed
+    )
+
+    runners = {
+        'keras': export_model.KerasRunner(model),
+        'tflite': export_model.TFLiteRunner(tflite_path, args.threads),
+        'int8': QuantizedRunner(args.output_dir, args.threads),
+    }
+    input_shapes = predict_model.model_input_shapes(model)
+
+    metrics = compare(runners, export_model.test_batches(
+        input_shapes, args.manifest, args.batch_size
+    ))
+    inputs, _ = next(export_model.test_batches(
+        input_shapes, args.manifest, args.batch_size
+    ))
+    speed = export_model.benchmark(
+        runners, inputs, args.batch_size, args.runs
+    ).rename(columns={'variant': 'model'})
+
+    report = metrics.merge(speed, on='model')
+    # the Keras model is measured by its float32 weights
+    sizes = {
+        'keras': model.count_params() * 4,
+        'tflite': os.path.getsize(tflite_path),
+        'int8': sum(
+            os.path.getsize(os.path.join(
+                args.output_dir, '{}_int8.tflite'.format(name)
+            ))
+            for name in ['encoder', 'tail']
+        ),
+    }
+    report['size_mb'] = [sizes[name] / 1e6 for name in report['model']]
+    keras_row = report.loc[report['model'] == 'keras'].iloc[0]
+    report['speedup'] = keras_row['latency_p50'] / report['latency_p50']
+    for col in [
+        'trial_outcome_accuracy', 'trial_outcome_auc', 'grade_accuracy',
+        'grade_auc'
+    ]:
+        report['{}_change'.format(col)] = report[col] - keras_row[col]
+    report.to_csv(
+        os.path.join(args.output_dir, 'quantization_report.csv'), index=False
+    )
+    print(report.set_index('model').T.to_string())
+
+
+if __name__ == "__main__":
+    main()
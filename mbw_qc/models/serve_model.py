@@ -0,0 +1,396 @@
+"""Score single MBW trials over HTTP
+
+A local scoring service around the saved model (see predict_model.py). A
+trial is posted to '/predict' either as its raw files (a multipart form with
+a file for each signal type: 'breath', 'tbfvl', 'spx', 'o2', 'co2', 'n2',
+'flow' and 'volume') or as preprocessed model inputs (a json object with an
+'inputs' object of arrays; see record_schema.input_shapes). Requests are
+queued and scored together in micro-batches, which are run when they reach
+the batch size or when the first request has waited for the maximum wait, by
+a model which is loaded and warmed up once. A trial which is not scored
+within the timeout is dropped from the queue and answered with a 503; a model
+error is answered with a 500, both with a json 'error'.
+
+'/metrics' exposes Prometheus metrics: the request latency of every endpoint
+(prometheus-flask-exporter), the number of trials scored, the batch sizes,
+and the p50/p99 latency and throughput of the recent requests.
+
+The service is started by running this script, with mbw_qc/features on the
+Python path.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import os
+import queue
+import tempfile
+import threading
+import time
+import flask
+import numpy as np
+import prometheus_client
+import prometheus_flask_exporter
+import waitress
+import build_tfrecords
+import predict_model
+import preprocess
+import record_schema
+import transform
+
+trials_scored = prometheus_client.Counter(
+    'mbw_qc_trials_scored', 'Number of trials scored'
+)
+batch_sizes = prometheus_client.Histogram(
+    'mbw_qc_batch_size', 'Number of trials in each micro-batch',
+    buckets=[1, 2, 4, 8, 16, 32, 64, 128]
+)
+scoring_latency = prometheus_client.Histogram(
+    'mbw_qc_scoring_latency_seconds',
+    'Seconds from queueing a trial to its scores'
+)
+recent_latency = prometheus_client.Gauge(
+    'mbw_qc_recent_latency_seconds',
+    'Latency quantile of the recent trials', ['quantile']
+)
+recent_throughput = prometheus_client.Gauge(
+    'mbw_qc_recent_throughput', 'Trials scored per second recently'
+)
+
+
+class LatencyWindow:
+    """Latency of the trials scored in the last seconds
+
+    Parameters
+    ----------
+    seconds : float, optional
+        Length of the window, by default 60
+    """
+
+    def __init__(self, seconds=60):
+        self.seconds = seconds
+        self.scored = collections.deque()
+        self.lock = threading.Lock()
+
+    def add(self, latency):
+        """Add the latency of a scored trial
+
+        Parameters
+        ----------
+        latency : float
+            Seconds from queueing the trial to its scores
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.scored.append((now, latency))
+            while self.scored[0][0] < now - self.seconds:
+                self.scored.popleft()
+
+    def latencies(self):
+        """Get the latencies inside the window
+
+        Returns
+        -------
+        numpy.ndarray
+            Latency of each trial
+        """
+        now = time.monotonic()
+        with self.lock:
+            return np.array([
+                latency for scored_time, latency in self.scored
+                if scored_time >= now - self.seconds
+            ])
+
+    def quantile(self, q):
+        """Get a latency quantile; NaN if no trial was scored
+
+        Parameters
+        ----------
+        q : float
+            Quantile between 0 and 1
+        """
+        latencies = self.latencies()
+        return float(np.quantile(latencies, q)) if len(latencies) else np.nan
+
+    def throughput(self):
+        """Get the number of trials scored per second"""
+        return len(self.latencies()) / self.seconds
+
+
+class MicroBatcher:
+    """Queue of trials scored together in micro-batches by a thread
+
+    Parameters
+    ----------
+    classifier : predict_model.TrialClassifier
+        Loaded model
+    batch_size : int, optional
+        Maximum number of trials scored together, by default 32
+    max_wait : float, optional
+        Maximum number of seconds the first trial of a batch waits for the
+        batch to fill, by default 0.01
+    """
+
+    def __init__(self, classifier, batch_size=32, max_wait=0.01):
+        self.classifier = classifier
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.window = LatencyWindow()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, inputs):
+        """Queue a trial
+
+        Parameters
+        ----------
+        inputs : dict
+            Model inputs of the trial; see build_tfrecords.model_inputs
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Result of (accept probability, grade probabilities)
+        """
+        future = concurrent.futures.Future()
+        self.queue.put((time.monotonic(), inputs, future))
+
+        return future
+
+    def next_batch(self):
+        """Wait for the next micro-batch
+
+        Returns
+        -------
+        list of tuple
+            (queue time, inputs, future) of each trial
+        """
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    batch.append(self.queue.get(timeout=timeout))
+                else:
+                    # take trials which are already queued
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def run(self):
+        """Score micro-batches until the process ends"""
+        while True:
+            # trials whose request timed out are cancelled and not scored
+            batch = [
+                trial for trial in self.next_batch()
+                if trial[2].set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            try:
+                accept, grade = self.classifier.predict(
+                    [inputs for _, inputs, _ in batch]
+                )
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            batch_sizes.observe(len(batch))
+            trials_scored.inc(len(batch))
+            for (queue_time, _, future), trial_accept, trial_grade in zip(
+                batch, accept, grade
+            ):
+                latency = time.monotonic() - queue_time
+                scoring_latency.observe(latency)
+                self.window.add(latency)
+                future.set_result((trial_accept, trial_grade))
+
+
+def parse_inputs(inputs_json):
+    """Check the preprocessed model inputs of a request
+
+    Parameters
+    ----------
+    inputs_json : dict
+        Maps each model input to a nested list of numbers
+
+    Returns
+    -------
+    inputs : dict
+        Maps each model input to a float32 array of its shape; None if the
+        inputs are invalid
+    error : str
+        Reason the inputs are invalid; empty if they are valid
+    """
+    inputs = {}
+    for name, shape in record_schema.input_shapes.items():
+        if name not in inputs_json:
+            return None, 'Missing input: {}'.format(name)
+        try:
+            values = np.asarray(inputs_json[name], dtype=np.float32)
+        except (TypeError, ValueError) as e:
+            return None, '{}: {}'.format(name, e)
+        # screenshots are accepted with or without the channel dimension
+        if values.size != np.prod(shape):
+            return None, '{}: expected shape {}, got {}'.format(
+                name, shape, values.shape
+            )
+        inputs[name] = values.reshape(shape)
+
+    return inputs, ''
+
+
+def read_files(files):
+    """Preprocess the raw files of a request
+
+    Parameters
+    ----------
+    files : werkzeug.datastructures.MultiDict
+        Uploaded file of each signal type
+
+    Returns
+    -------
+    inputs : dict
+        Maps each model input to an array; None if the files could not be
+        preprocessed
+    error : str
+        Reason the files could not be preprocessed; empty if they were
+    """
+    signal_types = list(preprocess.table_types) + preprocess.screenshot_types
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = {}
+        for signal_type in signal_types:
+            paths[signal_type] = None
+            if signal_type in files:
+                paths[signal_type] = os.path.join(temp_dir, signal_type)
+                files[signal_type].save(paths[signal_type])
+        _, inputs, error = predict_model.prepare_trial(None, paths)
+
+    return inputs, error
+
+
+def create_app(batcher, threshold=0.5, timeout=30):
+    """Create the scoring service
+
+    Parameters
+    ----------
+    batcher : MicroBatcher
+        Queue of the model
+    threshold : float, optional
+        Probability above which a trial is accepted, by default 0.5
+    timeout : float, optional
+        Maximum number of seconds to wait for the scores, by default 30
+
+    Returns
+    -------
+    flask.Flask
+        Application serving '/predict', '/health' and '/metrics'
+    """
+    app = flask.Flask(__name__)
+    prometheus_flask_exporter.PrometheusMetrics(app)
+
+    for q in [0.5, 0.99]:
+        recent_latency.labels(quantile=str(q)).set_function(
+            lambda q=q: batcher.window.quantile(q)
+        )
+    recent_throughput.set_function(batcher.window.throughput)
+
+    @app.route('/health')
+    def health():
+        return flask.jsonify({'status': 'ok'})
+
+    @app.route('/predict', methods=['POST'])
+    def predict():
+        if flask.request.files:
+            inputs, error = read_files(flask.request.files)
+        else:
+            request_json = flask.request.get_json(silent=True) or {}
+            inputs, error = parse_inputs(request_json.get('inputs', {}))
+        if inputs is None:
+            return flask.jsonify({'error': error}), 400
+
+        future = batcher.submit(inputs)
+        try:
+            accept, grade = future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            return flask.jsonify({
+                'error': 'Trial was not scored within {} seconds'.format(
+                    timeout
+                )
+            }), 503
+        except Exception as e:
+            return flask.jsonify({
+                'error': 'Model error: {}: {}'.format(type(e).__name__, e)
+            }), 500
+        scores = predict_model.trial_scores(accept, grade, threshold)
+        scores['grade_probabilities'] = dict(scores['grade_probabilities'])
+
+        return flask.jsonify(scores)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve the saved model over HTTP'
+    )
+    parser.add_argument(
+        '--model', default=predict_model.model_path,
+        help='Path of the saved model'
+    )
+    parser.add_argument(
+        '--transform-dir', default=transform.transform_dir,
+        help='Folder containing the transforms of transform.py'
+    )
+    parser.add_argument(
+        '--host', default='127.0.0.1', help='Host to listen on'
+    )
+    parser.add_argument(
+        '--port', type=int, default=8080, help='Port to listen on'
+    )
+    parser.add_argument(
+        '--threads', type=int, default=16,
+        help='Number of request threads; requests waiting for a batch each '
+        'use a thread'
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=32,
+        help='Maximum number of trials scored together'
+    )
+    parser.add_argument(
+        '--max-wait', type=float, default=0.01,
+        help='Maximum number of seconds a trial waits for its batch to fill'
+    )
+    parser.add_argument(
+        '--threshold', type=float, default=0.5,
+        help='Probability above which a trial is accepted'
+    )
+    args = parser.parse_args()
+
+    # transforms of the raw files
+    build_tfrecords.init_worker(args.transform_dir)
+    classifier = predict_model.TrialClassifier(args.model)
+    # the first calls trace the model functions, so they are made before
+    # serving; batches of other sizes reuse a relaxed trace
+    empty_trial = {
+        name: np.zeros(shape, dtype=np.float32)
+        for name, shape in record_schema.input_shapes.items()
+    }
+    for batch_size in sorted({1, 2, args.batch_size}):
+        classifier.predict([empty_trial] * batch_size)
+
+    batcher = MicroBatcher(classifier, args.batch_size, args.max_wait)
+    waitress.serve(
+        create_app(batcher, args.threshold), host=args.host, port=args.port,
+        threads=args.threads
+    )
+
+
+if __name__ == "__main__":
+    main()
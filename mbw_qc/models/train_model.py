@@ -0,0 +1,696 @@
+"""Train the model with several worker processes and mixed precision
+
+The project notebook trains the network of model_builder with model.fit in a
+single process (see 'Section 3'). Here the same network, hyperparameters,
+callbacks and number of epochs are trained outside the notebook with
+tf.distribute.MultiWorkerMirroredStrategy: this script starts worker
+processes on the local machine, each training a replica of the model on its
+part of every batch, with the gradients averaged across the workers. Each
+worker can be pinned to its own block of CPUs (e.g. one worker per socket)
+and the intra-op and inter-op thread pools of each worker are set before
+TensorFlow starts. The network can optionally run in bfloat16 with float32
+weights (mixed precision), on CPUs with bfloat16 instructions.
+
+The batch size is the number of records of each worker, so a step of N
+workers trains on N times the notebook batch; by default an epoch is one pass
+through the train split.
+
+The training throughput (examples/sec after the warm-up steps) of every
+configuration is reported. Several values of --workers, --precision,
+--intra-threads and --inter-threads are compared with --benchmark-steps,
+which only times a number of training steps of each configuration without
+validating or saving the model.
+
+The trained model is saved to models/baseline_BO/retrained by default; an
+existing model, such as the shipped final_model, is only replaced with
+--overwrite.
+
+The model is trained by running this script, with mbw_qc/features on the
+Python path.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+import build_tfrecords
+import dataset
+import model_builder
+import predict_model
+
+# saved next to the shipped model, so it is never overwritten by default
+retrained_path = os.path.join(
+    os.path.dirname(predict_model.model_path), 'retrained'
+)
+checkpoint_path = os.path.join(
+    os.path.dirname(predict_model.model_path), 'checkpoints'
+)
+tuner_path = os.path.join(os.path.dirname(predict_model.model_path), 'tuner')
+report_path = os.path.join(
+    os.path.dirname(predict_model.model_path), 'training_report.csv'
+)
+
+# keras dtype policy of each precision
+precision_policies = {
+    'float32': 'float32',
+    'bfloat16': 'mixed_bfloat16',
+}
+
+
+def available_cpus():
+    """Get the CPUs this process can run on
+
+    Returns
+    -------
+    list of int
+        CPU numbers, in order
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+
+    return list(range(os.cpu_count()))
+
+
+def cpu_blocks(workers):
+    """Split the available CPUs into a contiguous block for each worker
+
+    CPUs of the same socket usually have consecutive numbers, so with one
+    worker per socket each worker keeps its memory local.
+
+    Parameters
+    ----------
+    workers : int
+        Number of worker processes
+
+    Returns
+    -------
+    list of list of int
+        CPU numbers of each worker
+    """
+    return [
+        list(block)
+        for block in np.array_split(available_cpus(), workers)
+        if len(block)
+    ]
+
+
+def thread_counts(workers, intra_threads=0, inter_threads=0):
+    """Get the thread pool sizes of each worker
+
+    Parameters
+    ----------
+    workers : int
+        Number of worker processes
+    intra_threads : int, optional
+        Threads used within an op; the CPUs of each worker if 0, by default 0
+    inter_threads : int, optional
+        Ops run at the same time; 2 if 0, by default 0
+
+    Returns
+    -------
+    tuple of int
+        (intra-op threads, inter-op threads)
+    """
+    if not intra_threads:
+        intra_threads = max(1, len(available_cpus()) // workers)
+    if not inter_threads:
+        # the convolutions and LSTM layers use the intra-op threads; more
+        # inter-op threads than this oversubscribes the CPUs
+        inter_threads = 2
+
+    return intra_threads, inter_threads
+
+
+def configure_threads(intra_threads, inter_threads):
+    """Set the thread pools; must be called before TensorFlow runs an op
+
+    Parameters
+    ----------
+    intra_threads : int
+        Threads used within an op
+    inter_threads : int
+        Ops run at the same time
+    """
+    tf.config.threading.set_intra_op_parallelism_threads(intra_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_threads)
+
+
+def set_precision(precision):
+    """Set the dtype policy of the layers built afterwards
+
+    Parameters
+    ----------
+    precision : str
+        'float32' or 'bfloat16' (mixed precision)
+    """
+    tf.keras.mixed_precision.set_global_policy(precision_policies[precision])
+
+
+def load_hyperparameters(tuner_dir=None):
+    """Get the hyperparameters of the final model
+
+    Parameters
+    ----------
+    tuner_dir : str, optional
+        Folder of the tuner of the project notebook to reload the best
+        hyperparameters from; model_builder.best_hyperparameters if None, by
+        default None
+
+    Returns
+    -------
+    keras_tuner.HyperParameters
+        Hyperparameters of model_builder
+    """
+    import keras_tuner as kt
+
+    if tuner_dir is not None:
+        directory, project_name = os.path.split(tuner_dir.rstrip('/\\'))
+        tuner = kt.BayesianOptimization(
+            model_builder.model_builder,
+            objective=kt.Objective('val_trial_outcome_acc', direction='max'),
+            max_trials=7,
+            executions_per_trial=1,
+            directory=directory,
+            project_name=project_name,
+            overwrite=False
+        )
+        return tuner.get_best_hyperparameters(num_trials=1)[0]
+
+    hp = kt.HyperParameters()
+    for name, value in model_builder.best_hyperparameters.items():
+        hp.Fixed(name, value)
+
+    return hp
+
+
+def cluster_config(ports, task_index):
+    """Get the TF_CONFIG of a local worker
+
+    Parameters
+    ----------
+    ports : list of int
+        Port of each worker on localhost
+    task_index : int
+        Index of the worker; worker 0 is the chief
+
+    Returns
+    -------
+    str
+        TF_CONFIG json
+    """
+    return json.dumps({
+        'cluster': {
+            'worker': ['localhost:{}'.format(port) for port in ports]
+        },
+        'task': {'type': 'worker', 'index': task_index},
+    })
+
+
+def free_ports(n_ports):
+    """Find unused ports on localhost
+
+    Parameters
+    ----------
+    n_ports : int
+        Number of ports
+
+    Returns
+    -------
+    list of int
+        Port numbers
+    """
+    sockets = []
+    for _ in range(n_ports):
+        sock = socket.socket()
+        sock.bind(('localhost', 0))
+        sockets.append(sock)
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+
+    return ports
+
+
+class ThroughputCallback(tf.keras.callbacks.Callback):
+    """Time the training steps after the warm-up steps
+
+    Only the steps are timed, so validation and checkpoints at the end of an
+    epoch are not counted.
+
+    Parameters
+    ----------
+    global_batch_size : int
+        Number of records in a step, across all workers
+    warmup_steps : int, optional
+        Number of untimed steps at the start of training, which trace the
+        training function, by default 2
+    """
+
+    def __init__(self, global_batch_size, warmup_steps=2):
+        super().__init__()
+        self.global_batch_size = global_batch_size
+        self.warmup_steps = warmup_steps
+        self.steps = 0
+        self.timed_steps = 0
+        self.seconds = 0.0
+        self.step_start = None
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self.step_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.steps += 1
+        if self.steps > self.warmup_steps:
+            self.timed_steps += 1
+            self.seconds += time.perf_counter() - self.step_start
+
+    def examples_per_second(self):
+        """Get the number of records trained on per second
+
+        Returns
+        -------
+        float
+            Examples/sec of the timed steps; NaN if no step was timed
+        """
+        if not self.timed_steps:
+            return np.nan
+
+        return self.timed_steps * self.global_batch_size / self.seconds
+
+
+def model_dataset(split_group, batch_size, input_shapes, workers, **kwargs):
+    """Create the dataset of a split shaped for the model
+
+    Parameters
+    ----------
+    split_group : str
+        'train', 'validate' or 'test'
+    batch_size : int
+        Number of records in each batch, across all workers
+    input_shapes : dict
+        Maps each model input to its shape; see
+        predict_model.model_input_shapes
+    workers : int
+        Number of worker processes
+    **kwargs
+        Passed to dataset.split_dataset
+
+    Returns
+    -------
+    split_data : tf.data.Dataset
+        Batches of (input_dict, output_dict)
+    steps : int
+        Number of batches in one pass through the split
+    """
+    split_data, steps = dataset.split_dataset(
+        split_group, batch_size, **kwargs
+    )
+    # the screenshots are stored as vectors but the model has a channel
+    # dimension
+    split_data = split_data.map(
+        lambda inputs, outputs: (
+            {
+                name: tf.reshape(values, (-1,) + input_shapes[name])
+                for name, values in inputs.items()
+            },
+            outputs
+        ),
+        num_parallel_calls=tf.data.AUTOTUNE
+    )
+
+    # each worker reads its own files if there is a file for every worker,
+    # or else every worker reads all the files and keeps its own records
+    manifest = build_tfrecords.load_manifest(
+        kwargs.get('path', build_tfrecords.manifest_path)
+    )
+    n_shards = len(manifest['splits'][split_group]['shards'])
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = (
+        tf.data.experimental.AutoShardPolicy.FILE if n_shards >= workers
+        else tf.data.experimental.AutoShardPolicy.DATA
+    )
+
+    return split_data.with_options(options), steps
+
+
+def train_worker(args):
+    """Train the model in a worker process
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Arguments of the script; the configuration of the worker is the first
+        value of --workers, --precision, --intra-threads and --inter-threads
+
+    Returns
+    -------
+    dict
+        Configuration and throughput of the training
+    """
+    workers = args.workers[0]
+    intra_threads, inter_threads = args.intra_threads[0], args.inter_threads[0]
+    configure_threads(intra_threads, inter_threads)
+    set_precision(args.precision[0])
+
+    if workers > 1:
+        # the cluster is read from TF_CONFIG
+        strategy = tf.distribute.MultiWorkerMirroredStrategy(
+            communication_options=tf.distribute.experimental
+            .CommunicationOptions(
+                implementation=tf.distribute.experimental
+                .CommunicationImplementation.RING
+            )
+        )
+    else:
+        strategy = tf.distribute.get_strategy()
+    is_chief = args.task_index == 0
+    global_batch_size = args.batch_size * workers
+
+    hp = load_hyperparameters(args.tuner_dir)
+    with strategy.scope():
+        model = model_builder.model_builder(hp)
+    input_shapes = predict_model.model_input_shapes(model)
+
+    # the shuffles have the same seed on every worker, so the workers agree
+    # on the order of the files before taking their own part
+    train_data, train_steps = model_dataset(
+        'train', global_batch_size, input_shapes, workers,
+        path=args.manifest, training=True, cache=args.cache, seed=args.seed
+    )
+    throughput = ThroughputCallback(global_batch_size, args.warmup_steps)
+    callbacks = [throughput]
+
+    if args.benchmark_steps:
+        fit_kwargs = {
+            'epochs': 1,
+            'steps_per_epoch': args.warmup_steps + args.benchmark_steps,
+        }
+    else:
+        validation_data, validation_steps = model_dataset(
+            'validate', global_batch_size, input_shapes, workers,
+            path=args.manifest, training=False
+        )
+        callbacks += [
+            tf.keras.callbacks.EarlyStopping(
+                monitor='val_grade_loss', patience=3
+            ),
+            # create model checkpoints incase model stopped unexpectedly
+            tf.keras.callbacks.ModelCheckpoint(
+                filepath=args.checkpoint_dir,
+                save_weights_only=False,
+                monitor='val_trial_outcome_acc',
+                mode='max',
+                save_best_only=False
+            ),
+        ]
+        fit_kwargs = {
+            'epochs': args.epochs,
+            'steps_per_epoch': args.steps_per_epoch or train_steps,
+            'validation_data': validation_data,
+            'validation_steps': validation_steps,
+        }
+
+    start = time.perf_counter()
+    history = model.fit(
+        train_data, callbacks=callbacks, verbose=2 if is_chief else 0,
+        **fit_kwargs
+    )
+    seconds = time.perf_counter() - start
+
+    if not args.benchmark_steps:
+        # every worker takes part in saving; only the chief keeps its copy
+        if is_chief:
+            model.save(args.output)
+        else:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                model.save(os.path.join(temp_dir, 'model'))
+
+    return {
+        'workers': workers,
+        'precision': args.precision[0],
+        'intra_threads': intra_threads,
+        'inter_threads': inter_threads,
+        'global_batch_size': global_batch_size,
+        'steps': throughput.steps,
+        'seconds': seconds,
+        'examples_per_second': throughput.examples_per_second(),
+        'loss': history.history['loss'][-1],
+    }
+
+
+def worker_command(args, config, task_index, worker_report):
+    """Get the command line of a worker process
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Arguments of the script
+    config : tuple
+        (workers, precision, intra-op threads, inter-op threads)
+    task_index : int
+        Index of the worker; worker 0 is the chief
+    worker_report : str
+        Path of the json file the chief writes its results to
+
+    Returns
+    -------
+    list of str
+        Arguments of subprocess.Popen
+    """
+    workers, precision, intra_threads, inter_threads = config
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        '--workers', str(workers),
+        '--precision', precision,
+        '--intra-threads', str(intra_threads),
+        '--inter-threads', str(inter_threads),
+        '--batch-size', str(args.batch_size),
+        '--epochs', str(args.epochs),
+        '--benchmark-steps', str(args.benchmark_steps),
+        '--warmup-steps', str(args.warmup_steps),
+        '--manifest', args.manifest,
+        '--seed', str(args.seed),
+        '--output', args.output,
+        '--checkpoint-dir', args.checkpoint_dir,
+        '--task-index', str(task_index),
+        '--worker-report', worker_report,
+    ]
+    for option, value in [
+        ('--steps-per-epoch', args.steps_per_epoch),
+        ('--cache', args.cache),
+        ('--tuner-dir', args.tuner_dir),
+    ]:
+        if value is not None:
+            command += [option, str(value)]
+
+    return command
+
+
+def run_configuration(args, config):
+    """Train with a configuration in local worker processes
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Arguments of the script
+    config : tuple
+        (workers, precision, intra-op threads, inter-op threads); the thread
+        counts are resolved by thread_counts
+
+    Returns
+    -------
+    dict
+        Configuration and throughput of the training; the throughput is NaN
+        if a worker failed
+    """
+    workers, precision, intra_threads, inter_threads = config
+    intra_threads, inter_threads = thread_counts(
+        workers, intra_threads, inter_threads
+    )
+    config = (workers, precision, intra_threads, inter_threads)
+    blocks = cpu_blocks(workers) if args.pin else [None] * workers
+    ports = free_ports(workers)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        worker_report = os.path.join(temp_dir, 'report.json')
+        processes = []
+        for task_index, cpus in enumerate(blocks):
+            env = dict(os.environ)
+            env.pop('TF_CONFIG', None)
+            if workers > 1:
+                env['TF_CONFIG'] = cluster_config(ports, task_index)
+            processes.append(subprocess.Popen(
+                worker_command(args, config, task_index, worker_report),
+                env=env,
+                # the workers after the chief only log errors
+                stdout=None if task_index == 0 else subprocess.DEVNULL,
+                preexec_fn=(
+                    None if cpus is None
+                    else lambda cpus=cpus: os.sched_setaffinity(0, cpus)
+                )
+            ))
+
+        # a worker which fails leaves the others waiting for it
+        while any(process.poll() is None for process in processes):
+            if any(process.poll() for process in processes):
+                for process in processes:
+                    process.kill()
+            time.sleep(1)
+
+        # the other workers may log errors when the chief exits first
+        if processes[0].returncode or not os.path.exists(worker_report):
+            return {
+                'workers': workers,
+                'precision': precision,
+                'intra_threads': intra_threads,
+                'inter_threads': inter_threads,
+                'global_batch_size': args.batch_size * workers,
+                'examples_per_second': np.nan,
+            }
+        with open(worker_report) as f:
+            return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Train the model in local worker processes and report '
+        'the throughput of each configuration'
+    )
+    parser.add_argument(
+        '--workers', type=int, nargs='+', default=[1],
+        help='Numbers of worker processes to compare'
+    )
+    parser.add_argument(
+        '--precision', nargs='+', choices=list(precision_policies),
+        default=['float32'],
+        help='Precisions to compare; bfloat16 is mixed precision'
+    )
+    parser.add_argument(
+        '--intra-threads', type=int, nargs='+', default=[0],
+        help='Threads used within an op of each worker to compare, by '
+        'default (0) the CPUs divided by the workers'
+    )
+    parser.add_argument(
+        '--inter-threads', type=int, nargs='+', default=[0],
+        help='Ops run at the same time by each worker to compare, by default '
+        '(0) 2'
+    )
+    parser.add_argument(
+        '--pin', action='store_true',
+        help='Run each worker on its own block of CPUs (Linux)'
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=32,
+        help='Number of records in each batch of a worker'
+    )
+    parser.add_argument(
+        '--epochs', type=int, default=25, help='Maximum number of epochs'
+    )
+    parser.add_argument(
+        '--steps-per-epoch', type=int, default=None,
+        help='Number of steps in each epoch, by default one pass through the '
+        'train split'
+    )
+    parser.add_argument(
+        '--benchmark-steps', type=int, default=0,
+        help='Only time this number of training steps of each '
+        'configuration, without validating or saving the model'
+    )
+    parser.add_argument(
+        '--warmup-steps', type=int, default=2,
+        help='Number of untimed steps at the start of training'
+    )
+    parser.add_argument(
+        '--manifest', default=build_tfrecords.manifest_path,
+        help='Path of the manifest of build_tfrecords.py'
+    )
+    parser.add_argument(
+        '--cache', default=None,
+        help="Cache the records in memory ('') or in files with this prefix"
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0, help='Seed of the shuffles'
+    )
+    parser.add_argument(
+        '--tuner-dir', default=None,
+        help='Reload the best hyperparameters from this tuner folder, e.g. '
+        '{}; by default the hyperparameters of the final model'.format(
+            tuner_path
+        )
+    )
+    parser.add_argument(
+        '--output', default=retrained_path,
+        help='Path to save the trained model, by default {}; an existing '
+        'model (e.g. {}) is only replaced with --overwrite'.format(
+            retrained_path, predict_model.model_path
+        )
+    )
+    parser.add_argument(
+        '--overwrite', action='store_true',
+        help='Replace the model at --output if it exists'
+    )
+    parser.add_argument(
+        '--checkpoint-dir', default=checkpoint_path,
+        help='Path of the checkpoints saved after each epoch'
+    )
+    parser.add_argument(
+        '--report', default=report_path,
+        help='Path of the csv file of the throughput of each configuration'
+    )
+    # set by the script when it starts a worker
+    parser.add_argument(
+        '--task-index', type=int, default=None, help=argparse.SUPPRESS
+    )
+    parser.add_argument('--worker-report', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.task_index is not None:
+        result = train_worker(args)
+        if args.task_index == 0:
+            with open(args.worker_report, 'w') as f:
+                json.dump(result, f)
+        return
+
+    if (
+        not args.benchmark_steps and os.path.exists(args.output)
+        and not args.overwrite
+    ):
+        parser.error(
+            '{} already exists; use --overwrite to replace it'.format(
+                args.output
+            )
+        )
+    if args.pin and not hasattr(os, 'sched_setaffinity'):
+        parser.error('--pin is only supported on Linux')
+    configs = list(itertools.product(
+        args.workers, args.precision, args.intra_threads, args.inter_threads
+    ))
+    if len(configs) > 1 and not args.benchmark_steps:
+        parser.error(
+            'several configurations are only compared with --benchmark-steps'
+        )
+
+    rows = []
+    for config in configs:
+        rows.append(run_configuration(args, config))
+        print(
+            '{workers} workers, {precision}, {intra_threads} intra-op / '
+            '{inter_threads} inter-op threads: {examples_per_second:.1f} '
+            'examples/sec'.format(**rows[-1])
+        )
+
+    report = pd.DataFrame(rows)
+    report.to_csv(args.report, index=False)
+    print(report.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
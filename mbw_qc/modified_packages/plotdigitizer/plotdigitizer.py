@@ -26,9 +26,20 @@ from loguru import logger
 logger.remove()
 logger.add(sys.stderr, level="WARNING")
 
-logger.add(
-    Path(tempfile.gettempdir()) / "plotdigitizer.log", level="DEBUG", rotation="10MB"
-)
+# Ryan Note: the debug log file is only added when running from the command
+# line or when debug output is requested so library calls do no disk I/O
+log_file_: T.Optional[int] = None
+
+
+def add_log_file():
+    global log_file_
+    if log_file_ is None:
+        log_file_ = logger.add(
+            Path(tempfile.gettempdir()) / "plotdigitizer.log",
+            level="DEBUG",
+            rotation="10MB",
+        )
+
 
 WindowName_ = "PlotDigitizer"
 ix_, iy_ = 0, 0
@@ -143,19 +154,33 @@ def axis_transformation(p, P: T.List[geometry.Point]):
 def transform_axis(img, erase_near_axis: int = 0):
     global locations_
     global points_
+    return erase_axis(
+        img, points_, locations_, params_["background"], erase_near_axis
+    )
+
+
+def erase_axis(
+    img,
+    points: T.List[geometry.Point],
+    locations: T.List[geometry.Point],
+    background: int,
+    erase_near_axis: int = 0,
+):
     # extra: extra rows and cols to erase. Help in containing error near axis.
     # compute the transformation between old and new axis.
-    T = axis_transformation(points_, locations_)
-    p = geometry.find_origin(locations_)
+    T = axis_transformation(points, locations)
+    p = geometry.find_origin(locations)
     offCols, offRows = p.x, p.y
-    logger.info(f"{locations_} → origin {offCols}, {offRows}")
-    img[:, : offCols + erase_near_axis] = params_["background"]
-    img[-offRows - erase_near_axis :, :] = params_["background"]
+    logger.info(f"{locations} → origin {offCols}, {offRows}")
+    img[:, : offCols + erase_near_axis] = background
+    img[-offRows - erase_near_axis :, :] = background
     logger.debug(f"Tranformation params: {T}")
     return T
 
 
-def _find_trajectory_colors(img, plot: bool = False) -> T.Tuple[int, T.List[int]]:
+def _find_trajectory_colors(
+    img, plot: bool = False, min_traj_fraction: float = 1 / 8
+) -> T.Tuple[int, T.List[int]]:
     # Each trajectory color x is bounded in the range x-3 to x+2 (interval of
     # 5) -> total 51 bins. Also it is very unlikely that colors which are too
     # close to each other are part of different trajecotries. It is safe to
@@ -167,7 +192,9 @@ def _find_trajectory_colors(img, plot: bool = False) -> T.Tuple[int, T.List[int]
     # hs[hs < img.shape[1] * 3 // 4] = 0
     # Ryan Note 07MAR2022: previously returning no value; 
     # change ratio from 3/4 to 1/8
-    hs[hs < img.shape[1] * 1 // 8] = 0
+    # Ryan Note: ratio is now a parameter (min_traj_fraction) so figures
+    # which are not upscaled can use the same effective threshold
+    hs[hs < int(img.shape[1] * min_traj_fraction)] = 0
 
     if plot:
         import matplotlib.pyplot as plt
@@ -197,13 +224,17 @@ def _find_trajectory_colors(img, plot: bool = False) -> T.Tuple[int, T.List[int]
     return bgcolor, trajcolors
 
 
-def compute_foregrond_background_stats(img) -> T.Dict[str, float]:
+def compute_foregrond_background_stats(
+    img, min_traj_fraction: float = 1 / 8
+) -> T.Dict[str, float]:
     """Compute foreground and background color."""
     params: T.Dict[str, T.Any] = {}
     # Compute the histogram. It should be a multimodal histogram. Find peaks
     # and these are the colors of background and foregorunds. Currently
     # implementation is very simple.
-    bgcolor, trajcolors = _find_trajectory_colors(img)
+    bgcolor, trajcolors = _find_trajectory_colors(
+        img, min_traj_fraction=min_traj_fraction
+    )
     params["background"] = bgcolor
     params["timeseries_colors"] = trajcolors
     logger.info(f" computed parameters: {params}")
@@ -227,10 +258,95 @@ def process_image(img):
     return traj
 
 
+def digitize_image(
+    img: np.ndarray,
+    data_points: T.Sequence[T.Tuple[float, float]],
+    locations: T.Sequence[T.Tuple[float, float]],
+    preprocess: bool = False,
+    debug: bool = False,
+    name: str = "image",
+    erase_near_axis: int = 3,
+    min_traj_fraction: float = 1 / 8,
+    subpixel: bool = False,
+) -> T.Tuple[np.ndarray, np.ndarray]:
+    """Extract the trajectory from an image already in memory.
+
+    Library equivalent of `run` which does not parse arguments, read the
+    image from disk or write the trajectory to a file. Intermediate images
+    are only saved in the cache when `debug` is True.
+
+    img: grayscale (or BGR) image.
+    data_points: data values of the calibration points, e.g. [(0, 0), ...].
+    locations: pixel locations of `data_points` on the image; the y axis
+        starts from the bottom of the image.
+    name: prefix of the images saved in the cache when `debug` is True.
+    erase_near_axis: extra rows and columns erased next to the axes.
+    min_traj_fraction: a color is only a trajectory if it has at least this
+        fraction of the image width in pixels.
+    subpixel: calibrate the axes with the unrounded data points and
+        locations; by default both are truncated to whole numbers (as in
+        `run`), which is only accurate if the image has been upscaled.
+
+    Returns the x and y values of the trajectory sorted by x.
+    """
+    if debug:
+        add_log_file()
+
+    if img.ndim == 3:
+        img = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
+
+    # rescale.
+    img = img - img.min()
+    img = (255 * (img / img.max())).astype(np.uint8)
+
+    assert img.max() <= 255
+    assert img.min() < img.mean() < img.max(), "Could not read meaningful data"
+
+    if debug:
+        save_img_in_cache(img, name)
+
+    points = [geometry.Point(float(x), float(y)) for x, y in data_points]
+    locs = [geometry.Point(float(x), float(y)) for x, y in locations]
+    assert len(points) == len(locs), "Each data point requires a location"
+
+    # erosion after dilation (closes gaps)
+    if preprocess:
+        kernel = np.ones((1, 1), np.uint8)
+        img = cv.morphologyEx(img, cv.MORPH_CLOSE, kernel)
+        if debug:
+            save_img_in_cache(img, Path(f"{name}.close.png"))
+
+    if debug:
+        save_img_in_cache(img, Path(f"{name}.without_grid.png"))
+
+    params = compute_foregrond_background_stats(img, min_traj_fraction)
+    T = erase_axis(
+        img, points, locs, params["background"], erase_near_axis=erase_near_axis
+    )
+    if subpixel:
+        # erase_axis only needs whole pixels; the transformation does not
+        T = axis_transformation(
+            [(float(x), float(y)) for x, y in data_points],
+            [(float(x), float(y)) for x, y in locations],
+        )
+    assert img.std() > 0.0, "No data in image"
+    if debug:
+        save_img_in_cache(img, f"{name}.transformed_axis.png")
+
+    # extract the plot that has color which is farthest from the background.
+    trajcolor = params["timeseries_colors"][0]
+    x, y, new = trajectory.extract_trajectory(img, trajcolor, T, draw=debug)
+    if debug:
+        save_img_in_cache(np.vstack((img, new)), f"{name}.final.png")
+
+    return x, y
+
+
 def run(args):
     global locations_, points_
     global img_, args_
     args_ = args
+    add_log_file()
 
     infile = Path(args.INPUT)
     assert infile.exists(), f"{infile} does not exists."
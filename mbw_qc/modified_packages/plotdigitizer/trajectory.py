@@ -4,56 +4,60 @@ __email__ = "dilawar.s.rajput@gmail.com"
 import numpy as np
 import cv2 as cv
 
-from collections import defaultdict
-
 from loguru import logger
 
 
-def _find_center(vec):
-    return np.median(vec)
+def fit_trajectory_using_median(X, Y, T, shape):
+    """Compute one y value for every column (x) of the image.
 
+    X, Y: column and row of every trajectory pixel; X must be sorted and Y
+    sorted within each column (e.g. np.nonzero on the transposed mask).
+    shape: shape of the image.
 
-def fit_trajectory_using_median(traj, T, img):
+    Returns the x and y pixel of every column along with the transformed x
+    and y values sorted by x.
+    """
     (sX, sY), (offX, offY) = T
-    res = []
-    r, _ = img.shape
-
-    # x, y = zip(*sorted(traj.items()))
-    # logger.info((xvec, ys))
-
-    for k in sorted(traj):
-        x = k
-
-        vals = np.array(traj[k])
-
-        # For each x, we may multiple pixels in column of the image which might
-        # be y. Usually experience is that the trajectories are close to the
-        # top rather to the bottom. So we discard call pixel which are below
-        # the center of mass (median here)
-        # These are opencv pixles. So there valus starts from the top. 0
-        # belogs to top row. Therefore > rather than <.
-        avg = np.median(vals)
-        vals = vals[np.where(vals >= avg)]
-        if len(vals) == 0:
-            continue
-
-        # Still we have multiple candidates for y for each x.
-        # We find the center of these points and call it the y for given x.
-        y = _find_center(vals)
-        cv.circle(img, (x, int(y)), 1, 255, -1)
-        x1 = (x - offX) / sX
-        y1 = (r - y - offY) / sY
-        res.append((x1, y1))
+    r, _ = shape
+
+    # Ryan Note: vectorized; previously looped over a dict of columns.
+    xs, starts, counts = np.unique(X, return_index=True, return_counts=True)
+
+    # For each x, we may multiple pixels in column of the image which might
+    # be y. Usually experience is that the trajectories are close to the
+    # top rather to the bottom. So we discard call pixel which are below
+    # the center of mass (median here)
+    # These are opencv pixles. So there valus starts from the top. 0
+    # belogs to top row. Therefore > rather than <.
+    # Pixels are unique and sorted within a column so the pixels >= median
+    # are always the last ceil(n/2) pixels of the column.
+    starts = starts + counts // 2
+    counts = counts - counts // 2
+
+    # Still we have multiple candidates for y for each x.
+    # We find the center (median) of these points and call it the y for
+    # given x.
+    mid = starts + counts // 2
+    ys = np.where(counts % 2 == 1, Y[mid], (Y[mid - 1] + Y[mid]) / 2)
+
+    x1 = (xs - offX) / sX
+    y1 = (r - ys - offY) / sY
 
     # sort by x-axis.
-    return sorted(res)
+    order = np.lexsort((y1, x1))
+    return xs[order], ys[order], x1[order], y1[order]
 
 
 def _valid_px(val: int) -> int:
     return min(max(0, val), 255)
 
 
-def find_trajectory(img: np.ndarray, pixel: int, T):
+def extract_trajectory(img: np.ndarray, pixel: int, T, draw: bool = False):
+    """Extract the trajectory of a given color.
+
+    Returns the x and y values of the trajectory. When `draw` is True, an
+    image with the fitted pixels is also returned (None otherwise).
+    """
     logger.info(f"Extracting trajectory for color {pixel}")
     assert img.min() <= pixel <= img.max(), f"{pixel} is outside the range"
 
@@ -61,14 +65,22 @@ def find_trajectory(img: np.ndarray, pixel: int, T):
     o = 6
     _clower, _cupper = _valid_px(pixel - o // 2), _valid_px(pixel + o // 2)
 
-    Y, X = np.where((img >= _clower) & (img <= _cupper))
-    traj = defaultdict(list)
-    for x, y in zip(X, Y):
-        traj[x].append(y)
+    # transposed so pixels are grouped by column and sorted by row.
+    X, Y = np.nonzero(((img >= _clower) & (img <= _cupper)).T)
 
-    assert traj, "Empty trajectory"
+    assert X.size, "Empty trajectory"
 
     # this is a simple fit using median.
-    new = np.zeros_like(img)
-    res = fit_trajectory_using_median(traj, T, new)
-    return res, np.vstack((img, new))
+    xs, ys, x1, y1 = fit_trajectory_using_median(X, Y, T, img.shape)
+
+    new = None
+    if draw:
+        new = np.zeros_like(img)
+        for x, y in zip(xs, ys):
+            cv.circle(new, (int(x), int(y)), 1, 255, -1)
+    return x1, y1, new
+
+
+def find_trajectory(img: np.ndarray, pixel: int, T):
+    x1, y1, new = extract_trajectory(img, pixel, T, draw=True)
+    return list(zip(x1, y1)), np.vstack((img, new))
@@ -0,0 +1,8 @@
+"""Put the script folders on the Python path, as when the scripts are run"""
+
+import os
+import sys
+
+package_path = os.path.join(os.path.dirname(__file__), '..', 'mbw_qc')
+for folder in ['data', 'features', 'models', 'modified_packages']:
+    sys.path.insert(0, os.path.abspath(os.path.join(package_path, folder)))
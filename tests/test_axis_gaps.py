@@ -0,0 +1,149 @@
+"""Parity of the vectorized axis gap detection with the original loops"""
+
+import importlib
+import numpy as np
+import pytest
+
+digitize = importlib.import_module('3-digitize_screenshot')
+confirm = importlib.import_module('2-confirm_screenshot')
+
+
+# original pixel by pixel implementations, before the masks were used
+def loop_hor_char_row_ind(figure):
+    figure = digitize.convert_bw(figure, 150)
+    is_white_line = True
+    for x_coor in range(figure.shape[0] - 1, 0, -1):
+        for y_coor in range(figure.shape[1] - 1):
+            if figure[x_coor, y_coor] != 255:
+                is_white_line = False
+                break
+        if not is_white_line:
+            break
+    for x_coor_2 in range(x_coor, 0, -1):
+        for y_coor_2 in range(figure.shape[1] - 1):
+            is_white_line = True
+            if figure[x_coor_2, y_coor_2] != 255:
+                is_white_line = False
+                break
+        if is_white_line:
+            break
+
+    return x_coor_2 - 1
+
+
+def loop_ver_char_row_ind(figure):
+    figure = digitize.convert_bw(figure, 150)
+    is_white_line = True
+    for y_coor in range(figure.shape[1]):
+        for x_coor in range(figure.shape[0] - 1):
+            if figure[x_coor, y_coor] != 255:
+                is_white_line = False
+                break
+        if not is_white_line:
+            break
+    for y_coor_2 in range(y_coor, figure.shape[1] - 1):
+        for x_coor_2 in range(figure.shape[0] - 1):
+            is_white_line = True
+            if figure[x_coor_2, y_coor_2] != 255:
+                is_white_line = False
+                break
+        if is_white_line:
+            break
+
+    return y_coor_2 + 1
+
+
+def synthetic_figure(seed):
+    """White figure with axis text blocks, tick numbers and gray noise"""
+    rng = np.random.default_rng(seed)
+    height, width = rng.integers(2, 60, size=2)
+    figure = np.full((height, width, 3), 255, dtype=np.uint8)
+    for _ in range(rng.integers(0, 6)):
+        top, left = rng.integers(0, height), rng.integers(0, width)
+        bottom = top + rng.integers(1, 8)
+        right = left + rng.integers(1, 8)
+        figure[top:bottom, left:right] = rng.integers(0, 256)
+    # single pixels around the threshold of convert_bw
+    n_pixels = rng.integers(0, 4)
+    figure[
+        rng.integers(0, height, n_pixels), rng.integers(0, width, n_pixels)
+    ] = rng.integers(140, 160, size=(n_pixels, 1))
+
+    return figure
+
+
+def assert_parity(function, loop_function, figure):
+    """Same index, or ValueError where the loop has no index to return"""
+    try:
+        expected = loop_function(figure)
+    except UnboundLocalError:
+        with pytest.raises(ValueError):
+            function(figure)
+    else:
+        assert function(figure) == expected
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_matches_loops_on_synthetic_figures(seed):
+    figure = synthetic_figure(seed)
+
+    assert_parity(digitize.hor_char_row_ind, loop_hor_char_row_ind, figure)
+    assert_parity(digitize.ver_char_row_ind, loop_ver_char_row_ind, figure)
+    assert_parity(confirm.ver_char_row_ind, loop_ver_char_row_ind, figure)
+    assert_parity(
+        digitize.char_row_inds,
+        lambda figure: (
+            loop_hor_char_row_ind(figure), loop_ver_char_row_ind(figure)
+        ),
+        figure
+    )
+
+
+def test_synthetic_figures_have_gaps():
+    # most synthetic figures have both gaps, so the indices are compared
+    n_gaps = 0
+    for seed in range(300):
+        try:
+            loop_ver_char_row_ind(synthetic_figure(seed))
+            n_gaps += 1
+        except UnboundLocalError:
+            pass
+
+    assert n_gaps > 200
+
+
+@pytest.mark.parametrize('fill', [0, 255])
+def test_uniform_figures(fill):
+    figure = np.full((20, 30, 3), fill, dtype=np.uint8)
+
+    assert_parity(digitize.hor_char_row_ind, loop_hor_char_row_ind, figure)
+    assert_parity(digitize.ver_char_row_ind, loop_ver_char_row_ind, figure)
+    assert_parity(confirm.ver_char_row_ind, loop_ver_char_row_ind, figure)
+
+
+@pytest.mark.parametrize('shape', [(1, 30), (1, 1)])
+def test_no_rows_raises(shape):
+    figure = np.full(shape + (3,), 255, dtype=np.uint8)
+    # the loops fail with an unassigned index
+    with pytest.raises(UnboundLocalError):
+        loop_hor_char_row_ind(figure)
+
+    with pytest.raises(ValueError):
+        digitize.hor_char_row_ind(figure)
+
+
+@pytest.mark.parametrize('shape, fill', [
+    ((20, 1), 0), ((20, 1), 255), ((1, 30), 0), ((20, 30), 0),
+    ((20, 30), 255)
+])
+def test_no_columns_after_text_raises(shape, fill):
+    figure = np.full(shape + (3,), fill, dtype=np.uint8)
+    # the last column is the first non-white column (or the figure is white)
+    figure[:, :-1] = 255
+    with pytest.raises(UnboundLocalError):
+        loop_ver_char_row_ind(figure)
+
+    with pytest.raises(ValueError):
+        digitize.ver_char_row_ind(figure)
+    with pytest.raises(ValueError):
+        confirm.ver_char_row_ind(figure)
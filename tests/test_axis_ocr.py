@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+import axis_ocr
+
+
+def test_finalize_empty_bank_names_source():
+    glyph_bank = axis_ocr.GlyphBank()
+    with pytest.raises(ValueError, match='from screenshots/folder'):
+        glyph_bank.finalize('screenshots/folder')
+
+
+def test_finalize_averages_glyphs():
+    glyph_bank = axis_ocr.GlyphBank()
+    glyph = np.arange(
+        axis_ocr.glyph_shape[0] * axis_ocr.glyph_shape[1], dtype=np.float64
+    )
+    glyph_bank.glyph_sums = {'1': 2 * glyph, '0': -glyph}
+    glyph_bank.glyph_counts = {'1': 2, '0': 1}
+    glyph_bank.finalize()
+
+    assert list(glyph_bank.chars) == ['0', '1']
+    assert glyph_bank.templates.dtype == np.float32
+    np.testing.assert_allclose(
+        glyph_bank.templates[1], axis_ocr.normalize_template(glyph), rtol=1e-6
+    )
+    np.testing.assert_allclose(
+        glyph_bank.templates[0], -glyph_bank.templates[1], rtol=1e-6
+    )
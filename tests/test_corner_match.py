@@ -0,0 +1,23 @@
+import pytest
+import corner_match
+
+
+def test_load_corner_imgs():
+    corner_imgs = corner_match.load_corner_imgs()
+
+    assert sorted(corner_imgs) == sorted(corner_match.screenshot_types)
+    for corners in corner_imgs.values():
+        assert sorted(corners) == ['bottom_left', 'top_right']
+        for img in corners.values():
+            assert img is not None and img.ndim == 3
+
+    corner_matcher = corner_match.CornerMatcher(corner_imgs)
+    assert sorted(corner_matcher.templates) == sorted(corner_imgs)
+
+
+def test_missing_corner_image():
+    corner_imgs = corner_match.load_corner_imgs()
+    corner_imgs['n2']['top_right'] = None
+
+    with pytest.raises(ValueError, match='n2 top_right'):
+        corner_match.CornerMatcher(corner_imgs)
@@ -0,0 +1,65 @@
+import importlib
+import numpy as np
+import pytest
+
+digitize = importlib.import_module('3-digitize_screenshot')
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    traj = np.array([[0.1, 1.0], [0.2, 2.0]])
+    monkeypatch.setattr(digitize, 'worker_state', {
+        'corner_matcher': None, 'glyph_bank': None, 'cache_dir': None,
+        'validate_title': True,
+    })
+    monkeypatch.setattr(
+        digitize, 'crop_figure',
+        lambda screenshot_path, corner_matcher: (
+            'co2', np.zeros((10, 10, 3), np.uint8), 0.99
+        )
+    )
+    monkeypatch.setattr(
+        digitize, 'digitize_figure',
+        lambda spiro_fig, screenshot_type, output_path, glyph_bank: traj
+    )
+
+    return monkeypatch
+
+
+@pytest.mark.parametrize('passed, title_check', [
+    (True, 'pass'), (False, 'fail')
+])
+def test_title_check(worker, passed, title_check):
+    worker.setattr(
+        digitize, 'check_axis_title',
+        lambda spiro_fig, screenshot_type: passed
+    )
+
+    assert digitize.digitize_worker('a/1_trial_1_co2.png', None) == (
+        '1_trial_1_co2.png', 'success', '', title_check, 0.99
+    )
+
+
+def test_title_check_error_does_not_fail_screenshot(worker):
+    def check_axis_title(spiro_fig, screenshot_type):
+        raise ValueError('Figure does not contain a vertical white gap')
+    worker.setattr(digitize, 'check_axis_title', check_axis_title)
+
+    assert digitize.digitize_worker('a/1_trial_1_co2.png', None) == (
+        '1_trial_1_co2.png', 'success', '', 'error', 0.99
+    )
+
+
+def test_digitize_error_fails_screenshot(worker):
+    def digitize_figure(spiro_fig, screenshot_type, output_path, glyph_bank):
+        raise AssertionError('Could not read meaningful data')
+    worker.setattr(digitize, 'digitize_figure', digitize_figure)
+    worker.setattr(
+        digitize, 'check_axis_title',
+        lambda spiro_fig, screenshot_type: True
+    )
+
+    assert digitize.digitize_worker('a/1_trial_1_co2.png', None) == (
+        '1_trial_1_co2.png', 'failure',
+        'AssertionError: Could not read meaningful data', 'pass', 0.99
+    )
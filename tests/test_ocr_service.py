@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import ocr_service
+
+tesserocr = pytest.importorskip('tesserocr')
+
+
+def test_modes_are_passed_as_ints(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        ocr_service.tesserocr, 'PyTessBaseAPI',
+        lambda **kwargs: calls.append(kwargs)
+    )
+    ocr_service.OcrService(oem=3, psm=6)
+
+    assert calls == [{
+        'lang': 'eng', 'oem': tesserocr.OEM.DEFAULT,
+        'psm': tesserocr.PSM.SINGLE_BLOCK,
+    }]
+
+
+def test_get_service_builds_engine():
+    if 'eng' not in tesserocr.get_languages()[1]:
+        pytest.skip('Tesseract has no english language data')
+
+    service = ocr_service.get_service()
+    try:
+        assert service.api is not None
+        assert ocr_service.get_service() is service
+        assert isinstance(
+            service.image_to_string(np.full((20, 40), 255, np.uint8)), str
+        )
+    finally:
+        service.close()
+        ocr_service.services.clear()
@@ -0,0 +1,205 @@
+"""Regression of the NumPy screenshot resampling against the notebook
+
+The notebook was run with the pinned pandas (1.4), whose outer merge keeps the
+left keys in order followed by the right-only keys; pandas 2.2 and later sort
+the keys. The reference below spells out the pinned merge so it does not
+depend on the installed pandas.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import preprocess
+
+
+def outer_merge_unsorted(left, right, on):
+    """Outer merge of pandas < 2.2 (sort=False) of frames with unique keys"""
+    merged = left.merge(right, on=on, how='left')
+    right_only = right[~right[on].isin(left[on])]
+    if right_only.empty:
+        return merged
+
+    return pd.concat([merged, right_only], ignore_index=True)
+
+
+# pandas implementations of the project notebook ('Section 2.iii')
+def notebook_interpolate_screenshot(raw_ss, round_dig=1):
+    raw_ss = raw_ss.rename(columns={0: 'time', 1: 'val'})
+    raw_ss['time'] = raw_ss['time'].round(round_dig)
+    raw_ss = raw_ss.drop_duplicates(subset='time', keep='first')
+
+    time_inc = 10**-(round_dig)
+    time_df = pd.DataFrame(
+        [
+            round(i, round_dig)
+            for i in np.arange(
+                time_inc, raw_ss['time'].max() + time_inc, time_inc
+            )
+        ], columns=['time']
+    )
+
+    inter_ss = (
+        outer_merge_unsorted(raw_ss, time_df, on='time')
+        .sort_values(by=['time'])
+        .interpolate(axis='rows', limit_direction='both')
+    )
+
+    # inconsistency with capturing 0, so remove
+    inter_ss = inter_ss.drop(inter_ss[inter_ss['time'] == 0].index)
+
+    return inter_ss
+
+
+def notebook_process_screenshot(screenshot, ss_type):
+    screenshot = notebook_interpolate_screenshot(screenshot)
+    screenshot.rename(columns={'val': ss_type}, inplace=True)
+    screenshot = screenshot.drop(columns=['time'])
+    screenshot[ss_type] = (
+        (screenshot[ss_type] - preprocess.screenshot_mean_sd[ss_type]['mean'])
+        / preprocess.screenshot_mean_sd[ss_type]['sd']
+    )
+
+    return screenshot.reindex(range(preprocess.screenshot_len)).fillna(0)
+
+
+def notebook_screenshot_vector(csv_path, ss_type):
+    """Read a plotdigitizer csv file and process it as the notebook does"""
+    try:
+        screenshot = pd.read_csv(csv_path, header=None, sep=r'\s+')
+    except pd.errors.EmptyDataError:
+        # empty dataframe if screenshot is empty due to white screenshot
+        screenshot = pd.DataFrame({'time': [0], 'val': [0]})
+
+    return notebook_process_screenshot(screenshot, ss_type)[ss_type].to_numpy()
+
+
+def trajectory(seed, n_points=200, duplicates=True, shuffle=True):
+    """Digitized signal with rounded duplicate times, in a random order"""
+    rng = np.random.default_rng(seed)
+    time = np.sort(rng.uniform(0, rng.uniform(1, 30), n_points))
+    if duplicates:
+        # several points in the same pixel column
+        time = np.repeat(time[::2], 2)[:n_points]
+    traj = np.column_stack([time, rng.normal(0, 50, time.size).cumsum()])
+    if shuffle:
+        traj = traj[rng.permutation(len(traj))]
+
+    return traj
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('duplicates', [False, True])
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_interpolate_matches_notebook(seed, duplicates, shuffle):
+    traj = trajectory(seed, duplicates=duplicates, shuffle=shuffle)
+
+    expected = notebook_interpolate_screenshot(pd.DataFrame(traj))
+    result = preprocess.interpolate_screenshot(pd.DataFrame(traj))
+
+    np.testing.assert_array_equal(result.index, expected.index)
+    np.testing.assert_allclose(result['time'], expected['time'])
+    np.testing.assert_allclose(result['val'], expected['val'])
+
+
+def test_outer_merge_matches_installed_pandas():
+    if tuple(int(v) for v in pd.__version__.split('.')[:2]) >= (2, 2):
+        pytest.skip('pandas 2.2 and later sort the keys of an outer merge')
+    left = pd.DataFrame({'time': [0.3, 0.1, 0.5], 'val': [3.0, 1.0, 5.0]})
+    right = pd.DataFrame({'time': [0.1, 0.2, 0.3, 0.4, 0.5]})
+
+    pd.testing.assert_frame_equal(
+        outer_merge_unsorted(left, right, on='time'),
+        left.merge(right, on='time', how='outer')
+    )
+
+
+def test_unsorted_trajectory_labels_in_merge_order():
+    # fixed reference of the notebook with pandas 1.4: trajectory times are
+    # labelled in their order, then the missing grid times 0.2 and 0.4
+    traj = np.array([[0.3, 3.0], [0.1, 1.0], [0.5, 5.0]])
+
+    time, val, index = preprocess.resample_screenshot(traj)
+
+    np.testing.assert_allclose(time, [0.1, 0.2, 0.3, 0.4, 0.5])
+    np.testing.assert_allclose(val, [1.0, 2.0, 3.0, 4.0, 5.0])
+    np.testing.assert_array_equal(index, [1, 3, 0, 4, 2])
+
+    mean_sd = preprocess.screenshot_mean_sd['o2']
+    expected = np.zeros(preprocess.screenshot_len)
+    expected[:5] = (
+        np.array([3.0, 1.0, 5.0, 2.0, 4.0]) - mean_sd['mean']
+    ) / mean_sd['sd']
+    np.testing.assert_allclose(
+        preprocess.screenshot_vector(traj, 'o2'), expected, rtol=1e-6
+    )
+
+
+def test_time_zero_label_is_skipped():
+    traj = np.array([[0.0, 2.0], [0.2, 4.0], [0.04, 9.0]])
+
+    time, val, index = preprocess.resample_screenshot(traj)
+
+    # 0.04 rounds to 0 and is a duplicate of the first time; the grid of the
+    # notebook overshoots the last time by one step
+    np.testing.assert_allclose(time, [0.1, 0.2, 0.3])
+    np.testing.assert_allclose(val, [3.0, 4.0, 4.0])
+    np.testing.assert_array_equal(index, [2, 1, 3])
+
+
+def test_duplicate_times_keep_first_value():
+    traj = np.array([[0.5, 3.0], [0.52, 7.0], [0.2, 1.0], [0.49, 9.0]])
+
+    time, val, index = preprocess.resample_screenshot(traj)
+
+    np.testing.assert_allclose(time, [0.1, 0.2, 0.3, 0.4, 0.5])
+    np.testing.assert_allclose(val, [1.0, 1.0, 5 / 3, 7 / 3, 3.0])
+    np.testing.assert_array_equal(index, [2, 1, 3, 4, 0])
+
+
+def test_empty_trajectory():
+    time, val, index = preprocess.resample_screenshot(np.empty((0, 2)))
+
+    assert time.size == val.size == index.size == 0
+    np.testing.assert_array_equal(
+        preprocess.screenshot_vector(np.empty((0, 2)), 'co2'),
+        np.zeros(preprocess.screenshot_len, dtype=np.float32)
+    )
+
+
+@pytest.mark.parametrize('ss_type', preprocess.screenshot_types)
+@pytest.mark.parametrize('seed', range(5))
+def test_screenshot_vector_matches_csv_round_trip(tmp_path, ss_type, seed):
+    # digitized values have more digits than the '%g' csv files keep
+    traj = trajectory(seed, n_points=2000) * np.pi
+    csv_path = tmp_path / 'screenshot.csv'
+    np.savetxt(csv_path, traj, fmt='%g', delimiter=' ')
+
+    vector = preprocess.screenshot_vector(traj, ss_type)
+
+    assert vector.dtype == np.float32
+    assert vector.shape == (preprocess.screenshot_len,)
+    np.testing.assert_allclose(
+        vector, notebook_screenshot_vector(csv_path, ss_type),
+        rtol=1e-6, atol=1e-6
+    )
+
+
+def test_screenshot_vector_matches_empty_csv(tmp_path):
+    csv_path = tmp_path / 'screenshot.csv'
+    csv_path.write_text('')
+
+    np.testing.assert_array_equal(
+        preprocess.screenshot_vector(np.empty((0, 2)), 'o2'),
+        notebook_screenshot_vector(csv_path, 'o2')
+    )
+
+
+def test_screenshot_vector_truncates_long_signals():
+    # times past the last row of the model input are dropped
+    time = np.arange(1, preprocess.screenshot_len + 500) * 0.1
+    traj = np.column_stack([time, np.ones_like(time)])
+
+    vector = preprocess.screenshot_vector(traj, 'flow')
+
+    assert vector.shape == (preprocess.screenshot_len,)
+    assert np.all(vector != 0)
@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+import build_tfrecords
+import preprocess
+import record_schema
+
+
+class IdentityTransform:
+    def transform(self, values):
+        return values
+
+
+def write_records(path, trials):
+    with tf.io.TFRecordWriter(path) as writer:
+        for trial, vectors in trials.items():
+            example = tf.train.Example(features=tf.train.Features(
+                feature=record_schema.screenshot_features(trial, vectors)
+            ))
+            writer.write(example.SerializeToString())
+
+
+def random_vectors(rng):
+    return {
+        ss_type: rng.random(preprocess.screenshot_len).astype(np.float32)
+        for ss_type in preprocess.screenshot_types
+    }
+
+
+def test_load_screenshots_selects_trials(tmp_path):
+    rng = np.random.default_rng(0)
+    trials = {
+        record_schema.trial_id('202.{}'.format(i), 3): random_vectors(rng)
+        for i in range(5)
+    }
+    write_records(str(tmp_path / 'screenshots_001-of-001.tfrec'), trials)
+
+    assert build_tfrecords.load_screenshots(
+        str(tmp_path / 'missing')
+    ) == {}
+    screenshots = build_tfrecords.load_screenshots(str(tmp_path))
+    assert sorted(screenshots) == sorted(trials)
+    selected = build_tfrecords.load_screenshots(
+        str(tmp_path), {'202.1_trial_3', '202.4_trial_3', 'other_trial_1'}
+    )
+    assert sorted(selected) == ['202.1_trial_3', '202.4_trial_3']
+    for trial, vectors in selected.items():
+        for ss_type in preprocess.screenshot_types:
+            np.testing.assert_array_equal(
+                vectors[ss_type], trials[trial][ss_type]
+            )
+
+
+def test_trial_inputs_prefers_streamed_screenshots(tmp_path, monkeypatch):
+    monkeypatch.setitem(build_tfrecords.worker_state, 'transforms', {
+        table_type: IdentityTransform()
+        for table_type in preprocess.table_types
+    })
+    manual_path = tmp_path / 'digitize_screenshots_manual'
+    manual_path.mkdir()
+    monkeypatch.setattr(
+        build_tfrecords.file_index, 'manual_screenshots_path',
+        str(manual_path)
+    )
+
+    # the co2 screenshot was manually corrected; the other csv files do not
+    # exist so they must not be read
+    traj = np.column_stack([np.arange(1, 101) * 0.1, np.linspace(0, 5, 100)])
+    co2_path = manual_path / '202.2_trial_3_co2.csv'
+    np.savetxt(co2_path, traj, fmt='%g')
+    trial = pd.Series({
+        'spx_filename': '202.2', 'trial': 3,
+        'trial_accepted_label': 'Accepted', 'qc_grade_label': 'C',
+    })
+    for ss_type in preprocess.screenshot_types:
+        folder = manual_path if ss_type == 'co2' else tmp_path
+        trial['{}_path'.format(ss_type)] = str(
+            folder / '202.2_trial_3_{}.csv'.format(ss_type)
+        )
+    streamed = random_vectors(np.random.default_rng(1))
+    tables = {table_type: {} for table_type in preprocess.table_types}
+
+    inputs, labels = build_tfrecords.trial_inputs(
+        trial, tables, {'202.2_trial_3': streamed}
+    )
+
+    for ss_type in preprocess.screenshot_types:
+        if ss_type == 'co2':
+            expected = build_tfrecords.read_screenshot(str(co2_path), 'co2')
+        else:
+            expected = streamed[ss_type]
+        np.testing.assert_array_equal(
+            inputs['{}_input'.format(ss_type)], expected
+        )
+    assert labels == {'trial_outcome': [1], 'grade': [0, 1, 0, 0, 0, 0]}
+
+
+def random_inputs(rng):
+    inputs = {
+        name: rng.normal(0, 1, shape).astype(np.float32)
+        for name, shape in record_schema.input_shapes.items()
+    }
+    labels = {
+        'trial_outcome': [int(rng.integers(0, 2))],
+        'grade': rng.integers(0, 2, 6).tolist(),
+    }
+
+    return inputs, labels
+
+
+def serialize(schema, inputs, labels):
+    return tf.train.Example(features=tf.train.Features(
+        feature=record_schema.record_features(schema, inputs, labels)
+    )).SerializeToString()
+
+
+def assert_parsed(parsed, inputs, labels):
+    input_dict, output_dict = parsed
+    assert sorted(input_dict) == sorted(inputs)
+    for name, values in inputs.items():
+        assert input_dict[name].dtype == tf.float32
+        assert input_dict[name].shape == np.shape(values)
+        np.testing.assert_array_equal(input_dict[name].numpy(), values)
+    for name, values in labels.items():
+        assert output_dict[name].dtype == tf.int32
+        assert output_dict[name].shape == np.shape(values)
+        np.testing.assert_array_equal(output_dict[name].numpy(), values)
+
+
+def test_dense_feature_byte_layout():
+    inputs, labels = random_inputs(np.random.default_rng(0))
+    feature = record_schema.dense_features(inputs, labels)
+
+    for name, values in inputs.items():
+        stored = feature[name].bytes_list.value
+        assert len(stored) == 1
+        np.testing.assert_array_equal(
+            np.frombuffer(stored[0], dtype='<f4').reshape(values.shape),
+            values
+        )
+
+
+def test_dense_and_column_records_parse_the_same():
+    rng = np.random.default_rng(1)
+    trials = [random_inputs(rng) for _ in range(3)]
+    dense = [serialize('dense', *trial) for trial in trials]
+    columns = [serialize('columns', *trial) for trial in trials]
+
+    # single records
+    for trial, dense_record, column_record in zip(trials, dense, columns):
+        assert_parsed(
+            record_schema.parse_dense(tf.constant(dense_record)), *trial
+        )
+        assert_parsed(
+            record_schema.parse_columns(tf.constant(column_record)), *trial
+        )
+
+    # batches, as parsed after Dataset.batch
+    batch_inputs = {
+        name: np.stack([inputs[name] for inputs, _ in trials])
+        for name in record_schema.input_shapes
+    }
+    batch_labels = {
+        name: np.stack([labels[name] for _, labels in trials])
+        for name in record_schema.label_lens
+    }
+    dense_batch = record_schema.parse_dense(tf.constant(dense))
+    column_batch = record_schema.parse_columns(tf.constant(columns))
+    assert_parsed(dense_batch, batch_inputs, batch_labels)
+    assert_parsed(column_batch, batch_inputs, batch_labels)
+    for parsed_dense, parsed_columns in zip(dense_batch, column_batch):
+        for name in parsed_dense:
+            assert parsed_dense[name].shape == parsed_columns[name].shape
+            np.testing.assert_array_equal(
+                parsed_dense[name].numpy(), parsed_columns[name].numpy()
+            )
+
+
+def test_dense_records_from_file(tmp_path):
+    rng = np.random.default_rng(2)
+    trials = [random_inputs(rng) for _ in range(4)]
+    path = str(tmp_path / 'records.tfrec')
+    with tf.io.TFRecordWriter(path) as writer:
+        for trial in trials:
+            writer.write(serialize('dense', *trial))
+
+    dataset = tf.data.TFRecordDataset(path).batch(3).map(
+        record_schema.get_parser('dense')
+    )
+    parsed = list(dataset)
+    assert [len(inputs['spx_input']) for inputs, _ in parsed] == [3, 1]
+    for i, (inputs, labels) in enumerate(trials):
+        input_dict, output_dict = parsed[i // 3]
+        for name, values in inputs.items():
+            np.testing.assert_array_equal(
+                input_dict[name][i % 3].numpy(), values
+            )
+        for name, values in labels.items():
+            np.testing.assert_array_equal(
+                output_dict[name][i % 3].numpy(), values
+            )
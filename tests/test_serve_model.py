@@ -0,0 +1,118 @@
+import threading
+import numpy as np
+import pytest
+import predict_model
+import record_schema
+import serve_model
+
+
+class FakeClassifier:
+    """Scores every trial by the mean of its spx input"""
+
+    def __init__(self):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.error = None
+
+    def predict(self, inputs_list):
+        self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        self.batches.append(len(inputs_list))
+        accept = np.array([
+            inputs['spx_input'].mean() for inputs in inputs_list
+        ])
+        grade = np.tile(np.eye(6)[2], (len(inputs_list), 1))
+
+        return accept, grade
+
+
+@pytest.fixture(scope='module')
+def service():
+    # the prometheus metrics are registered once per process
+    classifier = FakeClassifier()
+    batcher = serve_model.MicroBatcher(classifier, batch_size=4, max_wait=0)
+    app = serve_model.create_app(batcher, timeout=0.5)
+
+    return classifier, app.test_client()
+
+
+@pytest.fixture
+def client(service):
+    classifier, client = service
+    classifier.batches.clear()
+    classifier.gate.set()
+    classifier.error = None
+
+    return classifier, client
+
+
+def trial_json(value):
+    return {'inputs': {
+        name: np.full(shape, value).tolist()
+        for name, shape in record_schema.input_shapes.items()
+    }}
+
+
+def test_predict_json_trial(client):
+    classifier, client = client
+    response = client.post('/predict', json=trial_json(0.75))
+
+    assert response.status_code == 200
+    scores = response.get_json()
+    assert scores['accept_probability'] == 0.75
+    assert scores['trial_outcome'] == 'Accepted'
+    grade = predict_model.grade_labels[2]
+    assert scores['grade'] == grade
+    assert scores['grade_probabilities'][grade] == 1
+    assert classifier.batches == [1]
+
+
+def test_predict_invalid_inputs(client):
+    _, client = client
+    request_json = trial_json(0)
+    del request_json['inputs']['o2_input']
+    response = client.post('/predict', json=request_json)
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Missing input: o2_input'}
+
+
+def test_predict_model_error(client):
+    classifier, client = client
+    classifier.error = RuntimeError('out of memory')
+    response = client.post('/predict', json=trial_json(0))
+
+    assert response.status_code == 500
+    assert response.get_json() == {
+        'error': 'Model error: RuntimeError: out of memory'
+    }
+
+
+def test_predict_timeout_drops_trial(client):
+    classifier, client = client
+    classifier.gate.clear()
+    # the first trial is being scored when it times out, the second is still
+    # queued and is dropped
+    for _ in range(2):
+        response = client.post('/predict', json=trial_json(0))
+        assert response.status_code == 503
+        assert 'error' in response.get_json()
+    classifier.gate.set()
+
+    response = client.post('/predict', json=trial_json(0.25))
+    assert response.status_code == 200
+    assert response.get_json()['trial_outcome'] == 'Rejected'
+    assert classifier.batches == [1, 1]
+
+
+def test_metrics(client):
+    _, client = client
+    assert client.post('/predict', json=trial_json(0.5)).status_code == 200
+    metrics = client.get('/metrics').get_data(as_text=True)
+
+    assert 'mbw_qc_trials_scored_total' in metrics
+    assert 'mbw_qc_batch_size_bucket' in metrics
+    assert 'mbw_qc_recent_latency_seconds{quantile="0.99"}' in metrics
+    assert 'flask_http_request_duration_seconds' in metrics
@@ -0,0 +1,101 @@
+"""Single pass column statistics against NumPy over all the values"""
+
+import numpy as np
+import pytest
+import stats
+
+
+def random_tables(seed, n_cols=6):
+    """Tables of uneven lengths with missing and infinite values"""
+    rng = np.random.default_rng(seed)
+    tables = []
+    for n_rows in rng.integers(1, 60, 12):
+        values = rng.normal(rng.uniform(-1e3, 1e3), rng.uniform(1, 100), (
+            n_rows, n_cols
+        ))
+        values[rng.random(values.shape) < 0.15] = np.nan
+        values[rng.random(values.shape) < 0.05] = np.inf
+        values[rng.random(values.shape) < 0.05] = -np.inf
+        tables.append(values)
+    # a column which is missing in one table
+    tables[3][:, 2] = np.nan
+
+    return tables
+
+
+def assert_matches_numpy(table_stats, tables):
+    values = np.concatenate(tables)
+    values[np.isinf(values)] = np.nan
+
+    np.testing.assert_array_equal(
+        table_stats.count, np.isfinite(values).sum(axis=0)
+    )
+    np.testing.assert_allclose(
+        table_stats.mean, np.nanmean(values, axis=0), rtol=1e-10
+    )
+    np.testing.assert_allclose(
+        table_stats.sd, np.nanstd(values, axis=0, ddof=1), rtol=1e-9
+    )
+    np.testing.assert_array_equal(table_stats.min, np.nanmin(values, axis=0))
+    np.testing.assert_array_equal(table_stats.max, np.nanmax(values, axis=0))
+    np.testing.assert_array_equal(
+        table_stats.missing, np.isnan(values).sum(axis=0)
+    )
+    assert table_stats.n_tables == len(tables)
+    assert table_stats.max_rows == max(len(table) for table in tables)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_update_matches_numpy(seed):
+    tables = random_tables(seed)
+    table_stats = stats.RunningStats(tables[0].shape[1])
+    for table in tables:
+        table_stats.update(table)
+
+    assert_matches_numpy(table_stats, tables)
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('splits', [[1], [5, 6], [2, 3, 11]])
+def test_merge_matches_numpy(seed, splits):
+    tables = random_tables(seed)
+    chunks = np.split(np.arange(len(tables)), splits)
+
+    table_stats = stats.RunningStats(tables[0].shape[1])
+    for chunk in chunks:
+        chunk_stats = stats.RunningStats(tables[0].shape[1])
+        for i in chunk:
+            chunk_stats.update(tables[i])
+        table_stats.merge(chunk_stats)
+
+    assert_matches_numpy(table_stats, tables)
+
+
+def test_merge_empty_stats():
+    table_stats = stats.RunningStats(2)
+    table_stats.update(np.array([[1.0, 2.0], [3.0, 6.0]]))
+    table_stats.merge(stats.RunningStats(2))
+
+    np.testing.assert_allclose(table_stats.mean, [2.0, 4.0])
+    np.testing.assert_allclose(table_stats.sd, [np.sqrt(2), np.sqrt(8)])
+
+
+def test_columns_with_few_values():
+    table_stats = stats.RunningStats(3)
+    table_stats.update(np.array([[np.nan, 4.0, 1.0], [np.inf, np.nan, 3.0]]))
+
+    np.testing.assert_array_equal(table_stats.mean, [np.nan, 4.0, 2.0])
+    np.testing.assert_array_equal(
+        table_stats.sd, [np.nan, np.nan, np.sqrt(2)]
+    )
+    frame = table_stats.to_frame(['a', 'b', 'c'])
+    assert frame['min'].isna().tolist() == [True, False, False]
+    assert frame['missing'].tolist() == [2, 1, 0]
+
+
+def test_single_column():
+    table_stats = stats.RunningStats(1)
+    table_stats.update(np.array([1.0, 2.0, 4.0]))
+
+    np.testing.assert_allclose(table_stats.mean, [7 / 3])
+    assert table_stats.max_rows == 3
@@ -0,0 +1,143 @@
+"""Regression of the table transform against the notebook"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import preprocess
+import transform
+
+
+# pandas implementations of the project notebook ('Section 2.iv')
+def pad_rows(raw_table, n_rows):
+    return raw_table.reindex(range(n_rows)).fillna(0)
+
+
+def standardize(raw_table, mean_sd_dict):
+    for raw_table_cols in raw_table.columns.values:
+        feature_mean = mean_sd_dict[raw_table_cols]['mean']
+        feature_sd = mean_sd_dict[raw_table_cols]['sd']
+        raw_table[raw_table_cols] = (
+            (raw_table[raw_table_cols] - feature_mean)/(feature_sd)
+        )
+
+    return raw_table[raw_table.columns.values]
+
+
+def create_bool_col(raw_table):
+    for col in raw_table.columns.values.tolist():
+        raw_table['{}_bool'.format(col)] = raw_table[col].notna().astype(int)
+
+    return raw_table
+
+
+def notebook_process_table(table, mean_sd_dict, dummy_cols, n_rows):
+    """process_tbfvl and process_spx after the columns are selected"""
+    table = table.replace([np.inf, -np.inf], np.nan)
+    table_dum = table[dummy_cols]
+    table = table.drop(columns=dummy_cols)
+    table = standardize(table, mean_sd_dict)
+    table = pd.concat(
+        [table.reset_index(drop=True), table_dum.reset_index(drop=True)],
+        axis=1
+    )
+    table = create_bool_col(table)
+
+    return pad_rows(table, n_rows)
+
+
+def notebook_table_input(table, columns):
+    """Stack each column with its boolean column as prepare_sample does"""
+    return np.stack([
+        table[col if i % 2 == 0 else '{}_bool'.format(col)].to_numpy()
+        for col in columns for i in range(2)
+    ], axis=1)
+
+
+def random_table(rng, columns, dummy_cols, n_rows):
+    values = rng.normal(10, 5, (n_rows, len(columns)))
+    values[rng.random(values.shape) < 0.2] = np.nan
+    values[rng.random(values.shape) < 0.05] = np.inf
+    values[rng.random(values.shape) < 0.05] = -np.inf
+    table = pd.DataFrame(values, columns=columns)
+    for col in dummy_cols:
+        table[col] = rng.integers(0, 2, n_rows).astype(np.float64)
+
+    return table
+
+
+def random_mean_sd(rng, columns, dummy_cols):
+    return {
+        col: {'mean': rng.normal(0, 10), 'sd': rng.uniform(0.5, 5)}
+        for col in columns if col not in dummy_cols
+    }
+
+
+@pytest.mark.parametrize('table_type', list(preprocess.table_types))
+@pytest.mark.parametrize('length_change', [-10, 0, 25])
+@pytest.mark.parametrize('seed', range(5))
+def test_transform_matches_notebook(table_type, length_change, seed):
+    _, _, _, columns, n_rows, dummy_cols = preprocess.table_types[table_type]
+    rng = np.random.default_rng(seed)
+    # tables can be shorter or longer (truncated) than the model input
+    table = random_table(
+        rng, columns, dummy_cols, max(1, n_rows + length_change)
+    )
+    mean_sd_dict = random_mean_sd(rng, columns, dummy_cols)
+
+    expected = notebook_table_input(
+        notebook_process_table(table, mean_sd_dict, dummy_cols, n_rows),
+        columns
+    )
+    feature_transform = transform.FeatureTransform.from_mean_sd(
+        mean_sd_dict, columns, n_rows
+    )
+    features = feature_transform.transform(table[columns].to_numpy())
+
+    assert features.dtype == np.float32
+    assert features.shape == (n_rows, 2 * len(columns))
+    np.testing.assert_allclose(features, expected, rtol=1e-6, atol=1e-6)
+
+
+def test_transform_missing_and_padded_values():
+    feature_transform = transform.FeatureTransform(
+        ['a', 'b'], [1.0, 0.0], [2.0, 1.0], 3
+    )
+    features = feature_transform.transform(
+        np.array([[3.0, np.nan], [np.inf, -np.inf]])
+    )
+
+    np.testing.assert_array_equal(features, [
+        [1, 1, 0, 0],
+        [0, 0, 0, 0],
+        [0, 0, 0, 0],
+    ])
+
+
+def test_fit_skips_dummy_columns():
+    rng = np.random.default_rng(0)
+    tables = [rng.normal(5, 2, (n, 3)) for n in [4, 9, 1]]
+
+    feature_transform = transform.FeatureTransform.fit(
+        iter(tables), ['a', 'b', 'W'], 10, skip_cols=['W']
+    )
+
+    values = np.concatenate(tables)
+    np.testing.assert_allclose(
+        feature_transform.mean, [*values[:, :2].mean(axis=0), 0]
+    )
+    np.testing.assert_allclose(
+        feature_transform.sd, [*values[:, :2].std(axis=0, ddof=1), 1]
+    )
+
+
+def test_save_and_load(tmp_path):
+    feature_transform = transform.FeatureTransform(
+        ['a', 'b'], [1.0, 2.0], [3.0, 4.0], 7
+    )
+    feature_transform.save(tmp_path / 'transform.npz')
+
+    loaded = transform.FeatureTransform.load(tmp_path / 'transform.npz')
+    assert loaded.columns == ['a', 'b']
+    assert loaded.n_rows == 7
+    np.testing.assert_array_equal(loaded.mean, [1.0, 2.0])
+    np.testing.assert_array_equal(loaded.sd, [3.0, 4.0])